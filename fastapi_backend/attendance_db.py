@@ -217,6 +217,23 @@ class AttendanceDatabase:
             logger.error(f"查询失败: {str(e)}")
             return []
 
+    def query_by_name_date_pairs(self, pairs: List[tuple], chunk_size: int = 500) -> List[Dict]:
+        """按 (姓名, 日期) 集合批量查询打卡记录，每 chunk_size 对一条 SQL（用于加班批量校验）"""
+        pairs = list(dict.fromkeys((str(n), str(d)[:10]) for n, d in pairs if n and d))
+        out: List[Dict] = []
+        for i in range(0, len(pairs), chunk_size):
+            chunk = pairs[i:i + chunk_size]
+            placeholders = ", ".join(["(%s, %s)"] * len(chunk))
+            params = tuple(v for p in chunk for v in p)
+            try:
+                out.extend(db.execute_query(
+                    f"SELECT * FROM attendance_records WHERE (employee_name, attendance_date) IN ({placeholders})",
+                    params,
+                ) or [])
+            except Exception as e:
+                logger.error(f"查询失败: {str(e)}")
+        return out
+
     def get_all_records_by_date_range(self, start_date: str, end_date: str) -> List[Dict]:
         """按日期范围查询所有考勤记录（不按人筛选，用于考勤异常管理）"""
         try:
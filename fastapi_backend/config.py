@@ -35,6 +35,17 @@ class Settings(BaseSettings):
 
     # LibreOffice 可执行路径，用于 Word/Excel 转 PDF 预览。留空则自动查找 libreoffice/soffice
     LIBREOFFICE_CMD: str = ""
+    # Word/Excel 转 PDF 转换池：并发 LibreOffice 实例数、单次转换超时（秒）、
+    # 常驻监听端口起始值（可导入 uno 时第 S 个进程的第 N 个实例占用 起始值 + S*实例数 + N）
+    OFFICE_POOL_SIZE: int = 2
+    OFFICE_CONVERT_TIMEOUT: float = 60
+    OFFICE_BASE_PORT: int = 2202
+    # 预览 PDF 缓存（按文件内容哈希）总大小上限（MB），超出时淘汰最久未访问的 PDF
+    PDF_CACHE_MAX_MB: int = 1024
+
+    # 文件编号顺序号预取段大小：1 为在插入编号记录的事务内逐个分配（编号连续）；
+    # 大于 1 时每个进程一次预取一段，减少并发提交的行锁等待，但进程重启会留下空号
+    FILE_SEQUENCE_BLOCK_SIZE: int = 1
 
     # Embedding 模型路径，用于制度 AI 深度搜索。留空则使用 BAAI/bge-small-zh-v1.5（首次自动下载）
     # 若已手动下载模型，可设置为本地路径，如: models/bge-small-zh-v1.5
@@ -43,6 +54,33 @@ class Settings(BaseSettings):
     # 向量切片参数：每块字符数、块间重叠字符数。切片越小，匹配越精准，匹配切片越易展示
     VECTOR_CHUNK_SIZE: int = 100
     VECTOR_CHUNK_OVERLAP: int = 30
+    # 向量存储后端：chroma（data/policy_chroma）或 numpy（data/policy_vectors，float16 精确检索）
+    # 切换后执行 scripts/bench_vector_store.py --migrate 复制向量，或 scripts/backfill_policy_vectors.py 重新入库
+    VECTOR_STORE_BACKEND: str = "chroma"
+    # 编码后端：torch（sentence_transformers）或 onnx（ONNX Runtime，模型由 scripts/convert_embedding_onnx.py 生成）
+    EMBEDDING_BACKEND: str = "torch"
+    # ONNX 模型目录（为空时为 EMBEDDING_MODEL_PATH 加 -onnx 后缀）、是否使用 int8 量化模型、推理线程数（0 为默认）
+    EMBEDDING_ONNX_PATH: str = ""
+    EMBEDDING_ONNX_QUANTIZED: bool = True
+    EMBEDDING_ONNX_THREADS: int = 0
+    # 向量 sidecar 地址（如 http://127.0.0.1:8765，由 python -m services.vector_sidecar 启动）；
+    # 配置后各 worker 不再各自加载模型与向量库。检索 / 入库请求超时（秒）
+    VECTOR_SIDECAR_URL: str = ""
+    VECTOR_SIDECAR_TIMEOUT: float = 10
+    VECTOR_SIDECAR_INDEX_TIMEOUT: float = 300
+    # 启动时预加载向量模型（关闭则首次检索时加载）
+    EMBEDDING_WARMUP: bool = True
+    # 查询编码合批窗口（毫秒）与单批最大条数
+    EMBEDDING_BATCH_WINDOW_MS: float = 5
+    EMBEDDING_MAX_BATCH: int = 32
+    # 混合检索：向量 + BM25 关键词按倒数排名融合（RRF 常数 k），关键词检索时间预算（毫秒）
+    HYBRID_SEARCH: bool = True
+    HYBRID_RRF_K: int = 60
+    HYBRID_KEYWORD_BUDGET_MS: float = 50
+    # 制度向量入库队列：是否在本进程启动入库线程、每批认领的制度数、最大重试次数
+    POLICY_INDEX_WORKER: bool = True
+    POLICY_INDEX_BATCH_SIZE: int = 8
+    POLICY_INDEX_MAX_ATTEMPTS: int = 5
 
     # 单点登录（跳转人事档案等外部系统）
     # 目标系统 B 的入口地址（不含路径，如 https://hr.example.com）
@@ -54,6 +92,18 @@ class Settings(BaseSettings):
     # ticket 有效秒数
     SSO_TICKET_EXPIRE_SECONDS: int = 120
 
+    # 登录会话令牌签名密钥（为空时使用 SSO_SECRET；两者均为空则不签发令牌）
+    SESSION_SECRET: str = ""
+    # 会话令牌有效秒数
+    SESSION_TOKEN_EXPIRE_SECONDS: int = 43200
+    # 同步令牌撤销表的间隔（秒）
+    SESSION_REVOCATION_REFRESH_SECONDS: float = 10
+    # 为 True 时权限接口必须携带与 current_user 一致的令牌
+    SESSION_REQUIRED: bool = False
+
+    # 过期换休票归档间隔（小时），0 表示不启用定时归档
+    HXP_SWEEP_INTERVAL_HOURS: float = 24
+
     class Config:
         env_file = ".env"
         case_sensitive = True
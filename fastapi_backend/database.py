@@ -4,6 +4,7 @@
 """
 import pymysql
 import threading
+from contextlib import contextmanager
 from config import settings
 from typing import Optional, List, Dict, Any
 import logging
@@ -186,6 +187,28 @@ class MySQLDatabase:
             if conn:
                 conn.close()
 
+    @contextmanager
+    def transaction(self):
+        """
+        事务：同一连接内执行多条语句，正常结束提交，异常回滚并继续抛出。
+        用法: with db.transaction() as cursor: cursor.execute(...)
+        """
+        conn = self.get_connection()
+        if not conn:
+            raise Exception("无法连接到数据库")
+        try:
+            with conn.cursor() as cursor:
+                yield cursor
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            conn.close()
+
 
 # 创建全局数据库实例
 db = MySQLDatabase()
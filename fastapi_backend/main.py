@@ -3,12 +3,14 @@
 考勤系统 FastAPI 后端
 主应用文件
 """
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from starlette.middleware.cors import CORSMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
 from config import settings
 from routers import holiday, suggestions, auth, attendance, report, leave_overtime, approvers, business_trip, approval, statistics, file_numbering, department_policy, admin, db_manager, sso
+from services import hxp_ledger, office_convert, policy_index_queue, policy_vector, session_token
+import asyncio
 import logging
 import time
 
@@ -24,7 +26,8 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
-    description="考勤系统现代化API接口"
+    description="考勤系统现代化API接口",
+    dependencies=[Depends(session_token.load_session)],  # 会话令牌校验（不查库）
 )
 
 
@@ -83,6 +86,25 @@ async def startup_event():
     print(f"[System] API文档地址: http://localhost:8000/docs")
     logger.info(f"API文档地址: http://localhost:8000/docs")
     logger.debug("调试日志已开启，将显示详细调试信息")
+    # 换休票台账：补齐 expire_date / hxp_balance，并定时归档过期票
+    await asyncio.get_event_loop().run_in_executor(None, hxp_ledger.ensure_hxp_ledger_once)
+    if settings.HXP_SWEEP_INTERVAL_HOURS > 0:
+        asyncio.create_task(hxp_ledger.sweep_loop(settings.HXP_SWEEP_INTERVAL_HOURS))
+    # 向量模型后台预热，不阻塞启动
+    if settings.EMBEDDING_WARMUP:
+        asyncio.get_event_loop().run_in_executor(None, policy_vector.warm_up)
+    # 制度向量入库队列线程
+    if settings.POLICY_INDEX_WORKER:
+        policy_index_queue.start_worker()
+    # 会话令牌撤销表：各 worker 定时同步
+    if session_token.session_enabled():
+        asyncio.create_task(session_token.revocation_loop(settings.SESSION_REVOCATION_REFRESH_SECONDS))
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭事件：结束转换池的常驻 LibreOffice 进程"""
+    office_convert.shutdown_pool()
 
 
 @app.get("/")
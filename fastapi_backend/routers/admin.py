@@ -10,6 +10,9 @@ from fastapi.responses import StreamingResponse
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel
 from database import db
+from utils.stats_cache import bump_stats_version, SCOPE_STAFF
+from services.approver_routing import invalidate_approver_routing
+from services.session_token import revoke_sessions, session_for
 from io import BytesIO
 from datetime import datetime
 import logging
@@ -49,18 +52,26 @@ def _get_admin_scope(name: str) -> Optional[Dict[str, Any]]:
     if not (name or "").strip():
         return None
     name_stripped = name.strip()
-    # 人事管理员（webconfig.admin2）权限等同于部长/副部长
-    admin2 = _get_admin2()
-    if admin2 and name_stripped == admin2:
-        return {"role": "full", "lsys": None}
-    rows = db.execute_query(
-        "SELECT jb, lsys FROM yggl WHERE name = %s LIMIT 1",
-        (name_stripped,)
-    )
-    if not rows:
-        return None
-    jb = (rows[0].get("jb") or "").strip()
-    lsys = (rows[0].get("lsys") or "").strip()
+    # 携带会话令牌时直接使用令牌中的角色，不查库
+    claims = session_for(name_stripped)
+    if claims is not None:
+        if claims.get("admin2"):
+            return {"role": "full", "lsys": None}
+        jb = claims.get("jb") or ""
+        lsys = claims.get("lsys") or ""
+    else:
+        # 人事管理员（webconfig.admin2）权限等同于部长/副部长
+        admin2 = _get_admin2()
+        if admin2 and name_stripped == admin2:
+            return {"role": "full", "lsys": None}
+        rows = db.execute_query(
+            "SELECT jb, lsys FROM yggl WHERE name = %s LIMIT 1",
+            (name_stripped,)
+        )
+        if not rows:
+            return None
+        jb = (rows[0].get("jb") or "").strip()
+        lsys = (rows[0].get("lsys") or "").strip()
     if jb == "部长" or jb.startswith("部长") or jb == "副部长" or jb.startswith("副部长"):
         return {"role": "full", "lsys": None}
     # 主任与副主任权限一致：仅可管本室
@@ -186,6 +197,8 @@ async def add_employee(req: AddEmployeeRequest):
             "VALUES (%s, %s, %s, %s, %s, %s, 0)"
         )
         db.execute_update(sql, (name, pwd, gh_val, lsys_val, jb_val, xbie_val))
+        bump_stats_version(SCOPE_STAFF)
+        invalidate_approver_routing()
         return {
             "success": True,
             "message": "添加成功，新员工可凭姓名与初始密码登录",
@@ -237,6 +250,9 @@ async def update_employee_dept_level(req: UpdateEmployeeDeptLevelRequest):
             "UPDATE yggl SET lsys = %s, jb = %s WHERE name = %s",
             (new_lsys, new_jb, name)
         )
+        bump_stats_version(SCOPE_STAFF)
+        invalidate_approver_routing()
+        revoke_sessions(name)
         return {
             "success": True,
             "message": "已更新",
@@ -279,6 +295,9 @@ async def set_employee_status(req: SetEmployeeStatusRequest):
         )
         if n <= 0:
             return {"success": False, "message": "未找到该员工或未变更"}
+        bump_stats_version(SCOPE_STAFF)
+        invalidate_approver_routing()
+        revoke_sessions(req.name.strip())
         return {
             "success": True,
             "message": "已设为在职" if req.zaizhi == 0 else "已设为离职",
@@ -6,16 +6,24 @@
 - 加班: jiabanzt=0(室主任spr) -> [有spr2时 1->3] -> jiabanzt=5(打卡管理员) -> 4; 驳回 22
 - 公出: 两级固定。室主任(szr)先批 szrzt=1->2; 部领导(bld)再批 bldzt=1->2; 驳回 22
 """
-from fastapi import APIRouter, HTTPException, Query, Body
+from fastapi import APIRouter, HTTPException, Query, Body, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from typing import Optional, List, Any
 from pydantic import BaseModel
 from datetime import datetime
 from database import db
 from attendance_db import attendance_db
+import asyncio
+import json
 import math
-import uuid
+from services import hxp_ledger
+from collections import defaultdict
 from routers.approvers import _get_user_info, _jb_match
 from utils.helpers import format_datetime_plain
+from utils.stats_cache import bump_stats_version, SCOPE_LEAVE, SCOPE_OVERTIME, SCOPE_TRIP
+from services.pending_notify import (
+    count_pending, publish_pending_change, pending_hub, KIND_LEAVE, KIND_OVERTIME, KIND_TRIP,
+)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -44,12 +52,16 @@ def _fmt_dt(d):
 @router.get("/can-approve")
 async def can_approve(name: str = Query(...)):
     """检查当前用户是否有审批权限（员工无权限；webconfig.dakaman 打卡管理员始终有权限，用于加班最后一环审批）"""
-    name_stripped = (name or "").strip()
     dakaman = _get_dakaman()
-    if dakaman and name_stripped == dakaman:
-        return {"success": True, "canApprove": True, "jb": "打卡管理员", "reason": "打卡管理员可审批加班最后一环"}
+    if dakaman and (name or "").strip() == dakaman:
+        return _can_approve_result(name, None, dakaman)
+    return _can_approve_result(name, _get_user_info(name), dakaman)
+
 
-    user = _get_user_info(name)
+def _can_approve_result(name: str, user: Optional[dict], dakaman: Optional[str]) -> dict:
+    """审批权限判定（由 yggl 行与 webconfig.dakaman 计算），供 /can-approve 与 /auth/bootstrap 共用"""
+    if dakaman and (name or "").strip() == dakaman:
+        return {"success": True, "canApprove": True, "jb": "打卡管理员", "reason": "打卡管理员可审批加班最后一环"}
     if not user:
         return {"success": True, "canApprove": False, "reason": "用户不存在"}
     jb = (user.get("jb") or "").strip()
@@ -58,6 +70,78 @@ async def can_approve(name: str = Query(...)):
     return {"success": True, "canApprove": True, "jb": jb}
 
 
+# ==================== 待办数量与推送 ====================
+
+# SSE / WebSocket 心跳间隔（秒），防止代理断开空闲连接
+_PENDING_HEARTBEAT = 25
+
+
+@router.get("/pending-counts")
+async def get_pending_counts(approver: str = Query(..., description="当前审批人姓名")):
+    """待审批数量（请假/加班/公出），一条 COUNT 查询；推送不可用时前端用此接口轮询"""
+    try:
+        return {"success": True, "data": count_pending(approver)}
+    except Exception as e:
+        logger.error(f"获取待审批数量失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/pending/stream")
+async def pending_stream(request: Request, approver: str = Query(..., description="当前审批人姓名")):
+    """
+    待审批推送（SSE）：连接后先推送一次 counts，此后待办变化时推送
+    event: event（kind/id/action）与 event: counts（最新数量）
+    """
+    approver = (approver or "").strip()
+    loop = asyncio.get_event_loop()
+
+    async def gen():
+        queue = pending_hub.subscribe(approver)
+        try:
+            counts = await loop.run_in_executor(None, count_pending, approver)
+            yield f"event: counts\ndata: {json.dumps(counts, ensure_ascii=False)}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    msg = await asyncio.wait_for(queue.get(), timeout=_PENDING_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                msg = dict(msg)
+                yield f"event: {msg.pop('type')}\ndata: {json.dumps(msg, ensure_ascii=False)}\n\n"
+        finally:
+            pending_hub.unsubscribe(approver, queue)
+
+    return StreamingResponse(
+        gen(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/pending/ws")
+async def pending_ws(websocket: WebSocket, approver: str = Query(...)):
+    """待审批推送（WebSocket），消息格式同 SSE：{"type": "counts"|"event", ...}"""
+    approver = (approver or "").strip()
+    await websocket.accept()
+    queue = pending_hub.subscribe(approver)
+    loop = asyncio.get_event_loop()
+    try:
+        counts = await loop.run_in_executor(None, count_pending, approver)
+        await websocket.send_json({"type": "counts", **counts})
+        while True:
+            try:
+                msg = await asyncio.wait_for(queue.get(), timeout=_PENDING_HEARTBEAT)
+            except asyncio.TimeoutError:
+                msg = {"type": "ping"}
+            await websocket.send_json(msg)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.debug(f"待办推送连接关闭: {e}")
+    finally:
+        pending_hub.unsubscribe(approver, queue)
+
+
 # ==================== 请假审批 ====================
 
 @router.get("/pending/leave")
@@ -141,29 +225,23 @@ class ApproveRequest(BaseModel):
     reason: Optional[str] = ""
 
 
+def _add_exchange_tickets_tx(cursor, items: List[tuple]):
+    """在调用方事务内批量入账换休票（写入过期日并同步余额）。items 为 [(name, tickets), ...]"""
+    hxp_ledger.add_tickets_tx(cursor, items)
+
+
+def _deduct_exchange_tickets_tx(cursor, name: str, consume: float) -> float:
+    """在调用方事务内按过期日先进先出扣减换休票，返回未能扣减的张数。"""
+    return hxp_ledger.deduct_tickets_tx(cursor, name, consume)
+
+
 def _add_exchange_tickets(name: str, tickets: float):
     """加班审批通过且「要换休票」时，向 hxp 表增加换休票。tickets 为张数（已按 0.25 取整）。"""
     if not name or tickets <= 0:
         return
     try:
-        tickets = round(float(tickets), 2)
-        if tickets <= 0:
-            return
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        # hxp 表若 id 为 VARCHAR(36) NOT NULL 则需显式传入；否则按无 id 列插入
-        try:
-            hxp_id = uuid.uuid4().hex
-            n = db.execute_update(
-                "INSERT INTO hxp (id, name, sl, sj) VALUES (%s, %s, %s, %s)",
-                (hxp_id, name.strip(), tickets, now),
-            )
-        except Exception:
-            n = db.execute_update(
-                "INSERT INTO hxp (name, sl, sj) VALUES (%s, %s, %s)",
-                (name.strip(), tickets, now),
-            )
-        if n <= 0:
-            logger.warning("加班换休票入账未生效（INSERT 影响行数为0）")
+        with db.transaction() as cursor:
+            _add_exchange_tickets_tx(cursor, [(name, tickets)])
     except Exception as e:
         logger.warning(f"加班换休票入账失败: {e}")
 
@@ -173,40 +251,27 @@ def _deduct_exchange_tickets(name: str, consume: float):
     if not name or consume <= 0:
         return
     try:
-        from datetime import date
-        from utils.hxp_helper import compute_expire_date, parse_expire_for_sort
-        today = date.today().strftime("%Y-%m-%d")
-        rows = db.execute_query(
-            "SELECT id, sl, sj FROM hxp WHERE name = %s AND sl > 0 ORDER BY id",
-            (name,)
-        )
-        rows_with_exp = []
-        for r in rows:
-            exp = compute_expire_date(r.get("sj"))
-            if exp and exp < today:
-                continue  # 已过期，不参与扣减
-            rows_with_exp.append((r, parse_expire_for_sort(exp) if exp else (9999, 12)))
-        rows_with_exp.sort(key=lambda x: x[1])
-        remain = round(float(consume), 2)
-        for row, _ in rows_with_exp:
-            if remain <= 0:
-                break
-            rid = row["id"]
-            try:
-                sl = float(row.get("sl") or 0)
-            except (TypeError, ValueError):
-                sl = 0.0
-            if sl <= 0:
-                continue
-            if remain >= sl:
-                db.execute_update("DELETE FROM hxp WHERE id = %s", (rid,))
-                remain = round(remain - sl, 2)
-            else:
-                db.execute_update("UPDATE hxp SET sl = sl - %s WHERE id = %s",
-                                  (round(remain, 2), rid))
-                remain = 0
-    except Exception:
-        pass
+        with db.transaction() as cursor:
+            _deduct_exchange_tickets_tx(cursor, name, consume)
+    except Exception as e:
+        logger.warning(f"换休票扣减失败: {e}")
+
+
+def _leave_consume_tickets(row) -> float:
+    """换休/员工换休票请假需扣减的张数（优先 hxpxh，否则按天数折算，0.5张起）。"""
+    qjfs = (row.get("qjfs") or "").strip()
+    if qjfs not in ("换休", "员工换休票"):
+        return 0.0
+    hxpxh_val = row.get("hxpxh")
+    try:
+        return float(hxpxh_val) if hxpxh_val is not None else 0
+    except (TypeError, ValueError):
+        tian = row.get("tian")
+        try:
+            dur = float(tian) if tian is not None else 0
+        except (TypeError, ValueError):
+            dur = 0
+        return round(round(dur * 4) / 2, 2)
 
 
 @router.post("/leave/{item_id}/action")
@@ -227,6 +292,10 @@ async def leave_approve_action(item_id: str, req: ApproveRequest):
                               (now, reason[:500] if reason else None, item_id))
         except Exception:
             db.execute_update("UPDATE qj SET qjzt = 22, sptime = %s WHERE id = %s", (now, item_id))
+        # 统计只计已通过（qjzt=4）的请假，驳回已通过记录时使统计缓存失效
+        if qjzt == 4:
+            bump_stats_version(SCOPE_LEAVE)
+        publish_pending_change(KIND_LEAVE, (row.get("spr"), row.get("spr2")), item_id, "reject")
         return {"success": True, "message": "已驳回"}
 
     if req.action != "approve":
@@ -250,22 +319,14 @@ async def leave_approve_action(item_id: str, req: ApproveRequest):
 
     # 换休/员工换休票最终审批通过时，从 hxp 表扣减换休票（优先消耗最先过期的）
     if final_approved:
-        qjfs = (row.get("qjfs") or "").strip()
-        if qjfs in ("换休", "员工换休票"):
-            xm = (row.get("xm") or "").strip()
-            hxpxh_val = row.get("hxpxh")
-            try:
-                consume = float(hxpxh_val) if hxpxh_val is not None else 0
-            except (TypeError, ValueError):
-                tian = row.get("tian")
-                try:
-                    dur = float(tian) if tian is not None else 0
-                except (TypeError, ValueError):
-                    dur = 0
-                consume = round(round(dur * 4) / 2, 2)  # 0.5张起
-            if consume > 0 and xm:
-                _deduct_exchange_tickets(xm, consume)
+        xm = (row.get("xm") or "").strip()
+        consume = _leave_consume_tickets(row)
+        if consume > 0 and xm:
+            _deduct_exchange_tickets(xm, consume)
+        # 统计只计已通过(qjzt=4)的记录，最终通过时使统计缓存失效
+        bump_stats_version(SCOPE_LEAVE)
 
+    publish_pending_change(KIND_LEAVE, (row.get("spr"), row.get("spr2")), item_id, "approve")
     return {"success": True, "message": "已通过"}
 
 
@@ -275,17 +336,124 @@ class BatchApproveRequest(BaseModel):
     reason: Optional[str] = ""
 
 
+def _batch_ids(ids: List[str]) -> List[str]:
+    """去空、去重并保持顺序"""
+    out, seen = [], set()
+    for iid in ids or []:
+        iid = str(iid or "").strip()
+        if iid and iid not in seen:
+            seen.add(iid)
+            out.append(iid)
+    return out
+
+
+def _group_update(cursor, table: str, set_sql: str, set_params: tuple, status_col: str, from_status, ids: List[str]):
+    """
+    同一状态迁移的一组记录用一条 UPDATE 完成（带原状态条件，防止并发重复审批）。
+    更新行数与记录数不一致说明有记录状态已变化，抛 409 使整个批次回滚，不返回与库中不符的结果。
+    """
+    if not ids:
+        return 0
+    placeholders = ", ".join(["%s"] * len(ids))
+    cursor.execute(
+        f"UPDATE {table} SET {set_sql} WHERE id IN ({placeholders}) AND {status_col} = %s",
+        set_params + tuple(ids) + (from_status,),
+    )
+    if cursor.rowcount != len(ids):
+        logger.warning(f"批量审批 {table} 更新 {cursor.rowcount}/{len(ids)} 条，原状态 {from_status}，已回滚")
+        raise HTTPException(status_code=409, detail="部分记录状态已变化，批量审批未执行，请刷新后重试")
+    return cursor.rowcount
+
+
+def _batch_result(ids: List[str], results: dict) -> dict:
+    items = [results[iid] for iid in ids]
+    ok = sum(1 for r in items if r["success"])
+    fail = len(items) - ok
+    return {"success": True, "passed": ok, "failed": fail, "message": f"成功{ok}条，失败{fail}条", "results": items}
+
+
 @router.post("/leave/batch")
 async def leave_batch_approve(req: BatchApproveRequest):
-    """请假批量审批"""
-    ok, fail = 0, 0
-    for iid in req.ids:
-        try:
-            await leave_approve_action(iid, ApproveRequest(action=req.action, reason=req.reason))
-            ok += 1
-        except Exception:
-            fail += 1
-    return {"success": True, "passed": ok, "failed": fail, "message": f"成功{ok}条，失败{fail}条"}
+    """
+    请假批量审批（单事务）：一次查询加锁全部记录，内存中校验状态迁移，
+    按迁移分组各一条 UPDATE，换休票扣减在同一事务内完成。返回每条记录的结果。
+    """
+    ids = _batch_ids(req.ids)
+    if req.action not in ("approve", "reject"):
+        raise HTTPException(status_code=400, detail="无效操作")
+    if not ids:
+        return _batch_result([], {})
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    results = {iid: {"id": iid, "success": False, "message": "记录不存在"} for iid in ids}
+    try:
+        with db.transaction() as cursor:
+            placeholders = ", ".join(["%s"] * len(ids))
+            cursor.execute(
+                f"SELECT id, qjzt, `2j`, spr, spr2, xm, qjfs, hxpxh, tian FROM qj WHERE id IN ({placeholders}) FOR UPDATE",
+                tuple(ids),
+            )
+            rows = {str(r["id"]): r for r in cursor.fetchall()}
+            # 迁移分组：(原状态, 新状态) -> ids
+            groups = defaultdict(list)
+            final_rows = []
+            for iid in ids:
+                row = rows.get(iid)
+                if not row:
+                    continue
+                qjzt = row.get("qjzt") or 0
+                if req.action == "reject":
+                    # 已驳回的记录不再更新（UPDATE 不改变任何列时行数为 0）
+                    if qjzt != 22:
+                        groups[(qjzt, 22)].append(iid)
+                    results[iid] = {"id": iid, "success": True, "message": "已驳回", "status": 22}
+                elif qjzt == 1:
+                    to = 3 if (row.get("2j") or 0) == 1 else 4
+                    groups[(1, to)].append(iid)
+                    results[iid] = {"id": iid, "success": True, "message": "已通过", "status": to}
+                    if to == 4:
+                        final_rows.append(row)
+                elif qjzt == 3:
+                    groups[(3, 4)].append(iid)
+                    results[iid] = {"id": iid, "success": True, "message": "已通过", "status": 4}
+                    final_rows.append(row)
+                else:
+                    results[iid] = {"id": iid, "success": False, "message": "当前状态无法审批"}
+
+            reason = (req.reason or "").strip()
+            for (frm, to), group_ids in groups.items():
+                if to == 22:
+                    _group_update(cursor, "qj", "qjzt = 22, sptime = %s, bhyy = %s",
+                                  (now, reason[:500] if reason else None), "COALESCE(qjzt, 0)", frm, group_ids)
+                elif frm == 1 and to == 3:
+                    _group_update(cursor, "qj", "qjzt = 3, sptime = %s", (now,), "qjzt", 1, group_ids)
+                elif frm == 1 and to == 4:
+                    _group_update(cursor, "qj", "qjzt = 4, sptime = %s, sctime = %s", (now, now), "qjzt", 1, group_ids)
+                else:
+                    _group_update(cursor, "qj", "qjzt = 4, sp2time = %s, sctime = %s", (now, now), "qjzt", 3, group_ids)
+
+            # 换休票扣减：按人合并后在同一事务内扣减
+            consume_by_name = defaultdict(float)
+            for row in final_rows:
+                xm = (row.get("xm") or "").strip()
+                consume = _leave_consume_tickets(row)
+                if xm and consume > 0:
+                    consume_by_name[xm] += consume
+            for xm, consume in consume_by_name.items():
+                short = _deduct_exchange_tickets_tx(cursor, xm, round(consume, 2))
+                if short > 0:
+                    logger.warning(f"换休票余额不足: {xm} 差 {short} 张")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"请假批量审批失败（已回滚）: {e}")
+        raise HTTPException(status_code=500, detail=f"批量审批失败，已回滚: {e}")
+    # 最终通过或驳回已通过（qjzt=4）的记录时统计结果变化
+    if final_rows or (4, 22) in groups:
+        bump_stats_version(SCOPE_LEAVE)
+    publish_pending_change(
+        KIND_LEAVE, (r.get(k) for r in rows.values() for k in ("spr", "spr2")), action=req.action
+    )
+    return _batch_result(ids, results)
 
 
 # ==================== 加班审批 ====================
@@ -413,7 +581,7 @@ async def overtime_approve_action(item_id: str, req: ApproveRequest):
     """加班单条审批。item_id 为 jiaban 表 id（UUID 字符串）。"""
     item_id = str(item_id).strip()
     rows = db.execute_query(
-        "SELECT id, jiabanzt, spr2, xm, hx, tian1, jbf FROM jiaban WHERE id = %s",
+        "SELECT id, jiabanzt, spr, spr2, xm, hx, tian1, jbf FROM jiaban WHERE id = %s",
         (item_id,)
     )
     if not rows:
@@ -433,6 +601,10 @@ async def overtime_approve_action(item_id: str, req: ApproveRequest):
         if n <= 0:
             logger.error("加班驳回未更新到任何记录: id=%s", item_id)
             raise HTTPException(status_code=500, detail="驳回失败，未找到对应记录")
+        # 统计只计已通过（jiabanzt=4）的加班，驳回已通过记录时使统计缓存失效
+        if jiabanzt == 4:
+            bump_stats_version(SCOPE_OVERTIME)
+        publish_pending_change(KIND_OVERTIME, (row.get("spr"), row.get("spr2"), _get_dakaman()), item_id, "reject")
         return {"success": True, "message": "已驳回"}
 
     if req.action != "approve":
@@ -480,21 +652,106 @@ async def overtime_approve_action(item_id: str, req: ApproveRequest):
                 "UPDATE jiaban SET jbf = %s, hxp = 0 WHERE id = %s",
                 (hours, item_id),
             )
+        bump_stats_version(SCOPE_OVERTIME)
 
+    publish_pending_change(KIND_OVERTIME, (row.get("spr"), row.get("spr2"), _get_dakaman()), item_id, "approve")
     return {"success": True, "message": "已通过"}
 
 
 @router.post("/overtime/batch")
 async def overtime_batch_approve(req: BatchApproveRequest):
-    """加班批量审批"""
-    ok, fail = 0, 0
-    for iid in req.ids:
-        try:
-            await overtime_approve_action(iid, ApproveRequest(action=req.action, reason=req.reason))
-            ok += 1
-        except Exception:
-            fail += 1
-    return {"success": True, "passed": ok, "failed": fail, "message": f"成功{ok}条，失败{fail}条"}
+    """
+    加班批量审批（单事务）：一次查询加锁全部记录，按状态迁移分组各一条 UPDATE；
+    最终通过的记录在同一事务内写 hxp（要换休票）或 jbf（要加班费）。返回每条记录的结果。
+    """
+    ids = _batch_ids(req.ids)
+    if req.action not in ("approve", "reject"):
+        raise HTTPException(status_code=400, detail="无效操作")
+    if not ids:
+        return _batch_result([], {})
+    results = {iid: {"id": iid, "success": False, "message": "记录不存在"} for iid in ids}
+    final_count = 0
+    reverted = False
+    try:
+        with db.transaction() as cursor:
+            placeholders = ", ".join(["%s"] * len(ids))
+            cursor.execute(
+                f"SELECT id, jiabanzt, spr, spr2, xm, hx, tian1, jbf FROM jiaban WHERE id IN ({placeholders}) FOR UPDATE",
+                tuple(ids),
+            )
+            rows = {str(r["id"]): r for r in cursor.fetchall()}
+            groups = defaultdict(list)
+            final_rows = []
+            for iid in ids:
+                row = rows.get(iid)
+                if not row:
+                    continue
+                jiabanzt = row.get("jiabanzt") or 0
+                if req.action == "reject":
+                    if jiabanzt != 22:
+                        groups[(jiabanzt, 22)].append(iid)
+                    results[iid] = {"id": iid, "success": True, "message": "已驳回", "status": 22}
+                    continue
+                if jiabanzt in (0, 1):
+                    # 有二级审批人进入二级审批，否则进入打卡管理员审批（最后一环）
+                    to = 3 if row.get("spr2") else 5
+                elif jiabanzt == 3:
+                    to = 5
+                elif jiabanzt == 5:
+                    to = 4
+                    final_rows.append(row)
+                else:
+                    results[iid] = {"id": iid, "success": False, "message": "当前状态无法审批"}
+                    continue
+                groups[(jiabanzt, to)].append(iid)
+                results[iid] = {"id": iid, "success": True, "message": "已通过", "status": to}
+
+            reason = (req.reason or "").strip()
+            for (frm, to), group_ids in groups.items():
+                if to == 22:
+                    _group_update(cursor, "jiaban", "jiabanzt = 22, bhyy = %s",
+                                  (reason[:500] if reason else None,), "COALESCE(jiabanzt, 0)", frm, group_ids)
+                else:
+                    _group_update(cursor, "jiaban", "jiabanzt = %s", (to,), "COALESCE(jiabanzt, 0)", frm, group_ids)
+
+            # 最终通过：hx=是 写 hxp 并回写 jiaban.hxp、jbf=0；hx=否 只回写 jbf（以 tian1 为准），hxp=0
+            tickets_items, hxp_updates, jbf_updates = [], [], []
+            for row in final_rows:
+                hx = (row.get("hx") or row.get("HX") or "").strip()
+                need_exchange = hx and str(hx) in ("是", "1", "true", "yes")
+                try:
+                    hours = float(row.get("tian1") or row.get("jbf") or 0)
+                except (TypeError, ValueError):
+                    hours = 0
+                xm = (row.get("xm") or "").strip()
+                if need_exchange and hours > 0 and xm:
+                    tickets = math.floor(hours) / 4  # 1小时=0.25张，向下取整到整小时后折算
+                    if tickets > 0:
+                        tickets_items.append((xm, tickets))
+                        hxp_updates.append((tickets, row["id"]))
+                else:
+                    jbf_updates.append((hours, row["id"]))
+            _add_exchange_tickets_tx(cursor, tickets_items)
+            if hxp_updates:
+                cursor.executemany("UPDATE jiaban SET hxp = %s, jbf = 0 WHERE id = %s", hxp_updates)
+            if jbf_updates:
+                cursor.executemany("UPDATE jiaban SET jbf = %s, hxp = 0 WHERE id = %s", jbf_updates)
+            final_count = len(final_rows)
+            reverted = (4, 22) in groups
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"加班批量审批失败（已回滚）: {e}")
+        raise HTTPException(status_code=500, detail=f"批量审批失败，已回滚: {e}")
+    # 最终通过或驳回已通过（jiabanzt=4）的记录时统计结果变化
+    if final_count or reverted:
+        bump_stats_version(SCOPE_OVERTIME)
+    publish_pending_change(
+        KIND_OVERTIME,
+        [r.get(k) for r in rows.values() for k in ("spr", "spr2")] + [_get_dakaman()],
+        action=req.action,
+    )
+    return _batch_result(ids, results)
 
 
 def _parse_overtime_datetime(date_str: str, time_str: str) -> Optional[str]:
@@ -539,6 +796,49 @@ class OvertimeValidateRequest(BaseModel):
     items: List[OvertimeValidateItem]
 
 
+def _punch_intervals(row: dict, date_ymd: str):
+    """由一条打卡记录构建 (time_1,time_2),(time_3,time_4)... 区间"""
+    punch_starts, punch_ends = [], []
+    for i in range(1, 10, 2):
+        t1 = row.get(f"time_{i}")
+        t2 = row.get(f"time_{i+1}")
+        if t1 is None or t2 is None:
+            continue
+        t1 = format_datetime_plain(t1) if t1 else ""
+        t2 = format_datetime_plain(t2) if t2 else ""
+        if isinstance(t1, str) and " " not in t1 and len(t1) <= 8:
+            t1 = f"{date_ymd} {t1}" if len(t1) > 5 else f"{date_ymd} {t1}:00"
+        if isinstance(t2, str) and " " not in t2 and len(t2) <= 8:
+            t2 = f"{date_ymd} {t2}" if len(t2) > 5 else f"{date_ymd} {t2}:00"
+        if t1 and t2 and t1 < t2:
+            punch_starts.append(t1[:19])
+            punch_ends.append(t2[:19])
+    return punch_starts, punch_ends
+
+
+def _plain_dt(v) -> str:
+    s = format_datetime_plain(v) or ""
+    if "." in s:
+        s = s.split(".")[0]
+    return s[:19]
+
+
+def _overlapping_ids(intervals: List[tuple]) -> set:
+    """
+    同一申请人的 [(id, start, end)]：按开始时间排序后扫描，
+    维护仍未结束的区间，与当前区间重叠的全部标记。
+    """
+    marked = set()
+    active = []  # [(end, id)]
+    for iid, start, end in sorted(intervals, key=lambda x: (x[1], x[2])):
+        active = [(e, a) for e, a in active if e > start]
+        if active:
+            marked.add(iid)
+            marked.update(a for _, a in active)
+        active.append((end, iid))
+    return marked
+
+
 @router.post("/overtime/validate")
 async def overtime_validate(req: OvertimeValidateRequest):
     """
@@ -546,99 +846,94 @@ async def overtime_validate(req: OvertimeValidateRequest):
     1) 列表内时间段重复 -> 不通过，原因「时间段重复」
     2) 与打卡记录对比，加班区间未被某段打卡包含 -> 不通过，原因「打卡不实」
     3) 与 jiaban 表已有记录时间段重叠 -> 不通过，原因「重复申报」
+    打卡记录按 (姓名, 日期) 集合一次查询，jiaban 按本批最早开始~最晚结束的时间窗一次查询，
+    查询次数与条数无关。
     """
-    results = []
     items = req.items or []
     if not items:
-        return {"success": True, "results": results}
+        return {"success": True, "results": []}
 
-    # 解析每条为 (id, applicant, start_dt_str, end_dt_str)
-    parsed = []
+    # 解析每条为 id -> (applicant, start_dt_str, end_dt_str)
+    parsed = {}
+    invalid_ids = set()
     for it in items:
         start_dt = _parse_overtime_datetime(it.date, it.startTime)
         end_dt = _parse_overtime_datetime(it.date, it.endTime)
         if not start_dt or not end_dt or start_dt >= end_dt:
-            results.append({"id": it.id, "pass": False, "reason": "时间无效"})
+            invalid_ids.add(it.id)
             continue
-        parsed.append((it.id, (it.applicant or "").strip(), start_dt, end_dt))
+        parsed.setdefault(it.id, ((it.applicant or "").strip(), start_dt, end_dt))
 
     # 1) 列表内重复：仅同一申请人下，两条时间段重叠则标为「时间段重复」（不同申请人同时间段不视为重复）
+    by_applicant = defaultdict(list)
+    for iid, (applicant, start_dt, end_dt) in parsed.items():
+        by_applicant[applicant].append((iid, start_dt, end_dt))
     duplicate_ids = set()
-    for i in range(len(parsed)):
-        id_i, app_i, s1, e1 = parsed[i]
-        for j in range(i + 1, len(parsed)):
-            id_j, app_j, s2, e2 = parsed[j]
-            if (app_i or "") != (app_j or ""):
-                continue
-            if _intervals_overlap(s1, e1, s2, e2):
-                duplicate_ids.add(id_i)
-                duplicate_ids.add(id_j)
+    for intervals in by_applicant.values():
+        if len(intervals) > 1:
+            duplicate_ids |= _overlapping_ids(intervals)
+
+    to_check = {iid: rec for iid, rec in parsed.items() if iid not in duplicate_ids}
+
+    # 2) 打卡记录：一次查询本批需要的全部 (姓名, 日期)
+    punches = defaultdict(list)
+    if to_check:
+        pairs = [(applicant, start_dt[:10]) for applicant, start_dt, _ in to_check.values()]
+        try:
+            att_records = attendance_db.query_by_name_date_pairs(pairs)
+        except Exception:
+            att_records = []
+        for row in att_records:
+            key = ((row.get("employee_name") or "").strip(), str(row.get("attendance_date") or "")[:10])
+            punches[key].append(row)
+
+    # 3) jiaban 已有记录：一次查询本批申请人在 [最早开始, 最晚结束] 内的记录
+    db_intervals = defaultdict(list)
+    if to_check:
+        names = sorted({rec[0] for rec in to_check.values()})
+        window_start = min(rec[1] for rec in to_check.values())
+        window_end = max(rec[2] for rec in to_check.values())
+        placeholders = ", ".join(["%s"] * len(names))
+        try:
+            other_rows = db.execute_query(
+                f"SELECT id, xm, timefrom, timeto FROM jiaban WHERE xm IN ({placeholders}) "
+                "AND timefrom < %s AND timeto > %s",
+                tuple(names) + (window_end, window_start),
+            ) or []
+        except Exception:
+            other_rows = []
+        for row in other_rows:
+            r_start, r_end = _plain_dt(row.get("timefrom")), _plain_dt(row.get("timeto"))
+            if r_start and r_end:
+                db_intervals[(row.get("xm") or "").strip()].append((str(row.get("id")), r_start, r_end))
 
+    results = []
     for it in items:
+        if it.id in invalid_ids:
+            results.append({"id": it.id, "pass": False, "reason": "时间无效"})
+            continue
         if it.id in duplicate_ids:
             results.append({"id": it.id, "pass": False, "reason": "时间段重复"})
             continue
-        # 找到该条解析
-        rec = None
-        for p in parsed:
-            if p[0] == it.id:
-                rec = p
-                break
+        rec = to_check.get(it.id)
         if not rec:
             continue
-        _, applicant, start_dt, end_dt = rec
-
-        # 2) 打卡校验：查该人当日打卡，构建 (time_1,time_2),(time_3,time_4)... 区间，看是否包含
+        applicant, start_dt, end_dt = rec
         date_ymd = start_dt[:10]
-        try:
-            att_records = attendance_db.query_by_date_range(date_ymd, date_ymd, name=applicant)
-        except Exception:
-            att_records = []
-        punch_contained = False
-        if att_records:
-            for row in att_records:
-                punch_starts = []
-                punch_ends = []
-                for i in range(1, 10, 2):
-                    t1 = row.get(f"time_{i}")
-                    t2 = row.get(f"time_{i+1}")
-                    if t1 is None or t2 is None:
-                        continue
-                    t1 = format_datetime_plain(t1) if t1 else ""
-                    t2 = format_datetime_plain(t2) if t2 else ""
-                    if isinstance(t1, str) and " " not in t1 and len(t1) <= 8:
-                        t1 = f"{date_ymd} {t1}" if len(t1) > 5 else f"{date_ymd} {t1}:00"
-                    if isinstance(t2, str) and " " not in t2 and len(t2) <= 8:
-                        t2 = f"{date_ymd} {t2}" if len(t2) > 5 else f"{date_ymd} {t2}:00"
-                    if t1 and t2 and t1 < t2:
-                        punch_starts.append(t1[:19])
-                        punch_ends.append(t2[:19])
-                if _interval_contained_in(start_dt, end_dt, punch_starts, punch_ends):
-                    punch_contained = True
-                    break
+
+        punch_contained = any(
+            _interval_contained_in(start_dt, end_dt, *_punch_intervals(row, date_ymd))
+            for row in punches.get((applicant, date_ymd), [])
+        )
         if not punch_contained:
             results.append({"id": it.id, "pass": False, "reason": "打卡不实"})
             continue
 
-        # 3) jiaban 表查重：同人、非本条，时间段重叠
-        try:
-            other_rows = db.execute_query(
-                "SELECT id, timefrom, timeto FROM jiaban WHERE xm = %s AND id != %s",
-                (applicant, it.id)
-            ) or []
-        except Exception:
-            other_rows = []
-        overlap_with_db = False
-        for row in other_rows:
-            r_start = format_datetime_plain(row.get("timefrom")) or ""
-            r_end = format_datetime_plain(row.get("timeto")) or ""
-            if "." in r_start:
-                r_start = r_start.split(".")[0]
-            if "." in r_end:
-                r_end = r_end.split(".")[0]
-            if r_start and r_end and _intervals_overlap(start_dt, end_dt, r_start[:19], r_end[:19]):
-                overlap_with_db = True
-                break
+        # 同人、非本条，时间段重叠
+        overlap_with_db = any(
+            rid != str(it.id) and _intervals_overlap(start_dt, end_dt, r_start, r_end)
+            for rid, r_start, r_end in db_intervals.get(applicant, [])
+        )
         if overlap_with_db:
             results.append({"id": it.id, "pass": False, "reason": "重复申报"})
             continue
@@ -801,6 +1096,9 @@ async def business_trip_approve_action(item_id: str, req: ApproveRequest):
                 )
         else:
             raise HTTPException(status_code=400, detail="当前状态无法驳回")
+        # 个人公出记录不按审批状态过滤，驳回同样使公出缓存失效
+        bump_stats_version(SCOPE_TRIP)
+        publish_pending_change(KIND_TRIP, (row.get("szr"), row.get("bld")), item_id, "reject")
         return {"success": True, "message": "已驳回"}
 
     if req.action != "approve":
@@ -816,9 +1114,11 @@ async def business_trip_approve_action(item_id: str, req: ApproveRequest):
             "UPDATE gcsqb SET bldzt = 2, bldpztime = %s WHERE id = %s",
             (now, item_id)
         )
+        bump_stats_version(SCOPE_TRIP)
     else:
         raise HTTPException(status_code=400, detail="当前状态无法审批")
 
+    publish_pending_change(KIND_TRIP, (row.get("szr"), row.get("bld")), item_id, "approve")
     return {"success": True, "message": "已通过"}
 
 
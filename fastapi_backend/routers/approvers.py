@@ -8,10 +8,12 @@
   4. jb(主任/副主任) -> jb(部长/副部长) + 同室 jb(主任/副主任)，同室列表排除本人（支持同级审批）
   5. lsys(隶属于室) 所有人员 -> jb(部长)
   6. 二级审批 -> jb(部长/副部长)
+候选审批人由 services/approver_routing.py 预先计算，接口直接查内存。
 """
 from fastapi import APIRouter, HTTPException, Query
 from typing import Optional, List
 from database import db
+from services.approver_routing import get_approver_routing
 import logging
 
 logger = logging.getLogger(__name__)
@@ -50,110 +52,23 @@ def _get_user_info(name: str) -> Optional[dict]:
 
 
 def _get_approvers_first(name: str) -> List[dict]:
-    """第一审批人：根据申请人 jb、lsys 按规则筛选"""
-    user = _get_user_info(name)
-    if not user:
-        return []
-
-    jb = (user.get("jb") or "").strip()
-    lsys = (user.get("lsys") or "").strip()
-
-    # 规则5: lsys(部办) 所有人员 -> jb(部长)
-    if "部办" in lsys or lsys == "部办":
-        rows = db.execute_query(
-            "SELECT name, jb, lsys FROM yggl WHERE (jb = %s OR jb LIKE %s) AND name IS NOT NULL AND name != '' AND (COALESCE(zaizhi,0)=0) ORDER BY jb, name",
-            ("部长", "部长%")
-        )
-        return [{"name": r["name"], "jb": r.get("jb"), "lsys": r.get("lsys")} for r in rows]
-
-    # 规则4: jb(主任/副主任) -> jb(部长/副部长) + 同室主任/副主任（同级审批，排除本人）
-    if _jb_match(jb, "主任") or _jb_match(jb, "副主任"):
-        rows_bu = db.execute_query(
-            "SELECT name, jb, lsys FROM yggl WHERE (jb = %s OR jb LIKE %s OR jb = %s OR jb LIKE %s) AND name IS NOT NULL AND name != '' AND (COALESCE(zaizhi,0)=0) ORDER BY jb, name",
-            ("部长", "部长%", "副部长", "副部长%")
-        )
-        result = [{"name": r["name"], "jb": r.get("jb"), "lsys": r.get("lsys")} for r in rows_bu]
-        if lsys:
-            rows_room = db.execute_query(
-                "SELECT name, jb, lsys FROM yggl WHERE lsys = %s AND ((jb = %s OR jb LIKE %s) OR (jb = %s OR jb LIKE %s)) AND name IS NOT NULL AND name != '' AND name != %s AND (COALESCE(zaizhi,0)=0) ORDER BY jb, name",
-                (lsys, "主任", "主任%", "副主任", "副主任%", name)
-            )
-            for r in rows_room:
-                result.append({"name": r["name"], "jb": r.get("jb"), "lsys": r.get("lsys")})
-        return result
-
-    # 规则2、3: jb(组长)、jb(责任工艺师) -> lsys(同词条) jb(主任/副主任)
-    if _jb_match(jb, "组长") or _jb_match(jb, "责任工艺师"):
-        if not lsys:
-            return []
-        rows = db.execute_query(
-            "SELECT name, jb, lsys FROM yggl WHERE lsys = %s AND ((jb = %s OR jb LIKE %s) OR (jb = %s OR jb LIKE %s)) AND name IS NOT NULL AND name != '' AND (COALESCE(zaizhi,0)=0) ORDER BY jb, name",
-            (lsys, "主任", "主任%", "副主任", "副主任%")
-        )
-        return [{"name": r["name"], "jb": r.get("jb"), "lsys": r.get("lsys")} for r in rows]
-
-    # 规则1: jb(员工) -> lsys(同词条) jb(组长/主任/副主任)
-    if _jb_match(jb, "员工") or not jb:
-        if not lsys:
-            # 无 lsys 时降级：查所有 组长/主任/副主任
-            rows = db.execute_query(
-                "SELECT name, jb, lsys FROM yggl WHERE (jb = %s OR jb LIKE %s OR jb = %s OR jb LIKE %s OR jb = %s OR jb LIKE %s) AND name IS NOT NULL AND name != '' AND (COALESCE(zaizhi,0)=0) ORDER BY lsys, jb, name",
-                ("组长", "组长%", "主任", "主任%", "副主任", "副主任%")
-            )
-        else:
-            rows = db.execute_query(
-                "SELECT name, jb, lsys FROM yggl WHERE lsys = %s AND ((jb = %s OR jb LIKE %s) OR (jb = %s OR jb LIKE %s) OR (jb = %s OR jb LIKE %s)) AND name IS NOT NULL AND name != '' AND (COALESCE(zaizhi,0)=0) ORDER BY jb, name",
-                (lsys, "组长", "组长%", "主任", "主任%", "副主任", "副主任%")
-            )
-        return [{"name": r["name"], "jb": r.get("jb"), "lsys": r.get("lsys")} for r in rows]
-
-    # 其他级别默认：同室 组长/主任/副主任，若无则 部长/副部长
-    if lsys:
-        rows = db.execute_query(
-            "SELECT name, jb, lsys FROM yggl WHERE lsys = %s AND ((jb = %s OR jb LIKE %s) OR (jb = %s OR jb LIKE %s) OR (jb = %s OR jb LIKE %s)) AND name IS NOT NULL AND name != '' AND (COALESCE(zaizhi,0)=0) ORDER BY jb, name",
-            (lsys, "组长", "组长%", "主任", "主任%", "副主任", "副主任%")
-        )
-        if rows:
-            return [{"name": r["name"], "jb": r.get("jb"), "lsys": r.get("lsys")} for r in rows]
-
-    rows = db.execute_query(
-        "SELECT name, jb, lsys FROM yggl WHERE (jb = %s OR jb LIKE %s OR jb = %s OR jb LIKE %s) AND name IS NOT NULL AND name != '' AND (COALESCE(zaizhi,0)=0) ORDER BY jb, name",
-        ("部长", "部长%", "副部长", "副部长%")
-    )
-    return [{"name": r["name"], "jb": r.get("jb"), "lsys": r.get("lsys")} for r in rows]
+    """第一审批人：根据申请人 jb、lsys 按规则筛选（查内存路由表）"""
+    return get_approver_routing().first(name)
 
 
 def _get_approvers_second(name: str) -> List[dict]:
     """第二审批人（二级审批）-> jb(部长/副部长)"""
-    rows = db.execute_query(
-        "SELECT name, jb, lsys FROM yggl WHERE (jb = %s OR jb LIKE %s OR jb = %s OR jb LIKE %s) AND name IS NOT NULL AND name != '' AND (COALESCE(zaizhi,0)=0) ORDER BY jb, name",
-        ("部长", "部长%", "副部长", "副部长%")
-    )
-    return [{"name": r["name"], "jb": r.get("jb"), "lsys": r.get("lsys")} for r in rows]
+    return get_approver_routing().second()
 
 
 def _get_dept_leaders() -> List[dict]:
     """部领导 -> jb(部长/副部长)"""
-    rows = db.execute_query(
-        "SELECT name, jb, lsys FROM yggl WHERE (jb = %s OR jb LIKE %s OR jb = %s OR jb LIKE %s) AND name IS NOT NULL AND name != '' AND (COALESCE(zaizhi,0)=0) ORDER BY jb, name",
-        ("部长", "部长%", "副部长", "副部长%")
-    )
-    return [{"name": r["name"], "jb": r.get("jb"), "lsys": r.get("lsys")} for r in rows]
+    return get_approver_routing().second()
 
 
 def _get_room_directors(name: str) -> List[dict]:
     """室主任 -> 同 lsys 的 jb(主任/副主任)"""
-    user = _get_user_info(name)
-    if not user:
-        return []
-    lsys = (user.get("lsys") or "").strip()
-    if not lsys:
-        return []
-    rows = db.execute_query(
-        "SELECT name, jb, lsys FROM yggl WHERE lsys = %s AND ((jb = %s OR jb LIKE %s) OR (jb = %s OR jb LIKE %s)) AND name IS NOT NULL AND name != '' AND (COALESCE(zaizhi,0)=0) ORDER BY jb, name",
-        (lsys, "主任", "主任%", "副主任", "副主任%")
-    )
-    return [{"name": r["name"], "jb": r.get("jb"), "lsys": r.get("lsys")} for r in rows]
+    return get_approver_routing().room(name)
 
 
 @router.get("", response_model=dict)
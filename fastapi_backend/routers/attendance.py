@@ -18,7 +18,7 @@ from database import db
 from utils.excel_processor import ExcelProcessor
 from routers.suggestions import get_attendance_exception_keys
 from routers.approvers import _get_user_info, _jb_match
-from routers.approvers import _get_user_info, _jb_match
+from services.session_token import session_for
 
 logger = logging.getLogger(__name__)
 
@@ -36,30 +36,6 @@ def _get_dakaman() -> Optional[str]:
     return None
 
 
-def _can_see_attendance_exceptions(current_user: str) -> tuple:
-    """
-    判断当前用户是否有权查看考勤异常。
-    返回 (allowed: bool, lsys: str|None)。
-    - 打卡管理员(dakaman)：可看全部，lsys 为 None 表示不按科室过滤。
-    - 班组长/主任/副主任：仅可看本室，返回其 lsys 用于过滤。
-    - 部长/副部长/员工等：无权限。
-    """
-    current_user = (current_user or "").strip()
-    if not current_user:
-        return False, None
-    dakaman = _get_dakaman()
-    if dakaman and current_user == dakaman:
-        return True, None
-    user = _get_user_info(current_user)
-    if not user:
-        return False, None
-    jb = (user.get("jb") or "").strip()
-    if _jb_match(jb, "组长") or _jb_match(jb, "主任") or _jb_match(jb, "副主任"):
-        lsys = (user.get("lsys") or "").strip()
-        return True, lsys if lsys else None
-    return False, None
-
-
 def _build_attendance_exceptions_data(year: int, month: int, filter_lsys: Optional[str]) -> List[dict]:
     """
     构建指定年月的考勤异常列表原始数据（不做权限检查）。
@@ -330,12 +306,19 @@ def _can_see_attendance_exceptions(current_user: str) -> tuple:
     current_user = (current_user or "").strip()
     if not current_user:
         return False, None
-    dakaman = _get_dakaman()
-    if dakaman and current_user == dakaman:
-        return True, None
-    user = _get_user_info(current_user)
-    if not user:
-        return False, None
+    claims = session_for(current_user)
+    if claims is not None:
+        # 令牌中已带打卡管理员标识与科室/级别，不查库
+        if claims.get("dakaman"):
+            return True, None
+        user = claims
+    else:
+        dakaman = _get_dakaman()
+        if dakaman and current_user == dakaman:
+            return True, None
+        user = _get_user_info(current_user)
+        if not user:
+            return False, None
     jb = (user.get("jb") or "").strip()
     if _jb_match(jb, "组长") or _jb_match(jb, "主任") or _jb_match(jb, "副主任"):
         lsys = (user.get("lsys") or "").strip()
@@ -2,11 +2,16 @@
 """
 登录认证API路由
 """
+import asyncio
 import math
 import logging
+from datetime import date
+from typing import Optional
 from fastapi import APIRouter, Query
 from pydantic import BaseModel
+from config import settings
 from database import db
+from services.session_token import issue_session_token
 
 logger = logging.getLogger(__name__)
 
@@ -65,6 +70,12 @@ async def login(request: LoginRequest):
             "gh": (user_data.get("gh") or "").strip(),
             "xbie": (user_data.get("xbie") or "").strip()
         }
+        # 会话令牌：携带科室、级别与管理员标识，后续权限判断不再逐次查库
+        wc_rows = db.execute_query("SELECT * FROM webconfig WHERE id = %s LIMIT 1", ("1",))
+        token = issue_session_token(user_info["name"], user_info["dept"], user_info["jb"], wc_rows[0] if wc_rows else None)
+        if token:
+            user_info["token"] = token
+            user_info["tokenExpiresIn"] = settings.SESSION_TOKEN_EXPIRE_SECONDS
         return LoginResponse(
             success=True,
             message="登录成功",
@@ -79,115 +90,165 @@ async def login(request: LoginRequest):
         )
 
 
+def _load_profile_row(name: str, active_only: bool = True) -> Optional[dict]:
+    """读取 yggl 中的个人信息行（兼容无 sfzh/rcnf 列）"""
+    where = "name=%s AND (COALESCE(zaizhi,0)=0)" if active_only else "name=%s"
+    try:
+        rows = db.execute_query(
+            f"SELECT name, gh, lsys, jb, sfzh, rcnf, zaizhi FROM yggl WHERE {where} LIMIT 1", (name,)
+        )
+    except Exception:
+        # 兼容无 sfzh/rcnf 列：仅查基础字段
+        rows = db.execute_query(f"SELECT name, gh, lsys, jb, zaizhi FROM yggl WHERE {where} LIMIT 1", (name,))
+    return rows[0] if rows else None
+
+
+def _entry_date(r: dict) -> str:
+    """入厂时间 rcnf：只展示年份，不展示 -01-01"""
+    rcnf_val = r.get("rcnf")
+    if hasattr(rcnf_val, "strftime"):
+        raw = rcnf_val.strftime("%Y-%m-%d")
+    elif rcnf_val is not None and str(rcnf_val).strip():
+        raw = str(rcnf_val).strip()[:10]
+    else:
+        raw = ""
+    if raw and len(raw) >= 4 and raw.endswith("-01-01"):
+        return raw[:4]  # 仅年份
+    return raw
+
+
+def _paid_leave(name: str, entry_date: str):
+    """
+    带薪休假剩余：工龄 1~9年5天、10~19年10天、20年以上15天；公司固定扣除3天（高温假）；
+    本年已用从 qj 表统计（仅带薪休假/年休假，已通过，按0.25天进位）。返回 (remaining, detail)
+    """
+    try:
+        entry_year = int(entry_date[:4]) if entry_date and len(entry_date) >= 4 and entry_date[:4].isdigit() else None
+        if entry_year is None:
+            return None, None
+        current_year = date.today().year
+        years = current_year - entry_year
+        if years < 1:
+            entitlement = 0
+        elif years < 10:
+            entitlement = 5
+        elif years < 20:
+            entitlement = 10
+        else:
+            entitlement = 15
+        deducted = 3  # 固定高温假公休
+        available = max(0, entitlement - deducted)
+        # 本年已通过的带薪休假/年休假天数（qj 表，最小单位 0.25 天，不够进位）
+        qj_rows = db.execute_query(
+            "SELECT COALESCE(SUM(CAST(tian AS DECIMAL(10,4))), 0) AS total FROM qj WHERE xm = %s AND qjzt = 4 AND YEAR(timefrom) = %s AND (TRIM(COALESCE(qjfs,'')) LIKE %s OR TRIM(COALESCE(qjfs,'')) LIKE %s OR TRIM(COALESCE(qjfs,'')) = %s OR TRIM(COALESCE(qjfs,'')) = %s)",
+            (name, current_year, "%带薪%", "%年休假%", "带薪休假", "年休假"),
+        )
+        used_raw = float(qj_rows[0]["total"]) if qj_rows and qj_rows[0].get("total") is not None else 0.0
+        used_rounded = math.ceil(used_raw / 0.25) * 0.25
+        remaining = round(max(0, available - used_rounded) * 4) / 4
+        return remaining, {
+            "entitlement": entitlement,
+            "deducted": deducted,
+            "used": round(used_rounded, 2),
+            "remaining": round(remaining, 2),
+        }
+    except Exception as e:
+        logger.debug(f"带薪休假计算失败: {e}")
+        return None, None
+
+
+def _profile_data(r: dict, entry_date: str, hxp_balance: dict, paid_leave) -> dict:
+    paid_leave_remaining, paid_leave_detail = paid_leave
+    return {
+        "name": (r.get("name") or "").strip(),
+        "workNo": (r.get("gh") or "").strip(),
+        "department": (r.get("lsys") or "").strip(),
+        "level": (r.get("jb") or "").strip(),
+        "idNumber": (r.get("sfzh") or "").strip(),
+        "entryDate": entry_date,
+        "exchangeTickets": round(hxp_balance["total"], 2),
+        "exchangeTicketDetails": hxp_balance["details"],
+        "paidLeaveRemaining": paid_leave_remaining,
+        "paidLeaveDetail": paid_leave_detail,
+    }
+
+
 @router.get("/profile")
 async def get_profile(name: str = Query(..., description="员工姓名")):
     """获取员工信息：用户名、工号、科室、级别、身份证号、入厂时间、换休票总数及明细（按过期日分组）"""
     try:
-        from utils.hxp_helper import compute_expire_date, parse_expire_for_sort
-        sql = (
-            "SELECT name, gh, lsys, jb, sfzh, rcnf FROM yggl WHERE name=%s AND (COALESCE(zaizhi,0)=0) LIMIT 1"
-        )
-        try:
-            rows = db.execute_query(sql, (name,))
-        except Exception:
-            # 兼容无 sfzh/rcnf 列：仅查基础字段
-            rows = db.execute_query(
-                "SELECT name, gh, lsys, jb FROM yggl WHERE name=%s AND (COALESCE(zaizhi,0)=0) LIMIT 1",
-                (name,),
-            )
-        if not rows:
+        from services.hxp_ledger import get_balance
+        r = _load_profile_row(name)
+        if not r:
             return {"success": False, "message": "用户不存在或已离职"}
-        r = rows[0]
-        # 换休票：从 hxp 表按 sl 加和，排除已过期
-        from datetime import date
-        today = date.today().strftime("%Y-%m-%d")
-        hxp_rows = db.execute_query(
-            "SELECT id, sl, sj FROM hxp WHERE name = %s AND sl > 0", (name,)
+        # 换休票：读 hxp_balance 余额汇总，明细按过期日分组（已过期不计入）
+        entry_date = _entry_date(r)
+        return {"success": True, "data": _profile_data(r, entry_date, get_balance(name), _paid_leave(name, entry_date))}
+    except Exception as e:
+        logger.error(f"获取员工信息失败: {str(e)}")
+        return {"success": False, "message": str(e)}
+
+
+@router.get("/bootstrap")
+async def bootstrap(name: str = Query(..., description="当前登录用户姓名")):
+    """
+    登录后首页一次性数据，替代 can-approve、statistics-permission、overtime-pay-permission、
+    db-manager/permission、department-policy/can-upload、auth/profile 与待办列表的多次请求：
+    yggl 与 webconfig 各查一次，换休票、带薪休假、待办数量并发计算。
+    各权限字段与对应接口的返回一致。
+    """
+    try:
+        from routers.approval import _can_approve_result
+        from routers.report import _statistics_level, _can_view_overtime_pay
+        from routers.department_policy import _can_upload_policy_row
+        from services.hxp_ledger import get_balance
+        from services.pending_notify import count_pending
+
+        name_s = (name or "").strip()
+        loop = asyncio.get_event_loop()
+
+        def run(func, *args):
+            return loop.run_in_executor(None, func, *args)
+
+        user, wc_rows = await asyncio.gather(
+            run(_load_profile_row, name, False),
+            run(db.execute_query, "SELECT * FROM webconfig WHERE id = 1 LIMIT 1"),
         )
-        total = 0.0
-        expire_groups = {}
-        for row in hxp_rows:
-            try:
-                sl = float(row.get("sl") or 0)
-            except (TypeError, ValueError):
-                sl = 0.0
-            if sl <= 0:
-                continue
-            exp = compute_expire_date(row.get("sj"))
-            if exp and exp < today:
-                continue  # 已过期，不计入
-            total += sl
-            if exp:
-                expire_groups[exp] = expire_groups.get(exp, 0.0) + sl
-        details = [
-            {"expireDate": k, "count": round(v, 2)}
-            for k, v in sorted(expire_groups.items(), key=lambda x: parse_expire_for_sort(x[0]))
-        ]
-        # 入厂时间 rcnf：只展示年份，不展示 -01-01
-        rcnf_val = r.get("rcnf")
-        if hasattr(rcnf_val, "strftime"):
-            raw = rcnf_val.strftime("%Y-%m-%d")
-        elif rcnf_val is not None and str(rcnf_val).strip():
-            raw = str(rcnf_val).strip()[:10]
-        else:
-            raw = ""
-        if raw and len(raw) >= 4 and raw.endswith("-01-01"):
-            entry_date = raw[:4]  # 仅年份
-        else:
-            entry_date = raw
-        # 带薪休假剩余：工龄 1~9年5天、10~19年10天、20年以上15天；公司固定扣除3天（高温假）；本年已用从 qj 表统计（仅带薪休假/年休假，已通过，按0.25天进位）
-        paid_leave_remaining = None
-        paid_leave_detail = None
-        try:
-            entry_year = int(entry_date[:4]) if entry_date and len(entry_date) >= 4 and entry_date[:4].isdigit() else None
-            if entry_year is not None:
-                from datetime import date
-                current_year = date.today().year
-                years = current_year - entry_year
-                if years < 1:
-                    entitlement = 0
-                elif years < 10:
-                    entitlement = 5
-                elif years < 20:
-                    entitlement = 10
-                else:
-                    entitlement = 15
-                deducted = 3  # 固定高温假公休
-                available = max(0, entitlement - deducted)
-                # 本年已通过的带薪休假/年休假天数（qj 表，最小单位 0.25 天，不够进位）
-                qj_rows = db.execute_query(
-                    "SELECT COALESCE(SUM(CAST(tian AS DECIMAL(10,4))), 0) AS total FROM qj WHERE xm = %s AND qjzt = 4 AND YEAR(timefrom) = %s AND (TRIM(COALESCE(qjfs,'')) LIKE %s OR TRIM(COALESCE(qjfs,'')) LIKE %s OR TRIM(COALESCE(qjfs,'')) = %s OR TRIM(COALESCE(qjfs,'')) = %s)",
-                    (name, current_year, "%带薪%", "%年休假%", "带薪休假", "年休假"),
-                )
-                used_raw = float(qj_rows[0]["total"]) if qj_rows and qj_rows[0].get("total") is not None else 0.0
-                used_rounded = math.ceil(used_raw / 0.25) * 0.25
-                remaining = round(max(0, available - used_rounded) * 4) / 4
-                paid_leave_remaining = remaining
-                paid_leave_detail = {
-                    "entitlement": entitlement,
-                    "deducted": deducted,
-                    "used": round(used_rounded, 2),
-                    "remaining": round(remaining, 2),
-                }
-        except Exception as e:
-            logger.debug(f"带薪休假计算失败: {e}")
+        wc = wc_rows[0] if wc_rows else {}
+        admin1 = (wc.get("admin1") or "").strip() or None
+        dakaman = (wc.get("dakaman") or "").strip() or None
+        active = bool(user) and int(user.get("zaizhi") or 0) == 0
+
+        entry_date = _entry_date(user) if active else ""
+        jobs = [run(count_pending, name_s)]
+        if active:
+            jobs += [run(get_balance, name), run(_paid_leave, name, entry_date)]
+        results = await asyncio.gather(*jobs)
+        pending_counts = results[0]
+        profile = _profile_data(user, entry_date, results[1], results[2]) if active else None
+
+        can_approve = _can_approve_result(name, user, dakaman)
+        can_approve.pop("success", None)
         return {
             "success": True,
             "data": {
-                "name": (r.get("name") or "").strip(),
-                "workNo": (r.get("gh") or "").strip(),
-                "department": (r.get("lsys") or "").strip(),
-                "level": (r.get("jb") or "").strip(),
-                "idNumber": (r.get("sfzh") or "").strip(),
-                "entryDate": entry_date,
-                "exchangeTickets": round(total, 2),
-                "exchangeTicketDetails": details,
-                "paidLeaveRemaining": paid_leave_remaining,
-                "paidLeaveDetail": paid_leave_detail,
-            }
+                "name": name_s,
+                "permissions": {
+                    "approval": can_approve,
+                    "statistics": {
+                        "level": _statistics_level(user),
+                        "lsys": (user.get("lsys") or "").strip() if user else "",
+                    },
+                    "overtimePay": {"canView": _can_view_overtime_pay(name, user, wc.get("admin2"))},
+                    "dbManager": {"canAccess": bool(admin1 and name_s == admin1)},
+                    "departmentPolicy": {"canUpload": _can_upload_policy_row(user)},
+                },
+                "profile": profile,
+                "pendingCounts": pending_counts,
+            },
         }
     except Exception as e:
-        logger.error(f"获取员工信息失败: {str(e)}")
+        logger.error(f"获取首页数据失败: {str(e)}")
         return {"success": False, "message": str(e)}
 
 
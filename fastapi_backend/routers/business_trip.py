@@ -14,6 +14,8 @@ from typing import Optional, List
 from pydantic import BaseModel
 from datetime import datetime
 from database import db
+from utils.stats_cache import bump_stats_version, SCOPE_TRIP
+from services.pending_notify import publish_pending_change, KIND_TRIP
 from routers.approvers import _get_user_info, _jb_match
 import logging
 import uuid
@@ -99,6 +101,9 @@ async def apply_business_trip(req: BusinessTripApplyRequest):
         affected = db.execute_update(sql, params)
         if affected <= 0:
             raise HTTPException(status_code=500, detail="插入公出记录失败")
+        # 个人公出记录（report /business-trip）不按审批状态过滤，新登记也需使缓存失效
+        bump_stats_version(SCOPE_TRIP)
+        publish_pending_change(KIND_TRIP, [req.responsiblePerson], rid)
 
         return {"success": True, "message": "公出登记已提交", "id": rid}
     except HTTPException:
@@ -277,6 +282,8 @@ async def set_business_trip_return_time(item_id: str, body: ReturnTimeBody):
         n = db.execute_update(sql, (gcsj, sjfhtime, item_id))
         if n <= 0:
             raise HTTPException(status_code=404, detail="记录不存在")
+        # 公出统计按实际公出区间计天数，返回登记后需使统计缓存失效
+        bump_stats_version(SCOPE_TRIP)
         return {"success": True, "message": "公出返回登记已完成"}
     except HTTPException:
         raise
@@ -305,6 +312,7 @@ async def delete_business_trip_rejected(item_id: str, name: str):
         )
         if n <= 0:
             raise HTTPException(status_code=500, detail="删除未生效")
+        bump_stats_version(SCOPE_TRIP)
         return {"success": True, "message": "已删除"}
     except HTTPException:
         raise
@@ -12,6 +12,11 @@ import tempfile
 from fastapi import APIRouter, HTTPException, Query, File, UploadFile, Form
 from pydantic import BaseModel
 from database import db
+from services.session_token import revoke_sessions, session_for
+from utils.stats_cache import (
+    bump_stats_version,
+    SCOPE_LEAVE, SCOPE_OVERTIME, SCOPE_TRIP, SCOPE_STAFF, SCOPE_HOLIDAY, SCOPE_CONFIG,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +25,32 @@ router = APIRouter(prefix="/db-manager", tags=["系统管理员-数据库"])
 # 表名/列名只允许字母数字下划线，防止 SQL 注入
 _NAME_PATTERN = re.compile(r"^[a-zA-Z0-9_]+$")
 
+# 直接改表时需同步失效的统计缓存范围
+_STATS_SCOPE_BY_TABLE = {
+    "qj": SCOPE_LEAVE,
+    "jiaban": SCOPE_OVERTIME,
+    "gcsqb": SCOPE_TRIP,
+    "yggl": SCOPE_STAFF,
+    "holiday": SCOPE_HOLIDAY,
+    "webconfig": SCOPE_CONFIG,
+}
+
+
+def _bump_stats_for_table(table_name: str) -> None:
+    scope = _STATS_SCOPE_BY_TABLE.get((table_name or "").lower())
+    if scope:
+        bump_stats_version(scope)
+    if (table_name or "").lower() == "yggl":
+        from services.approver_routing import invalidate_approver_routing
+        invalidate_approver_routing()
+    if (table_name or "").lower() in ("yggl", "webconfig"):
+        # 直接改员工或管理员配置时无法确定受影响的人，撤销全部会话令牌
+        revoke_sessions()
+    if (table_name or "").lower() == "hxp":
+        # 直接增删改换休票后补齐过期日并重算余额汇总
+        from services.hxp_ledger import rebuild_balances
+        rebuild_balances()
+
 
 def _get_admin1() -> Optional[str]:
     """从 webconfig 表读取 admin1（系统管理员用户名，对应 yggl.name）。"""
@@ -37,6 +68,11 @@ def _get_admin1() -> Optional[str]:
 
 def _require_system_admin(current_user: str) -> None:
     """校验当前用户是否为系统管理员（admin1），否则 403。"""
+    claims = session_for(current_user)
+    if claims is not None:
+        if not claims.get("admin1"):
+            raise HTTPException(status_code=403, detail="仅系统管理员（webconfig.admin1）可操作")
+        return
     admin1 = _get_admin1()
     if not admin1 or (current_user or "").strip() != admin1:
         raise HTTPException(status_code=403, detail="仅系统管理员（webconfig.admin1）可操作")
@@ -217,6 +253,7 @@ async def insert_table_row(
         sql = f"INSERT INTO {safe_table} ({columns}) VALUES ({placeholders})"
         params = tuple(valid.values())
         db.execute_update(sql, params)
+        _bump_stats_for_table(table_name)
         return {"success": True, "message": "插入成功"}
     except HTTPException:
         raise
@@ -275,6 +312,7 @@ async def update_table_row(
         safe_table = f"`{table_name}`"
         sql = f"UPDATE {safe_table} SET {', '.join(set_parts)} WHERE {' AND '.join(where_parts)}"
         n = db.execute_update(sql, tuple(set_params))
+        _bump_stats_for_table(table_name)
         return {"success": True, "message": "更新成功", "affected": n}
     except HTTPException:
         raise
@@ -317,6 +355,7 @@ async def delete_table_row(
         safe_table = f"`{table_name}`"
         sql = f"DELETE FROM {safe_table} WHERE {' AND '.join(where_parts)}"
         n = db.execute_update(sql, tuple(params))
+        _bump_stats_for_table(table_name)
         return {"success": True, "message": "删除成功", "affected": n}
     except HTTPException:
         raise
@@ -459,6 +498,8 @@ async def yggl_fill_by_excel(
         n = db.execute_update(sql, (val if val else None, name))
         if n > 0:
             updated += n
+    if updated:
+        _bump_stats_for_table("yggl")
     return {
         "success": True,
         "updated": updated,
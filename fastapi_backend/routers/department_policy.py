@@ -6,17 +6,20 @@
 """
 import os
 import uuid
-import subprocess
-import shutil
+import hashlib
 import asyncio
 from pathlib import Path
-from fastapi import APIRouter, HTTPException, Query, File, UploadFile
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Query, File, UploadFile, Request
 from typing import Optional, List
 from pydantic import BaseModel
 from datetime import datetime
 from database import db
 from config import settings
+from services.session_token import session_for
+from services.office_convert import get_office_pool
+from services.pdf_cache import get_pdf_cache
+from services.policy_text import ensure_text_store_once, file_content_hash
+from utils.file_response import CACHE_PRIVATE_DAY, file_response
 import logging
 
 logger = logging.getLogger(__name__)
@@ -26,14 +29,8 @@ router = APIRouter(prefix="/department-policy", tags=["部门制度查询"])
 _BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 _DATA_DIR = os.path.join(_BASE_DIR, "data")
 POLICY_DIR = os.path.join(_DATA_DIR, "policy_files")
-PDF_CACHE_DIR = os.path.join(POLICY_DIR, "pdf_cache")
 
 
-def _get_libreoffice_cmd():
-    if getattr(settings, "LIBREOFFICE_CMD", "") and str(settings.LIBREOFFICE_CMD).strip():
-        return str(settings.LIBREOFFICE_CMD).strip()
-    return shutil.which("libreoffice") or shutil.which("soffice") or "libreoffice"
-
 ALLOWED_EXTENSIONS = {".pdf", ".doc", ".docx", ".xls", ".xlsx"}
 CONVERTIBLE_TYPES = {"doc", "docx", "xls", "xlsx"}
 MIME_MAP = {
@@ -47,41 +44,35 @@ MIME_MAP = {
 
 def _ensure_policy_dir():
     os.makedirs(POLICY_DIR, exist_ok=True)
-    os.makedirs(PDF_CACHE_DIR, exist_ok=True)
 
 
-def _convert_to_pdf_sync(source_path: str) -> Optional[str]:
-    """使用 LibreOffice 将 Word/Excel 转为 PDF，返回 PDF 路径"""
+def _policy_content_hash(rid: str, full_path: str, stored: Optional[str]) -> Optional[str]:
+    """制度文件的内容哈希：优先用 dept_policy.content_hash，缺失时计算并回填"""
+    if stored:
+        return stored
+    content_hash = file_content_hash(full_path)
+    # content_hash 列未建好时只计算不回填
+    if content_hash and ensure_text_store_once():
+        db.execute_update("UPDATE dept_policy SET content_hash = %s WHERE id = %s", (content_hash, rid))
+    return content_hash
+
+
+async def _convert_to_pdf(source_path: str, content_hash: str) -> Optional[str]:
+    """使用 LibreOffice 转换池将 Word/Excel 转为 PDF（按内容哈希缓存），返回 PDF 路径"""
     if not os.path.isfile(source_path):
         return None
-    base_name = Path(source_path).stem
-    pdf_name = f"{base_name}.pdf"
-    pdf_path = os.path.join(PDF_CACHE_DIR, pdf_name)
-    if os.path.isfile(pdf_path) and os.path.getmtime(pdf_path) >= os.path.getmtime(source_path):
+    cache = get_pdf_cache()
+    pdf_path = cache.lookup(content_hash)
+    if pdf_path:
         return pdf_path
-    out_dir = PDF_CACHE_DIR
-    cmd = _get_libreoffice_cmd()
+    fut = cache.convert(source_path, content_hash)
+    # 排队时间 + 一次重试的上限；shield 使超时不取消队列中的转换，完成后仍写入缓存
+    wait_seconds = float(settings.OFFICE_CONVERT_TIMEOUT) * 3
     try:
-        result = subprocess.run(
-            [cmd, "--headless", "--convert-to", "pdf", "--outdir", out_dir, source_path],
-            capture_output=True,
-            timeout=60,
-        )
-        if result.returncode != 0:
-            logger.error(f"LibreOffice 转换失败: {result.stderr.decode('utf-8', errors='ignore')}")
-            return None
-        if os.path.isfile(pdf_path):
-            return pdf_path
-    except FileNotFoundError:
-        logger.warning("未找到 LibreOffice，请安装 libreoffice 或 soffice")
-        return None
-    except subprocess.TimeoutExpired:
-        logger.error("LibreOffice 转换超时")
-        return None
-    except Exception as e:
-        logger.error(f"LibreOffice 转换异常: {e}")
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(fut)), timeout=wait_seconds)
+    except asyncio.TimeoutError:
+        logger.error(f"等待 PDF 转换超时: {source_path}")
         return None
-    return None
 
 
 def _row_id(r) -> Optional[str]:
@@ -97,6 +88,10 @@ def _can_upload_policy(name: str) -> bool:
     """仅 yggl 表中 lsys=综合技术室 且 jb=主任/副主任 可上传、删除"""
     if not (name or "").strip():
         return False
+    claims = session_for(name)
+    if claims is not None:
+        # 令牌只签发给在职员工
+        return _can_upload_policy_row(claims)
     rows = db.execute_query(
         """SELECT 1 FROM yggl WHERE name = %s AND TRIM(COALESCE(lsys,'')) = '综合技术室'
            AND ((jb = '主任' OR jb LIKE '主任%%') OR (jb = '副主任' OR jb LIKE '副主任%%'))
@@ -106,6 +101,18 @@ def _can_upload_policy(name: str) -> bool:
     return bool(rows)
 
 
+def _can_upload_policy_row(user: Optional[dict]) -> bool:
+    """同 _can_upload_policy，由已查出的 yggl 行（含 lsys/jb/zaizhi）判定"""
+    if not user:
+        return False
+    jb = user.get("jb") or ""
+    return (
+        (user.get("lsys") or "").strip() == "综合技术室"
+        and (jb.startswith("主任") or jb.startswith("副主任"))
+        and int(user.get("zaizhi") or 0) == 0
+    )
+
+
 @router.get("/can-upload")
 async def get_can_upload(name: str = Query(..., description="当前用户名")):
     """检查当前用户是否有制度上传权限（仅综合技术室主任/副主任）"""
@@ -177,16 +184,16 @@ async def upload_policy(
             (remark or "").strip(),
         ),
     )
-    # 向量化入库（异步，不阻塞返回）
-    try:
-        from services.policy_vector import add_to_index
-        loop = asyncio.get_event_loop()
-        loop.run_in_executor(
-            None,
-            lambda: add_to_index(rid, (title or "").strip(), issue_time_val, (remark or "").strip(), file_path_rel, file_type),
-        )
-    except Exception as e:
-        logger.warning(f"向量入库异步失败: {e}")
+    content_hash = hashlib.sha256(content).hexdigest()
+    if ensure_text_store_once():
+        db.execute_update("UPDATE dept_policy SET content_hash = %s WHERE id = %s", (content_hash, rid))
+    # Word/Excel 上传后即加入转换队列，首次预览时 PDF 通常已生成；内容相同的文件共用已有 PDF
+    if file_type in CONVERTIBLE_TYPES and not get_pdf_cache().contains(content_hash):
+        get_pdf_cache().convert(full_path, content_hash)
+    # 正文提取与向量化入库：写入入库队列，由后台线程处理（失败自动重试，进度见 /index-status）
+    from services.policy_index_queue import enqueue
+    if enqueue([rid]) < 0:
+        logger.warning(f"制度入库任务入队失败: {rid}")
     return {"success": True, "message": "上传成功", "id": rid}
 
 
@@ -201,8 +208,16 @@ async def get_policy_list(
         where, params = [], ()
         if (keyword or "").strip():
             kw = f"%{(keyword or '').strip()}%"
-            where.append("title LIKE %s")
-            params = (kw,)
+            from services.policy_text import ensure_text_store_once
+            if ensure_text_store_once():
+                # 同时匹配已存储的制度正文
+                where.append(
+                    "(title LIKE %s OR content_hash IN (SELECT content_hash FROM dept_policy_text WHERE text LIKE %s))"
+                )
+                params = (kw, kw)
+            else:
+                where.append("title LIKE %s")
+                params = (kw,)
         where_sql = " AND ".join(where) if where else "1=1"
         cnt = db.execute_query(f"SELECT COUNT(*) as n FROM dept_policy WHERE {where_sql}", params)
         total = (cnt[0]["n"] or 0) if cnt else 0
@@ -238,6 +253,54 @@ async def get_policy_list(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/index-status")
+async def get_index_status(
+    ids: Optional[str] = Query(None, description="制度ID，多个用逗号分隔；不传返回各状态数量"),
+):
+    """
+    向量入库状态。传 ids 时返回 { success, items: { id: {status, attempts, lastError, updatedAt} } }，
+    status 为 pending/running/done/failed；不传时返回 { success, summary: {pending, running, done, failed} }
+    """
+    from services.policy_index_queue import get_status
+    id_list = [x.strip() for x in (ids or "").split(",") if x.strip()]
+    loop = asyncio.get_event_loop()
+    status = await loop.run_in_executor(None, get_status, id_list or None)
+    if id_list:
+        return {"success": True, "items": status}
+    return {"success": True, "summary": status}
+
+
+@router.get("/vector-search/metrics")
+async def vector_search_metrics():
+    """
+    向量检索缓存命中情况（当前 worker 进程）。
+    返回: { success, pid, embedding: {size, hits, misses, hitRate}, result: {...}, encoder: {batches, items, avgBatchSize} }
+    """
+    from services.policy_vector import search_cache_stats
+    return {"success": True, **search_cache_stats()}
+
+
+@router.get("/preview/metrics")
+async def preview_metrics():
+    """
+    Word/Excel 转 PDF 转换池与 PDF 缓存状态（当前 worker 进程）。
+    返回: { success, mode, poolSize, queueDepth, running, completed, failed, timeouts, restarts, avgConvertMs, p95ConvertMs,
+           avgQueueWaitMs, cache: {entries, bytes, maxBytes, hits, misses, hitRate, evictions} }
+    """
+    return {"success": True, **get_office_pool().metrics(), "cache": get_pdf_cache().stats()}
+
+
+@router.delete("/preview/cache")
+async def purge_preview_cache(
+    current_user: Optional[str] = Query("", description="当前用户名，用于权限校验"),
+):
+    """清空预览 PDF 缓存（之后的预览重新转换）。仅综合技术室主任/副主任可操作"""
+    if not _can_upload_policy((current_user or "").strip()):
+        raise HTTPException(status_code=403, detail="仅综合技术室主任/副主任可清空预览缓存")
+    result = await asyncio.get_event_loop().run_in_executor(None, get_pdf_cache().purge)
+    return {"success": True, **result}
+
+
 @router.get("/vector-search")
 async def vector_search_policy(
     query: str = Query(..., description="自然语言查询"),
@@ -261,20 +324,17 @@ async def vector_search_policy(
             tuple(ids),
         )
         id_order = {pid: i for i, pid in enumerate(ids)}
+        # 切片原文缺失时用已存储的正文开头作摘要（一次查询，不解析文档）
+        missing = [pid for pid in ids if not (snippets.get(pid) or "").strip()]
+        if missing:
+            from services.policy_text import get_snippets
+            stored_snippets = get_snippets(missing)
+        else:
+            stored_snippets = {}
         def _get_snippet(pid, r):
-            s = (snippets.get(pid) or "").strip()
+            s = (snippets.get(pid) or "").strip() or stored_snippets.get(pid)
             if s:
                 return s
-            file_path = (r.get("file_path") or "").strip()
-            file_type = (r.get("file_type") or "").lower()
-            if file_path and file_type:
-                try:
-                    from services.policy_vector import extract_text_from_file
-                    full = os.path.normpath(os.path.join(_DATA_DIR, file_path.replace("/", os.sep)))
-                    text = extract_text_from_file(full, file_type)
-                    return (text[:200] + "…") if len(text) > 200 else text
-                except Exception:
-                    pass
             title = (r.get("title") or "").strip()
             remark = (r.get("remark") or "").strip()
             return f"{title} {remark}".strip() or "—"
@@ -305,6 +365,7 @@ async def vector_search_policy(
 
 @router.get("/file")
 async def get_policy_file(
+    request: Request,
     id: str = Query(..., description="记录ID"),
     download: Optional[int] = Query(0, description="1=下载，0=预览"),
 ):
@@ -312,7 +373,11 @@ async def get_policy_file(
     if not (id or "").strip():
         raise HTTPException(status_code=400, detail="缺少记录ID")
     rid = (id or "").strip()
-    rows = db.execute_query("SELECT file_path, file_name, file_type FROM dept_policy WHERE id=%s", (rid,))
+    # content_hash 列未建好（无 ALTER 权限）时按原列查询，哈希在需要时由文件计算
+    hash_col = ", content_hash" if ensure_text_store_once() else ""
+    rows = db.execute_query(
+        f"SELECT file_path, file_name, file_type{hash_col} FROM dept_policy WHERE id=%s", (rid,)
+    )
     if not rows:
         raise HTTPException(status_code=404, detail="记录不存在")
     r = rows[0]
@@ -329,26 +394,34 @@ async def get_policy_file(
 
     serve_path = full_path
     serve_name = file_name
+    etag = r.get("content_hash")
     media_type = MIME_MAP.get(f"." + file_type, "application/octet-stream")
     disposition = "attachment" if download else "inline"
 
     # 预览且为 Word/Excel 时，转为 PDF 后返回
     if download == 0 and file_type in CONVERTIBLE_TYPES:
-        loop = asyncio.get_event_loop()
-        pdf_path = await loop.run_in_executor(None, _convert_to_pdf_sync, full_path)
+        content_hash = await asyncio.get_event_loop().run_in_executor(
+            None, _policy_content_hash, rid, full_path, r.get("content_hash")
+        )
+        pdf_path = await _convert_to_pdf(full_path, content_hash) if content_hash else None
         if pdf_path:
             serve_path = pdf_path
             serve_name = Path(file_name).stem + ".pdf"
+            etag = None  # 按 PDF 内容计算
             media_type = "application/pdf"
         else:
             # 转换失败时退化为下载
             disposition = "attachment"
 
-    return FileResponse(
+    # 制度文件按 ID 存放、上传后不再修改，可在浏览器缓存；支持 Range 供 PDF 阅读器按页读取
+    return await file_response(
+        request,
         serve_path,
+        serve_name,
         media_type=media_type,
-        filename=serve_name,
-        content_disposition_type=disposition,
+        disposition=disposition,
+        cache_control=CACHE_PRIVATE_DAY,
+        etag=etag,
     )
 
 
@@ -363,28 +436,33 @@ async def delete_policy(
     rid = (id or "").strip()
     if not rid:
         raise HTTPException(status_code=400, detail="缺少记录ID")
-    rows = db.execute_query("SELECT file_path FROM dept_policy WHERE id=%s", (rid,))
+    has_hash_col = ensure_text_store_once()
+    hash_col = ", content_hash" if has_hash_col else ""
+    rows = db.execute_query(f"SELECT file_path{hash_col} FROM dept_policy WHERE id=%s", (rid,))
     if not rows:
         raise HTTPException(status_code=404, detail="记录不存在")
     rel_path = (rows[0].get("file_path") or "").strip()
     full_path = os.path.normpath(os.path.join(_DATA_DIR, rel_path.replace("/", os.sep)))
+    content_hash = rows[0].get("content_hash")
     if os.path.isfile(full_path):
+        content_hash = content_hash or file_content_hash(full_path)
         try:
             os.remove(full_path)
         except Exception as e:
             logger.error(f"删除文件失败: {e}")
-        # 删除对应的 PDF 缓存
-        base_name = Path(full_path).stem
-        pdf_cache = os.path.join(PDF_CACHE_DIR, f"{base_name}.pdf")
-        if os.path.isfile(pdf_cache):
-            try:
-                os.remove(pdf_cache)
-            except Exception:
-                pass
+    # 没有其他制度使用相同内容时删除对应的 PDF 缓存（无 content_hash 列时无法判断，留给缓存按 LRU 淘汰）
+    if content_hash and has_hash_col and not db.execute_query(
+        "SELECT 1 FROM dept_policy WHERE content_hash = %s AND id != %s LIMIT 1", (content_hash, rid)
+    ):
+        get_pdf_cache().discard(content_hash)
     try:
         from services.policy_vector import remove_from_index
         remove_from_index(rid)
     except Exception:
         pass
+    from services.policy_index_queue import dequeue
+    from services.policy_text import release_policy_text
+    dequeue(rid)
+    release_policy_text(rid)
     db.execute_update("DELETE FROM dept_policy WHERE id=%s", (rid,))
     return {"success": True, "message": "已删除"}
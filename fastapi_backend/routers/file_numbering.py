@@ -3,12 +3,13 @@
 文件编号 API - 技术文件、技术管理、管理文件
 """
 import os
-from fastapi import APIRouter, HTTPException, Query, File, UploadFile
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Query, File, UploadFile, Request
 from typing import Optional, List
 from pydantic import BaseModel
 from datetime import datetime
 from database import db
+from services.file_sequence import insert_numbered
+from utils.file_response import CACHE_REVALIDATE, file_response
 import logging
 import uuid
 
@@ -171,18 +172,18 @@ async def add_bianhao_tech(req: BianhaoTechRequest):
         # bianhao1: 分类编码取右5位
         flbianma_s = (req.flbianma or req.fenlei or "").strip()
         bianhao1 = (flbianma_s[-5:] if len(flbianma_s) >= 5 else flbianma_s.zfill(5)) or "00000"
-        # 取最大 bianhao2
-        max_rows = db.execute_query(
-            "SELECT bianhao2 FROM bianhao WHERE bianhao1=%s AND bz=%s ORDER BY bianhao2 DESC LIMIT 1",
-            (bianhao1, req.bz)
-        )
-        next_num = 1 if not max_rows else (max_rows[0].get("bianhao2") or 0) + 1
-        bianhao3 = str(next_num).zfill(4)
         bhyear = str(datetime.now().year)
         bhtime = datetime.now().strftime("%Y-%m-%d")
         sql = """INSERT INTO bianhao (bz,xm,fenlei,gzh,cpname,neirong,bhtime,yj,bhyear,bianhao1,bianhao2,bianhao3)
                  VALUES (%s,%s,%s,%s,%s,%s,%s,'0',%s,%s,%s,%s)"""
-        db.execute_update(sql, (req.bz, req.xm, req.fenlei, gzh_val, req.xmname, req.neirong, bhtime, bhyear, bianhao1, next_num, bianhao3))
+        # bianhao2 按 (bianhao1, bz) 顺序分配，不按年重置；分配与插入同一事务
+        next_num = insert_numbered(
+            "bianhao", bianhao1,
+            lambda n: (sql, (req.bz, req.xm, req.fenlei, gzh_val, req.xmname, req.neirong, bhtime, bhyear,
+                             bianhao1, n, str(n).zfill(4))),
+            dept=req.bz,
+        )
+        bianhao3 = str(next_num).zfill(4)
         # 规范化展示格式：XXXX-XXXX[YYYY]，如 2617-0780[2026]
         prefix = (bianhao1[:4] if len(bianhao1) >= 4 else bianhao1.zfill(4))
         code = f"{prefix}-{bianhao3}[{bhyear}]"
@@ -292,17 +293,17 @@ async def add_bianhaogljs(req: BianhaoJsglRequest):
         gzh_rows = db.execute_query("SELECT gzh FROM gzh WHERE gzhname=%s AND ssks=%s LIMIT 1", (req.xmname, req.bz))
         gzh_val = (gzh_rows[0]["gzh"] or "").strip() if gzh_rows else ""
         bhyear = datetime.now().year
-        max_rows = db.execute_query(
-            "SELECT bianhao2 FROM bianhaogljs WHERE bianhao1=%s AND bhyear=%s ORDER BY bianhao2 DESC LIMIT 1",
-            (req.fenlei, bhyear)
-        )
-        next_num = 1 if not max_rows else (max_rows[0].get("bianhao2") or 0) + 1
-        bianhao3 = str(next_num).zfill(3)
         fenleihao = next((f["label"] for f in FENLEI_JSGL if f["value"] == req.fenlei), "")
         sql = """INSERT INTO bianhaogljs (xm,bz,fenlei,gzh,cpname,neirong,bhtime,bhyear,bianhao1,bianhao2,bianhao3,fenleihao,yj)
                  VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,'0')"""
         bhtime = datetime.now().strftime("%Y-%m-%d")
-        db.execute_update(sql, (req.xm, req.bz, req.fenlei, gzh_val, req.xmname, req.neirong, bhtime, bhyear, req.fenlei, next_num, bianhao3, fenleihao))
+        next_num = insert_numbered(
+            "bianhaogljs", req.fenlei,
+            lambda n: (sql, (req.xm, req.bz, req.fenlei, gzh_val, req.xmname, req.neirong, bhtime, bhyear,
+                             req.fenlei, n, str(n).zfill(3), fenleihao)),
+            year=bhyear,
+        )
+        bianhao3 = str(next_num).zfill(3)
         code = f"{req.fenlei}{bhyear}{bianhao3}"
         return {"success": True, "message": "编号成功", "bianhao": code}
     except HTTPException:
@@ -390,16 +391,16 @@ async def add_bianhaogl(req: BianhaoglRequest):
         if req.fenlei not in [f["value"] for f in FENLEI_GL]:
             raise HTTPException(status_code=400, detail="无效分类")
         bhyear = datetime.now().year
-        max_rows = db.execute_query(
-            "SELECT bianhao2 FROM bianhaogl WHERE bianhao1=%s AND bhyear=%s ORDER BY bianhao2 DESC LIMIT 1",
-            (req.fenlei, bhyear)
-        )
-        next_num = 1 if not max_rows else (max_rows[0].get("bianhao2") or 0) + 1
-        bianhao3 = str(next_num).zfill(3)
         bhtime = datetime.now().strftime("%Y-%m-%d")
         sql = """INSERT INTO bianhaogl (xm,bz,fenlei,cpname,neirong,bhtime,bhyear,bianhao1,bianhao2,bianhao3,yj,content)
                  VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,'0',%s)"""
-        db.execute_update(sql, (req.xm, req.bz, req.fenlei, req.xmname or "", req.neirong, bhtime, bhyear, req.fenlei, next_num, bianhao3, (req.content or "").strip()))
+        next_num = insert_numbered(
+            "bianhaogl", req.fenlei,
+            lambda n: (sql, (req.xm, req.bz, req.fenlei, req.xmname or "", req.neirong, bhtime, bhyear,
+                             req.fenlei, n, str(n).zfill(3), (req.content or "").strip())),
+            year=bhyear,
+        )
+        bianhao3 = str(next_num).zfill(3)
         code = f"{req.fenlei}{bhyear}{bianhao3}"
         return {"success": True, "message": "编号成功", "bianhao": code}
     except HTTPException:
@@ -603,6 +604,7 @@ async def delete_numbering_pdf(
 
 @router.get("/file")
 async def get_numbering_pdf(
+    request: Request,
     type: str = Query(..., description="tech|jsgl|manage"),
     code: str = Query(..., description="编号代码"),
     download: Optional[int] = Query(0, description="1=下载，0=预览"),
@@ -611,9 +613,12 @@ async def get_numbering_pdf(
     path = _file_path_by_code(type, code)
     if not os.path.isfile(path):
         raise HTTPException(status_code=404, detail="暂无文件")
-    return FileResponse(
+    # 同一编号的 PDF 可删除后重新上传，每次使用前按 ETag 校验
+    return await file_response(
+        request,
         path,
+        f"{code}.pdf",
         media_type="application/pdf",
-        filename=f"{code}.pdf",
-        content_disposition_type="attachment" if download else "inline",
+        disposition="attachment" if download else "inline",
+        cache_control=CACHE_REVALIDATE,
     )
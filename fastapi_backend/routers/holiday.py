@@ -11,6 +11,7 @@ from models import HolidayResponse, Holiday
 from utils.holiday_loader import load_holidays_for_year
 from datetime import datetime
 from database import db
+from utils.stats_cache import bump_stats_version, SCOPE_HOLIDAY
 from io import BytesIO
 import os
 import json
@@ -121,6 +122,7 @@ async def save_holidays(
                         "INSERT INTO holiday (year, date, type) VALUES (%s, %s, %s)",
                         (y_int, date_str, type_str),
                     )
+        bump_stats_version(SCOPE_HOLIDAY)
         # 返回最新数据
         rows = load_holidays_for_year(str(y_int))
         out = [
@@ -433,6 +435,7 @@ async def _parse_holiday_text_impl(req: HolidayParseRequest):
                     "INSERT INTO holiday (year, date, type) VALUES (%s, %s, %s)",
                     (y_int, date_str, type_str),
                 )
+        bump_stats_version(SCOPE_HOLIDAY)
         rows = load_holidays_for_year(str(y_int))
         out = [
             Holiday(date=r["date"], type=r["type"], festival=r.get("festival") or None)
@@ -6,8 +6,7 @@
   spr=第一审批人,2j=二级审批,spr2=第二审批人,qjzt=状态)
 - 加班登记: 插入 jiaban 表
 """
-from fastapi import APIRouter, HTTPException, Query, Form, File, UploadFile
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Query, Form, File, UploadFile, Request
 from typing import Optional, List
 from pydantic import BaseModel
 from datetime import datetime
@@ -15,6 +14,8 @@ from pathlib import Path
 from database import db
 from config import settings
 from utils.helpers import format_datetime_plain, normalize_datetime_for_db
+from services.pending_notify import publish_pending_change, KIND_LEAVE, KIND_OVERTIME
+from utils.file_response import CACHE_PRIVATE_DAY, file_response
 import logging
 import math
 import uuid
@@ -142,6 +143,7 @@ async def apply_leave(
         last_id = db.execute_insert(sql, params)
         if last_id is None:
             raise HTTPException(status_code=500, detail="插入请假记录失败")
+        publish_pending_change(KIND_LEAVE, [approver1], new_id)
 
         return {
             "success": True,
@@ -156,14 +158,15 @@ async def apply_leave(
 
 
 @router.get("/leave/download-material/{filename}")
-async def download_leave_material(filename: str):
+async def download_leave_material(filename: str, request: Request):
     """下载请假说明材料文件"""
     if not filename or ".." in filename or "/" in filename or "\\" in filename:
         raise HTTPException(status_code=400, detail="无效文件名")
     path = UPLOAD_LEAVE_MATERIALS / filename
     if not path.exists() or not path.is_file():
         raise HTTPException(status_code=404, detail="文件不存在")
-    return FileResponse(path, filename=filename)
+    # 说明材料上传时生成唯一文件名，内容不再变化
+    return await file_response(request, path, filename, cache_control=CACHE_PRIVATE_DAY)
 
 
 @router.post("/leave/apply-json")
@@ -203,6 +206,7 @@ async def apply_leave_json(req: LeaveApplyRequest):
         last_id = db.execute_insert(sql, params)
         if last_id is None:
             raise HTTPException(status_code=500, detail="插入请假记录失败")
+        publish_pending_change(KIND_LEAVE, [req.approver1], new_id)
         return {"success": True, "message": "请假申请已提交", "id": new_id}
     except HTTPException:
         raise
@@ -414,6 +418,7 @@ async def register_overtime(req: OvertimeRegisterRequest):
             hxp_val,
         )
         db.execute_update(sql, params)
+        publish_pending_change(KIND_OVERTIME, [req.approver], new_id)
 
         return {
             "success": True,
@@ -11,6 +11,7 @@ from database import db
 from collections import defaultdict
 from routers.approvers import _get_user_info, _jb_match
 from utils.helpers import format_datetime_plain
+from utils.stats_cache import cached_stats, SCOPE_LEAVE, SCOPE_OVERTIME, SCOPE_TRIP, SCOPE_STAFF
 import logging
 
 logger = logging.getLogger(__name__)
@@ -57,6 +58,27 @@ router = APIRouter(prefix="/report", tags=["报表统计"])
 # 1级：仅自己；2级：组长/主任/副主任 可查看隶属科室，下拉选择；3级：部长/副部长 可查看所有人，输入查询
 
 
+def _statistics_level(user: Optional[dict]) -> int:
+    """统计汇总页权限级别（由 yggl 行计算）：1=仅自己 2=科室下拉 3=全部输入查询"""
+    if not user:
+        return 1
+    jb = (user.get("jb") or "").strip()
+    if _jb_match(jb, "部长") or _jb_match(jb, "副部长"):
+        return 3
+    if _jb_match(jb, "组长") or _jb_match(jb, "主任") or (jb == "副主任" or (jb and "副主任" in jb)):
+        return 2
+    return 1
+
+
+def _can_view_overtime_pay(name: str, user: Optional[dict], admin2: Optional[str]) -> bool:
+    """加班费统计页权限（由 yggl 行与 webconfig.admin2 计算）"""
+    if user:
+        jb = (user.get("jb") or "").strip()
+        if _jb_match(jb, "部长") or _jb_match(jb, "副部长"):
+            return True
+    return bool(admin2 and (name or "").strip() == (admin2 or "").strip())
+
+
 @router.get("/statistics-permission")
 async def get_statistics_permission(name: str = Query(..., description="当前用户姓名")):
     """
@@ -64,15 +86,8 @@ async def get_statistics_permission(name: str = Query(..., description="当前
     总监、责任工艺师、副总专业师等按1级；按 yggl.jb 职级判定，不做 admin2 特开。
     """
     user = _get_user_info(name)
-    if not user:
-        return {"success": True, "level": 1, "lsys": "", "name": name}
-    jb = (user.get("jb") or "").strip()
-    lsys = (user.get("lsys") or "").strip()
-    if _jb_match(jb, "部长") or _jb_match(jb, "副部长"):
-        return {"success": True, "level": 3, "lsys": lsys, "name": name}
-    if _jb_match(jb, "组长") or _jb_match(jb, "主任") or (jb == "副主任" or (jb and "副主任" in jb)):
-        return {"success": True, "level": 2, "lsys": lsys, "name": name}
-    return {"success": True, "level": 1, "lsys": lsys, "name": name}
+    lsys = (user.get("lsys") or "").strip() if user else ""
+    return {"success": True, "level": _statistics_level(user), "lsys": lsys, "name": name}
 
 
 @router.get("/overtime-pay-permission")
@@ -81,20 +96,16 @@ async def get_overtime_pay_permission(name: str = Query(..., description="当前
     加班费统计页权限：仅部长/副部长 或 人事管理员（webconfig.admin2）可访问该页面。
     返回 { success, canView: true/false }
     """
-    can_view = False
     user = _get_user_info(name)
-    if user:
-        jb = (user.get("jb") or "").strip()
-        if _jb_match(jb, "部长") or _jb_match(jb, "副部长"):
-            can_view = True
-    if not can_view:
+    admin2 = None
+    if not _can_view_overtime_pay(name, user, None):
         try:
             wc = db.execute_query("SELECT admin2 FROM webconfig WHERE id = 1 LIMIT 1")
-            if wc and wc[0].get("admin2") and (name or "").strip() == (wc[0]["admin2"] or "").strip():
-                can_view = True
+            if wc:
+                admin2 = wc[0].get("admin2")
         except Exception:
             pass
-    return {"success": True, "canView": can_view}
+    return {"success": True, "canView": _can_view_overtime_pay(name, user, admin2)}
 
 
 @router.get("/statistics-employees")
@@ -196,6 +207,7 @@ class UserStatisticsResponse(BaseModel):
 # ==================== API 路由 ====================
 
 @router.get("/overtime", response_model=dict)
+@cached_stats(SCOPE_OVERTIME)
 async def get_overtime_records(
     name: str = Query(..., description="员工姓名"),
     year: Optional[int] = Query(None, description="年份"),
@@ -285,6 +297,7 @@ async def get_overtime_records(
 
 
 @router.get("/leave", response_model=dict)
+@cached_stats(SCOPE_LEAVE)
 async def get_leave_records(
     name: str = Query(..., description="员工姓名"),
     year: Optional[int] = Query(None, description="年份"),
@@ -379,6 +392,7 @@ async def get_leave_records(
 
 
 @router.get("/business-trip", response_model=dict)
+@cached_stats(SCOPE_TRIP)
 async def get_business_trip_records(
     name: str = Query(..., description="员工姓名"),
     year: Optional[int] = Query(None, description="年份"),
@@ -460,6 +474,7 @@ async def get_business_trip_records(
 
 
 @router.get("/monthly-summary", response_model=dict)
+@cached_stats(SCOPE_LEAVE, SCOPE_OVERTIME, SCOPE_TRIP, SCOPE_STAFF)
 async def get_monthly_summary(
     name: Optional[str] = Query(None, description="员工姓名，不传或空且传 lsys 时为科室全员汇总"),
     lsys: Optional[str] = Query(None, description="隶属科室，全员汇总时必传"),
@@ -3,15 +3,12 @@
 单点登录：生成免登链接，跳转人事档案等外部系统（B 系统）。
 双方约定以员工身份证号为唯一标识，A 系统生成带签名的 ticket，B 系统校验后为对应用户建立登录态。
 """
-import json
-import base64
-import hmac
-import hashlib
 import time
 import logging
 from fastapi import APIRouter, Query, HTTPException
 from config import settings
 from database import db
+from services.session_token import sign_payload
 
 logger = logging.getLogger(__name__)
 
@@ -24,10 +21,7 @@ def _make_ticket(sfzh: str, name: str, expire_seconds: int) -> str:
     if not secret:
         raise ValueError("SSO_SECRET 未配置")
     exp = int(time.time()) + expire_seconds
-    payload_obj = {"sub": sfzh, "name": name, "exp": exp}
-    payload_b64 = base64.urlsafe_b64encode(json.dumps(payload_obj, ensure_ascii=False).encode()).decode().rstrip("=")
-    sig = hmac.new(secret.encode("utf-8"), payload_b64.encode("utf-8"), hashlib.sha256).hexdigest()
-    return f"{payload_b64}.{sig}"
+    return sign_payload({"sub": sfzh, "name": name, "exp": exp}, secret)
 
 
 @router.get("/link")
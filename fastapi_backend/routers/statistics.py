@@ -9,105 +9,42 @@
 - 领导人看板统计中不参与：科室「部办」
 """
 from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 
 # 领导人看板中不参与统计的科室（不计算人数、不参与排序与横向对比）
 LEADER_EXCLUDE_LSYS = "部办"
-from typing import Optional, List, Tuple, Dict
+from typing import Optional, List, Tuple, Dict, Any
 from datetime import datetime, date
 from database import db
+from routers.approvers import _get_user_info, _jb_match
+from utils.stats_cache import (
+    cached_stats, get_stats_cache_metrics, ALL_SCOPES,
+    SCOPE_LEAVE, SCOPE_OVERTIME, SCOPE_TRIP, SCOPE_STAFF, SCOPE_HOLIDAY, SCOPE_CONFIG,
+)
+from services.overtime_pay import load_year_overtime_pay
+from services.stats_cube import (
+    get_cube, DIMENSIONS as CUBE_DIMENSIONS, MEASURES as CUBE_MEASURES, FULL_RATE_DIMENSIONS,
+)
+from utils.stats_snapshot import (
+    serve_closed_month, get_snapshot_entry, load_month_snapshot,
+    write_month_snapshot, remove_month_snapshot, list_closed_months, served_count, snapshot_key,
+)
 import logging
+import re
+import tempfile
+import time
 from collections import defaultdict
 
-logger = logging.getLogger(__name__)
-
-
-INCENTIVE_FESTIVALS = {"春节", "国庆节", "高温防暑休假"}
-
-
-def _load_holiday_festival_map(year: int) -> Dict[str, str]:
-    """
-    加载某年假期的 日期 -> 节日名称(festival) 映射。
-    若 holiday 表中无 festival 或读取失败，则返回空字典。
-    """
-    try:
-        from utils.holiday_loader import load_holidays_for_year
+try:
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, Alignment
+    HAS_OPENPYXL = True
+except ImportError:
+    HAS_OPENPYXL = False
 
-        rows = load_holidays_for_year(str(year))
-        mapping: Dict[str, str] = {}
-        for r in rows:
-            date_str = (r.get("date") or "").strip()
-            fest = (r.get("festival") or "").strip()
-            if date_str:
-                mapping[date_str] = fest
-        return mapping
-    except Exception:
-        return {}
-
-
-def _aggregate_overtime_with_incentive(
-    rows: List[Dict],
-    holiday_festival_map: Dict[str, str],
-    zhibanfei: float,
-):
-    """
-    对原始加班记录按「人+日期」聚合，并按节日激励规则计算：
-    - 春节/国庆节/高温防暑休假 这三类节日当天：若当日加班时长(已扣午休) >= 8 小时，则这天加班费固定 200 元；
-      超过 8 小时不再额外计算；这些小时不再计入普通 15 元/小时部分。
-    - 其他日期或不足 8 小时的节日，加班费按 15 元/小时计算。
-    返回:
-    - per_month: { "YYYY-MM": {"hours": 总小时数, "pay": 总金额} }
-    - per_employee: { name: {"hours": 总小时数, "pay": 总金额} }
-    """
-    # 先按 (name, date_str) 聚合每天的小时数
-    per_day: Dict[tuple, float] = defaultdict(float)
-    for r in rows or []:
-        name = (r.get("emp_name") or r.get("name") or "").strip()
-        if not name:
-            continue
-        timedate = r.get("timedate")
-        if timedate is None:
-            continue
-        date_str = str(timedate)[:10]
-        if len(date_str) < 10:
-            continue
-        try:
-            hours = float(r.get("hours") if r.get("hours") is not None else r.get("jbf") or 0)
-        except (TypeError, ValueError):
-            hours = 0.0
-        if hours <= 0:
-            continue
-        per_day[(name, date_str)] += hours
-
-    per_month: Dict[str, Dict[str, float]] = defaultdict(lambda: {"hours": 0.0, "pay": 0.0})
-    per_employee: Dict[str, Dict[str, float]] = defaultdict(lambda: {"hours": 0.0, "pay": 0.0})
-
-    for (name, date_str), day_hours in per_day.items():
-        month_key = date_str[:7]
-        festival = holiday_festival_map.get(date_str, "")
-        is_incentive = festival in INCENTIVE_FESTIVALS
-
-        incentive_pay = 0.0
-        normal_hours = 0.0
-
-        if is_incentive and day_hours >= 8.0:
-            # 激励日且当日加班满 8 小时：固定 200 元，不再按小时计费
-            incentive_pay = 200.0
-            normal_hours = 0.0
-        else:
-            # 非激励日或不足 8 小时：全部按普通时薪计算
-            normal_hours = day_hours
-
-        day_pay = incentive_pay + normal_hours * zhibanfei
-
-        # 员工维度：小时数依然展示真实加班小时；金额为激励 + 普通小时费
-        per_employee[name]["hours"] += day_hours
-        per_employee[name]["pay"] += day_pay
-
-        # 月维度：同样累计真实小时和金额
-        per_month[month_key]["hours"] += day_hours
-        per_month[month_key]["pay"] += day_pay
-
-    return per_month, per_employee
+logger = logging.getLogger(__name__)
 
 
 def _parse_date(v) -> Optional[date]:
@@ -220,6 +157,8 @@ async def get_dept_lsys_list():
 # ==================== 请假科室统计 ====================
 
 @router.get("/dept/leave")
+@serve_closed_month
+@cached_stats(SCOPE_LEAVE, SCOPE_STAFF)
 async def get_dept_leave_stats(
     lsys: Optional[str] = Query(None, description="隶属于室，不传或空为全员"),
     year: Optional[int] = None,
@@ -333,6 +272,8 @@ async def get_dept_leave_stats(
 # ==================== 加班科室统计 ====================
 
 @router.get("/dept/overtime")
+@serve_closed_month
+@cached_stats(SCOPE_OVERTIME, SCOPE_STAFF)
 async def get_dept_overtime_stats(
     lsys: Optional[str] = Query(None, description="隶属于室，不传或空为全员"),
     year: Optional[int] = None,
@@ -416,6 +357,8 @@ async def get_dept_overtime_stats(
 
 
 @router.get("/dept/overtime-pay-by-month")
+@serve_closed_month
+@cached_stats(SCOPE_OVERTIME, SCOPE_STAFF, SCOPE_HOLIDAY, SCOPE_CONFIG)
 async def get_dept_overtime_pay_by_month(
     lsys: Optional[str] = Query(None, description="隶属于室，不传或空为全员"),
     year: Optional[int] = None,
@@ -434,53 +377,18 @@ async def get_dept_overtime_pay_by_month(
     try:
         if year is None:
             year = datetime.now().year
-        zhibanfei = 15.0
-        try:
-            wc = db.execute_query("SELECT zhibanfei FROM webconfig WHERE id = 1 LIMIT 1")
-            if wc and wc[0].get("zhibanfei") is not None:
-                zhibanfei = float(wc[0]["zhibanfei"])
-        except Exception:
-            pass
-
-        only_person = name and name.strip()
-        month_cond = ""
-        month_params = ()
-        if month is not None:
-            month_cond = " AND (MONTH(jiaban.timedate) = %s OR SUBSTRING(jiaban.timedate, 1, 7) = %s)"
-            month_params = (month, f"{year}-{month:02d}")
-
-        if only_person:
-            join_cond = "INNER JOIN yggl ON jiaban.xm = yggl.name AND jiaban.xm = %s AND RIGHT(TRIM(yggl.name), 1) != '1' AND RIGHT(TRIM(yggl.lsys), 1) != '1' AND (COALESCE(yggl.zaizhi,0)=0)"
-            join_param = (name.strip(),)
+        # 整年加班费明细一次计算、各接口共享，这里只做筛选汇总
+        book = load_year_overtime_pay(year)
+        month_filter = f"{year}-{month:02d}" if month is not None else None
+        if name and name.strip():
+            per_month = book.per_month(month_filter, names=[name.strip()])
+        elif lsys and lsys.strip():
+            per_month = book.per_month(month_filter, lsys=lsys.strip())
         else:
-            all_staff = not (lsys and lsys.strip())
-            if all_staff:
-                join_cond = "INNER JOIN yggl ON jiaban.xm = yggl.name AND RIGHT(TRIM(yggl.name), 1) != '1' AND RIGHT(TRIM(yggl.lsys), 1) != '1' AND TRIM(yggl.lsys) != %s AND (COALESCE(yggl.zaizhi,0)=0)"
-                join_param = (LEADER_EXCLUDE_LSYS,)
-            else:
-                join_cond = "INNER JOIN yggl ON jiaban.xm = yggl.name AND yggl.lsys = %s AND RIGHT(TRIM(yggl.name), 1) != '1' AND RIGHT(TRIM(yggl.lsys), 1) != '1' AND (COALESCE(yggl.zaizhi,0)=0)"
-                join_param = (lsys,)
-
-        # 拉取原始加班记录（逐条），后续在 Python 中按人+日期聚合并应用激励规则
-        query = f"""
-            SELECT jiaban.xm AS emp_name,
-                   jiaban.timedate,
-                   CAST(COALESCE(jiaban.jbf, 0) AS DECIMAL(10,2)) AS hours
-            FROM jiaban {join_cond}
-            WHERE jiaban.jiabanzt = 4
-              AND (jiaban.hx IS NULL OR TRIM(jiaban.hx) != '是')
-              AND (jiaban.timedate LIKE %s OR YEAR(jiaban.timedate) = %s){month_cond}
-        """
-        rows = db.execute_query(query, join_param + (f"{year}%", year) + month_params)
-
-        holiday_map = _load_holiday_festival_map(year)
-        per_month, _ = _aggregate_overtime_with_incentive(rows, holiday_map, zhibanfei)
+            per_month = book.per_month(month_filter, exclude_lsys=LEADER_EXCLUDE_LSYS)
 
         list_data = []
-        # 若指定 month，仅返回该月；否则返回所有已出现的月份
         for month_key, agg in sorted(per_month.items()):
-            if month is not None and month_key != f"{year}-{month:02d}":
-                continue
             hours = round(agg["hours"], 2)
             pay = round(agg["pay"], 2)
             if month_key and len(month_key) == 7:
@@ -489,13 +397,15 @@ async def get_dept_overtime_pay_by_month(
                 month_label = month_key or "-"
             list_data.append({"month": month_key, "monthLabel": month_label, "hours": hours, "pay": pay})
 
-        return {"success": True, "zhibanfei": zhibanfei, "list": list_data}
+        return {"success": True, "zhibanfei": book.zhibanfei, "list": list_data}
     except Exception as e:
         logger.error(f"加班费按月考勤失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/dept/overtime-pay-by-employee")
+@serve_closed_month
+@cached_stats(SCOPE_OVERTIME, SCOPE_STAFF, SCOPE_HOLIDAY, SCOPE_CONFIG)
 async def get_dept_overtime_pay_by_employee(
     lsys: Optional[str] = Query(None, description="隶属于室，不传或空返回空列表（传 name 时可为空）"),
     year: Optional[int] = None,
@@ -511,43 +421,14 @@ async def get_dept_overtime_pay_by_employee(
     try:
         if year is None:
             year = datetime.now().year
-        zhibanfei = 15.0
-        try:
-            wc = db.execute_query("SELECT zhibanfei FROM webconfig WHERE id = 1 LIMIT 1")
-            if wc and wc[0].get("zhibanfei") is not None:
-                zhibanfei = float(wc[0]["zhibanfei"])
-        except Exception:
-            pass
-
-        only_person = name and name.strip()
-        month_cond = ""
-        month_params = ()
-        if month is not None:
-            month_cond = " AND (MONTH(jiaban.timedate) = %s OR SUBSTRING(jiaban.timedate, 1, 7) = %s)"
-            month_params = (month, f"{year}-{month:02d}")
-
-        if only_person:
-            join_cond = "INNER JOIN yggl ON jiaban.xm = yggl.name AND jiaban.xm = %s AND RIGHT(TRIM(yggl.name), 1) != '1' AND RIGHT(TRIM(yggl.lsys), 1) != '1' AND (COALESCE(yggl.zaizhi,0)=0)"
-            params = (name.strip(), f"{year}%", year) + month_params
+        book = load_year_overtime_pay(year)
+        month_filter = f"{year}-{month:02d}" if month is not None else None
+        if name and name.strip():
+            per_employee = book.per_employee(month_filter, names=[name.strip()])
+        elif lsys and lsys.strip():
+            per_employee = book.per_employee(month_filter, lsys=lsys.strip())
         else:
-            if not lsys or not lsys.strip():
-                return {"success": True, "zhibanfei": zhibanfei, "list": []}
-            join_cond = "INNER JOIN yggl ON jiaban.xm = yggl.name AND yggl.lsys = %s AND RIGHT(TRIM(yggl.name), 1) != '1' AND RIGHT(TRIM(yggl.lsys), 1) != '1' AND (COALESCE(yggl.zaizhi,0)=0)"
-            params = (lsys.strip(), f"{year}%", year) + month_params
-
-        query = f"""
-            SELECT jiaban.xm AS emp_name,
-                   jiaban.timedate,
-                   CAST(COALESCE(jiaban.jbf, 0) AS DECIMAL(10,2)) AS hours
-            FROM jiaban {join_cond}
-            WHERE jiaban.jiabanzt = 4
-              AND (jiaban.hx IS NULL OR TRIM(jiaban.hx) != '是')
-              AND (jiaban.timedate LIKE %s OR YEAR(jiaban.timedate) = %s){month_cond}
-        """
-        rows = db.execute_query(query, params)
-
-        holiday_map = _load_holiday_festival_map(year)
-        _, per_employee = _aggregate_overtime_with_incentive(rows, holiday_map, zhibanfei)
+            return {"success": True, "zhibanfei": book.zhibanfei, "list": []}
 
         list_data = []
         for emp_name, agg in per_employee.items():
@@ -558,13 +439,15 @@ async def get_dept_overtime_pay_by_employee(
         # 按加班小时降序、姓名排序
         list_data.sort(key=lambda x: (-x["hours"], x["name"]))
 
-        return {"success": True, "zhibanfei": zhibanfei, "list": list_data}
+        return {"success": True, "zhibanfei": book.zhibanfei, "list": list_data}
     except Exception as e:
         logger.error(f"加班费按员工统计失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/dept/overtime-pay-export")
+@serve_closed_month
+@cached_stats(SCOPE_OVERTIME, SCOPE_STAFF, SCOPE_HOLIDAY, SCOPE_CONFIG)
 async def get_overtime_pay_export(
     year: int = Query(..., description="年份"),
     month: int = Query(..., ge=1, le=12, description="月份（必选，用于按月工资报表）"),
@@ -576,33 +459,9 @@ async def get_overtime_pay_export(
     返回: { success, zhibanfei, all: [{ name, pay }], byDept: [{ lsys, list: [{ name, pay }] }] }
     """
     try:
-        zhibanfei = 15.0
-        try:
-            wc = db.execute_query("SELECT zhibanfei FROM webconfig WHERE id = 1 LIMIT 1")
-            if wc and wc[0].get("zhibanfei") is not None:
-                zhibanfei = float(wc[0]["zhibanfei"])
-        except Exception:
-            pass
-
-        # 本月所有加班记录（不区分科室），用于计算激励与普通加班费
-        q_rows = """
-            SELECT jiaban.xm AS emp_name,
-                   jiaban.timedate,
-                   CAST(COALESCE(jiaban.jbf, 0) AS DECIMAL(10,2)) AS hours
-            FROM jiaban
-            INNER JOIN yggl ON jiaban.xm = yggl.name
-            WHERE jiaban.jiabanzt = 4
-              AND (jiaban.hx IS NULL OR TRIM(jiaban.hx) != '是')
-              AND (YEAR(jiaban.timedate) = %s AND (MONTH(jiaban.timedate) = %s OR SUBSTRING(jiaban.timedate, 1, 7) = %s))
-              AND RIGHT(TRIM(yggl.name), 1) != '1'
-              AND RIGHT(TRIM(yggl.lsys), 1) != '1'
-              AND (COALESCE(yggl.zaizhi,0)=0)
-        """
-        month_key = f"{year}-{month:02d}"
-        rows = db.execute_query(q_rows, (year, month, month_key))
-
-        holiday_map = _load_holiday_festival_map(year)
-        _, per_employee = _aggregate_overtime_with_incentive(rows, holiday_map, zhibanfei)
+        book = load_year_overtime_pay(year)
+        zhibanfei = book.zhibanfei
+        per_employee = book.per_employee(f"{year}-{month:02d}")
 
         # 先准备全员名单（排除部办），再按 per_employee 中的 pay 填值，保证人全
         yggl_rows = db.execute_query(
@@ -611,31 +470,20 @@ async def get_overtime_pay_export(
             (LEADER_EXCLUDE_LSYS,),
         )
 
+        # 单次遍历名单：同时生成全员列表与各科室列表（科室与 lsys-list 一致，排除部办）
         list_all = []
+        dept_lists: Dict[str, List[dict]] = {}
         for r in (yggl_rows or []):
+            emp_lsys = (r.get("lsys") or "").strip()
+            dept_list = dept_lists.setdefault(emp_lsys, [])
             emp_name = (r.get("name") or "").strip()
             if not emp_name:
                 continue
             agg = per_employee.get(emp_name, {"pay": 0.0, "hours": 0.0})
-            pay = round(agg["pay"], 2)
-            list_all.append({"name": emp_name, "pay": pay})
-
-        # 科室列表（与 lsys-list 一致，排除部办）
-        lsys_list = sorted({(r.get("lsys") or "").strip() for r in (yggl_rows or []) if r.get("lsys")})
-
-        # 各科室：从全员名单中按 lsys 划分，同样用 per_employee 中的 pay
-        by_dept = []
-        for lsys in lsys_list:
-            dept_list = []
-            for r in (yggl_rows or []):
-                emp_name = (r.get("name") or "").strip()
-                emp_lsys = (r.get("lsys") or "").strip()
-                if not emp_name or emp_lsys != lsys:
-                    continue
-                agg = per_employee.get(emp_name, {"pay": 0.0, "hours": 0.0})
-                pay = round(agg["pay"], 2)
-                dept_list.append({"name": emp_name, "pay": pay})
-            by_dept.append({"lsys": lsys, "list": dept_list})
+            item = {"name": emp_name, "pay": round(agg["pay"], 2)}
+            list_all.append(item)
+            dept_list.append(dict(item))
+        by_dept = [{"lsys": lsys, "list": dept_lists[lsys]} for lsys in sorted(dept_lists)]
 
         return {"success": True, "zhibanfei": zhibanfei, "all": list_all, "byDept": by_dept}
     except Exception as e:
@@ -643,9 +491,151 @@ async def get_overtime_pay_export(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+_XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+_SHEET_TITLE_INVALID = re.compile(r"[\\/*?:\[\]]")
+
+
+def _sheet_title(title: str, used: set) -> str:
+    """Excel 工作表名：去除非法字符、最长 31 字符、同名追加序号。"""
+    base = _SHEET_TITLE_INVALID.sub("_", title or "").strip() or "未分科室"
+    base = base[:31]
+    name, i = base, 2
+    while name in used:
+        suffix = f"({i})"
+        name = base[:31 - len(suffix)] + suffix
+        i += 1
+    used.add(name)
+    return name
+
+
+def _iter_file(f, chunk_size: int = 64 * 1024):
+    """分块读取临时文件并在结束后关闭，供 StreamingResponse 使用。"""
+    try:
+        f.seek(0)
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        f.close()
+
+
+def _header_cells(ws, headers: List[str]):
+    """write-only 模式下的表头单元格（加粗居中）。"""
+    cells = []
+    for h in headers:
+        c = WriteOnlyCell(ws, value=h)
+        c.font = Font(bold=True)
+        c.alignment = Alignment(horizontal="center")
+        cells.append(c)
+    return cells
+
+
+def _write_overtime_pay_month_sheets(wb, data: dict):
+    """按月报表：全员一张表（姓名/科室/加班费），每个科室一张表（姓名/加班费）。"""
+    used = set()
+    lsys_of = {}
+    for dept in data.get("byDept") or []:
+        for item in dept.get("list") or []:
+            lsys_of.setdefault(item["name"], dept["lsys"])
+    ws = wb.create_sheet(_sheet_title("全员", used))
+    ws.append(_header_cells(ws, ["姓名", "科室", "加班费(元)"]))
+    for item in data.get("all") or []:
+        ws.append([item["name"], lsys_of.get(item["name"], ""), item["pay"]])
+    for dept in data.get("byDept") or []:
+        ws = wb.create_sheet(_sheet_title(dept["lsys"], used))
+        ws.append(_header_cells(ws, ["姓名", "加班费(元)"]))
+        total = 0.0
+        for item in dept.get("list") or []:
+            ws.append([item["name"], item["pay"]])
+            total += item["pay"]
+        ws.append(["合计", round(total, 2)])
+
+
+def _write_overtime_pay_year_sheets(wb, months: List[dict]):
+    """全年报表：全员与各科室各一张表，列为 1~12 月加班费与全年合计。"""
+    pay = defaultdict(lambda: [0.0] * 12)
+    lsys_of: Dict[str, str] = {}
+    for mi, data in enumerate(months):
+        for dept in data.get("byDept") or []:
+            for item in dept.get("list") or []:
+                lsys_of.setdefault(item["name"], dept["lsys"])
+                pay[item["name"]][mi] = item["pay"]
+    # 名单顺序以最近月份为准（在职名单为当前名单，各月一致）
+    roster: List[str] = []
+    seen = set()
+    for data in reversed(months):
+        for item in data.get("all") or []:
+            if item["name"] not in seen:
+                seen.add(item["name"])
+                roster.append(item["name"])
+    by_dept: Dict[str, List[str]] = defaultdict(list)
+    for emp_name in roster:
+        by_dept[lsys_of.get(emp_name, "")].append(emp_name)
+
+    month_headers = [f"{m}月" for m in range(1, 13)]
+    used = set()
+    ws = wb.create_sheet(_sheet_title("全员", used))
+    ws.append(_header_cells(ws, ["姓名", "科室"] + month_headers + ["合计"]))
+    for emp_name in roster:
+        row = pay[emp_name]
+        ws.append([emp_name, lsys_of.get(emp_name, "")] + row + [round(sum(row), 2)])
+    for lsys in sorted(by_dept):
+        ws = wb.create_sheet(_sheet_title(lsys, used))
+        ws.append(_header_cells(ws, ["姓名"] + month_headers + ["合计"]))
+        col_total = [0.0] * 12
+        for emp_name in by_dept[lsys]:
+            row = pay[emp_name]
+            col_total = [a + b for a, b in zip(col_total, row)]
+            ws.append([emp_name] + row + [round(sum(row), 2)])
+        ws.append(["合计"] + [round(v, 2) for v in col_total] + [round(sum(col_total), 2)])
+
+
+@router.get("/dept/overtime-pay-export/xlsx")
+async def download_overtime_pay_xlsx(
+    year: int = Query(..., description="年份"),
+    month: Optional[int] = Query(None, ge=1, le=12, description="月份，不传为全年（每人 1~12 月及合计）"),
+):
+    """
+    加班费工资报表 Excel 下载：全员一张表 + 每个科室一张表。
+    使用 openpyxl write-only 模式逐行写出到临时文件，再分块流式返回，内存占用不随人数增长。
+    数据与 /dept/overtime-pay-export 相同（已结账月份取快照）。
+    """
+    if not HAS_OPENPYXL:
+        raise HTTPException(status_code=500, detail="服务端未安装 openpyxl，无法生成 Excel")
+    try:
+        if month is not None:
+            months = [await get_overtime_pay_export(year=year, month=month)]
+        else:
+            months = [await get_overtime_pay_export(year=year, month=m) for m in range(1, 13)]
+
+        wb = Workbook(write_only=True)
+        if month is not None:
+            _write_overtime_pay_month_sheets(wb, months[0])
+            filename_ascii = f"overtime_pay_{year}{month:02d}.xlsx"
+        else:
+            _write_overtime_pay_year_sheets(wb, months)
+            filename_ascii = f"overtime_pay_{year}.xlsx"
+        f = tempfile.TemporaryFile()
+        wb.save(f)
+        return StreamingResponse(
+            _iter_file(f),
+            media_type=_XLSX_MEDIA_TYPE,
+            headers={"Content-Disposition": f'attachment; filename="{filename_ascii}"'},
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"加班费报表导出 Excel 失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ==================== 公出科室统计 ====================
 
 @router.get("/dept/business-trip")
+@serve_closed_month
+@cached_stats(SCOPE_TRIP, SCOPE_STAFF)
 async def get_dept_business_trip_stats(
     lsys: Optional[str] = Query(None, description="隶属于室，不传或空为全员"),
     year: Optional[int] = None,
@@ -757,6 +747,8 @@ async def get_dept_business_trip_stats(
 # ==================== 领导人看板扩展 API ====================
 
 @router.get("/leader/full-attendance")
+@serve_closed_month
+@cached_stats(*ALL_SCOPES)
 async def get_leader_full_attendance(
     year: int = Query(..., description="年份"),
     month: int = Query(..., description="月份"),
@@ -849,6 +841,7 @@ async def get_leader_full_attendance(
 
 
 @router.get("/leader/full-attendance-year")
+@cached_stats(*ALL_SCOPES)
 async def get_leader_full_attendance_year(
     year: int = Query(..., description="年份"),
     lsys: Optional[str] = Query(None, description="隶属科室，不传则全员")
@@ -936,6 +929,7 @@ async def get_leader_full_attendance_year(
 
 
 @router.get("/leader/full-attendance-by-month")
+@cached_stats(*ALL_SCOPES)
 async def get_leader_full_attendance_by_month(
     year: int = Query(..., description="年份"),
     lsys: Optional[str] = Query(None, description="隶属科室，不传则全员")
@@ -948,6 +942,16 @@ async def get_leader_full_attendance_by_month(
     try:
         list_data = []
         for month in range(1, 13):
+            # 已结账月份直接取快照中的当月满勤结果
+            frozen = get_snapshot_entry(year, month, "get_leader_full_attendance", {"lsys": lsys})
+            if frozen is not None:
+                list_data.append({
+                    "month": month,
+                    "monthLabel": f"{month}月",
+                    "fullCount": frozen.get("fullCount", 0),
+                    "totalPeople": frozen.get("totalPeople", 0)
+                })
+                continue
             month_str = f"{year}-{month:02d}"
             if lsys:
                 rows = db.execute_query(
@@ -999,6 +1003,7 @@ async def get_leader_full_attendance_by_month(
 
 
 @router.get("/leader/dept-comparison")
+@cached_stats(*ALL_SCOPES)
 async def get_leader_dept_comparison(
     year: int = Query(..., description="年份"),
     month: Optional[int] = Query(None, description="月份，不传则全年")
@@ -1106,6 +1111,7 @@ async def get_leader_dept_comparison(
 
 
 @router.get("/leader/rankings")
+@cached_stats(*ALL_SCOPES)
 async def get_leader_rankings(
     year: int = Query(..., description="年份"),
     month: Optional[int] = Query(None, description="月份，不传则全年"),
@@ -1206,3 +1212,177 @@ async def get_leader_rankings(
     except Exception as e:
         logger.error(f"全员排序查询失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+# ==================== 通用聚合查询（统计立方体） ====================
+
+class OlapQueryRequest(BaseModel):
+    year: int
+    dims: List[str] = []                      # 分组维度：fact/lsys/person/month/quarter/type/festival
+    measures: List[str] = ["days", "hours", "count"]  # 度量：days/hours/pay/count/full_rate
+    filters: Dict[str, List[Any]] = {}        # 维度 -> 允许的取值列表
+    order_by: Optional[str] = None            # 排序度量（降序），默认第一个度量
+    limit: int = 500
+
+
+@router.post("/stats/olap")
+async def query_stats_olap(req: OlapQueryRequest):
+    """
+    通用聚合查询：在按年缓存的内存立方体（已通过请假/加班、已批准公出）上按任意维度分组汇总。
+    示例: { year: 2025, dims: ["lsys", "month"], measures: ["hours", "pay"], filters: { fact: ["overtime"] } }
+    full_rate（满勤率）仅支持按 lsys/person/month/quarter 分组与筛选，结果另含 people、fullCount。
+    返回: { success, year, dims, measures, total, rows: [{ 维度..., 度量... }], elapsedMs }
+    """
+    started = time.perf_counter()
+    dims = list(dict.fromkeys(req.dims or []))
+    measures = list(dict.fromkeys(req.measures or []))
+    bad_dims = [d for d in dims + list((req.filters or {}).keys()) if d not in CUBE_DIMENSIONS]
+    if bad_dims:
+        raise HTTPException(status_code=400, detail=f"不支持的维度: {bad_dims}，可选 {list(CUBE_DIMENSIONS)}")
+    bad_measures = [m for m in measures if m not in CUBE_MEASURES]
+    if bad_measures or not measures:
+        raise HTTPException(status_code=400, detail=f"不支持的度量: {bad_measures}，可选 {list(CUBE_MEASURES)}")
+    if "full_rate" in measures:
+        used = set(dims) | set((req.filters or {}).keys())
+        if not used <= set(FULL_RATE_DIMENSIONS):
+            raise HTTPException(status_code=400, detail=f"full_rate 仅支持维度 {list(FULL_RATE_DIMENSIONS)}")
+    try:
+        cube = get_cube(req.year)
+        plain = [m for m in measures if m != "full_rate"]
+        rows = cube.aggregate(dims, plain, req.filters or {}) if plain else []
+        if "full_rate" in measures:
+            rate_rows = cube.full_rate(dims, req.filters or {})
+            by_key = {tuple(r.get(d) for d in dims): r for r in rows}
+            for r in rate_rows:
+                k = tuple(r.get(d) for d in dims)
+                if k in by_key:
+                    by_key[k].update({"people": r["people"], "fullCount": r["fullCount"], "full_rate": r["full_rate"]})
+                else:
+                    row = {d: r.get(d) for d in dims}
+                    row.update({m: 0.0 for m in plain})
+                    row.update({"people": r["people"], "fullCount": r["fullCount"], "full_rate": r["full_rate"]})
+                    rows.append(row)
+        order_by = req.order_by if req.order_by in measures else measures[0]
+        rows.sort(key=lambda r: (-(r.get(order_by) or 0), [str(r.get(d)) for d in dims]))
+        total = len(rows)
+        limit = max(1, min(int(req.limit or 500), 5000))
+        return {
+            "success": True,
+            "year": req.year,
+            "dims": dims,
+            "measures": measures,
+            "total": total,
+            "rows": rows[:limit],
+            "elapsedMs": round((time.perf_counter() - started) * 1000, 2),
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"统计聚合查询失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ==================== 月度结账快照 ====================
+
+class MonthCloseRequest(BaseModel):
+    current_user: str
+    year: int
+    month: int
+
+
+def _can_close_month(name: str) -> bool:
+    """结账/重新打开权限：与加班费统计页一致，部长/副部长 或 人事管理员（webconfig.admin2）。"""
+    name = (name or "").strip()
+    if not name:
+        return False
+    user = _get_user_info(name)
+    if user:
+        jb = (user.get("jb") or "").strip()
+        if _jb_match(jb, "部长") or _jb_match(jb, "副部长"):
+            return True
+    try:
+        wc = db.execute_query("SELECT admin2 FROM webconfig WHERE id = 1 LIMIT 1")
+        if wc and wc[0].get("admin2") and name == (wc[0]["admin2"] or "").strip():
+            return True
+    except Exception:
+        pass
+    return False
+
+
+async def _freeze_month(year: int, month: int) -> Dict[str, Dict[str, dict]]:
+    """实时计算某月各统计接口结果（全员 + 每个科室），返回 { 接口名: { 参数键: 结果 } }。"""
+    lsys_resp = await get_dept_lsys_list()
+    lsys_options = [None] + list(lsys_resp.get("list") or [])
+    entries: Dict[str, Dict[str, dict]] = defaultdict(dict)
+
+    def put(endpoint: str, params: dict, result: dict):
+        entries[endpoint][snapshot_key(params)] = result
+
+    put("get_overtime_pay_export", {}, await get_overtime_pay_export(year=year, month=month))
+    for ls in lsys_options:
+        put("get_dept_leave_stats", {"lsys": ls},
+            await get_dept_leave_stats(lsys=ls, year=year, month=month, quarter=None))
+        put("get_dept_overtime_stats", {"lsys": ls},
+            await get_dept_overtime_stats(lsys=ls, year=year, month=month, quarter=None))
+        put("get_dept_business_trip_stats", {"lsys": ls},
+            await get_dept_business_trip_stats(lsys=ls, year=year, month=month, quarter=None))
+        put("get_dept_overtime_pay_by_month", {"lsys": ls},
+            await get_dept_overtime_pay_by_month(lsys=ls, year=year, month=month, name=None))
+        put("get_leader_full_attendance", {"lsys": ls},
+            await get_leader_full_attendance(year=year, month=month, lsys=ls))
+        if ls:
+            put("get_dept_overtime_pay_by_employee", {"lsys": ls},
+                await get_dept_overtime_pay_by_employee(lsys=ls, year=year, month=month, name=None))
+    return entries
+
+
+@router.post("/stats-snapshot/close")
+async def close_stats_month(req: MonthCloseRequest):
+    """
+    月度结账：冻结该月加班费、请假、加班、公出、满勤率统计，写入快照文件。
+    结账后统计接口对该月直接返回快照；如需修正数据请先重新打开。
+    """
+    if not _can_close_month(req.current_user):
+        raise HTTPException(status_code=403, detail="仅部长/副部长或人事管理员可结账")
+    if not (1 <= req.month <= 12):
+        raise HTTPException(status_code=400, detail="月份应为 1~12")
+    if load_month_snapshot(req.year, req.month):
+        raise HTTPException(status_code=400, detail="该月已结账，如需重新生成请先重新打开")
+    try:
+        entries = await _freeze_month(req.year, req.month)
+        meta = write_month_snapshot(req.year, req.month, entries, req.current_user.strip())
+        logger.info(f"统计月度结账: {meta['ym']} by {meta['closedBy']}")
+        return {"success": True, "message": f"{meta['ym']} 已结账", **meta}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"统计月度结账失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/stats-snapshot/reopen")
+async def reopen_stats_month(req: MonthCloseRequest):
+    """重新打开已结账月份：删除快照，统计恢复实时计算。"""
+    if not _can_close_month(req.current_user):
+        raise HTTPException(status_code=403, detail="仅部长/副部长或人事管理员可重新打开")
+    if not remove_month_snapshot(req.year, req.month):
+        raise HTTPException(status_code=404, detail="该月未结账")
+    logger.info(f"统计月度重新打开: {req.year}-{req.month:02d} by {req.current_user}")
+    return {"success": True, "message": f"{req.year}-{req.month:02d} 已重新打开"}
+
+
+@router.get("/stats-snapshot/list")
+async def get_closed_stats_months(year: Optional[int] = Query(None, description="年份，不传为全部")):
+    """已结账月份列表。返回: { success, list: [{ ym, closedBy, closedAt, size }] }"""
+    return {"success": True, "list": list_closed_months(year)}
+
+
+# ==================== 统计缓存监控 ====================
+
+@router.get("/stats-cache/metrics")
+async def get_stats_cache_metrics_api():
+    """
+    统计缓存命中情况（当前 worker 进程）。
+    返回: { success, snapshotServed, pid, size, hits, misses, hitRate, endpoints: [{ endpoint, hits, misses, bypass, hitRate }] }
+    """
+    return {"success": True, "snapshotServed": served_count(), **get_stats_cache_metrics()}
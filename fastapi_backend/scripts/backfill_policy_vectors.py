@@ -1,38 +1,66 @@
 # -*- coding: utf-8 -*-
 """
-部门制度向量库回填脚本 - 为已有制度记录生成向量并入库
-运行: cd fastapi_backend && python scripts/backfill_policy_vectors.py
+部门制度向量库回填脚本 - 将全部制度写入入库队列（policy_index_queue），由服务的后台入库线程批量处理
+运行: cd fastapi_backend && python scripts/backfill_policy_vectors.py [--run] [--batch 16]
+  默认只入队并等待服务端处理完成（每 5 秒打印进度，Ctrl+C 退出不影响处理）；
+  --run：服务未运行时，由本脚本直接处理队列（多个制度的切片合并编码），失败的制度按退避时间等待重试，
+  直到全部完成或超过重试次数标记为失败
 """
 import sys
 import os
+import time
+import argparse
 
 # 添加项目根目录到 path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from database import db
-from services.policy_vector import add_to_index
+from services import policy_index_queue as queue
+
+
+def _progress() -> dict:
+    s = queue.get_status()
+    print(f"  待处理 {s.get('pending', 0)}, 处理中 {s.get('running', 0)}, "
+          f"完成 {s.get('done', 0)}, 失败 {s.get('failed', 0)}")
+    return s
+
 
 def main():
-    rows = db.execute_query("SELECT id, title, issue_time, remark, file_path, file_type FROM dept_policy")
-    base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    data_dir = os.path.join(base, "data")
-    ok, fail = 0, 0
-    for r in rows or []:
-        pid = (r.get("id") or "").strip()
-        if not pid:
-            continue
-        title = (r.get("title") or "").strip()
-        issue_time = (r.get("issue_time") or "").strip()
-        remark = (r.get("remark") or "").strip()
-        file_path = (r.get("file_path") or "").strip()
-        file_type = (r.get("file_type") or "").strip().lower()
-        if add_to_index(pid, title, issue_time, remark, file_path, file_type):
-            ok += 1
-            print(f"  OK: {pid} {title[:30]}...")
-        else:
-            fail += 1
-            print(f"  FAIL: {pid} {title[:30]}...")
-    print(f"\n完成: 成功 {ok} 条, 失败 {fail} 条")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--run", action="store_true", help="在本进程内处理队列")
+    parser.add_argument("--batch", type=int, default=16, help="--run 时每批制度数")
+    args = parser.parse_args()
+
+    rows = db.execute_query("SELECT id FROM dept_policy")
+    ids = [(r.get("id") or "").strip() for r in rows or []]
+    n = queue.enqueue(ids)
+    if n < 0:
+        print("入队失败，请检查数据库连接与 policy_index_queue 表")
+        return
+    print(f"已入队 {n} 条制度")
+
+    start = time.time()
+    if args.run:
+        # 失败的制度退避后重新变为待处理，服务未运行时只能由本脚本继续处理，直到没有待处理/处理中的任务
+        done = 0
+        while True:
+            k = queue.process_once(args.batch)
+            if k:
+                done += k
+                print(f"  已处理 {done} 条（{time.time() - start:.0f}s）")
+                continue
+            wait = queue.next_due_seconds()
+            if wait is None:
+                break
+            print(f"  等待重试，{wait:.0f}s 后有任务到期（Ctrl+C 退出，剩余任务由服务处理）")
+            time.sleep(min(max(wait, 1), 60))
+    while True:
+        s = _progress()
+        if not s.get("pending") and not s.get("running"):
+            break
+        time.sleep(5)
+    print(f"\n完成，用时 {time.time() - start:.0f}s；失败的制度可在 /department-policy/index-status 查看原因")
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+制度混合检索评测 - 在本地制度库上对比纯向量检索与向量 + BM25（RRF 融合）
+- 延迟：纯向量、BM25 关键词、混合检索各自的 p50/p95（结果缓存关闭，模型与索引计时前预热）
+- 效果：传 --qrels 时按标注计算 Recall@k 与 MRR；否则只输出两种方式 top-k 的重合度
+qrels 文件每行「查询<TAB>制度ID」，同一查询可有多行。
+运行: cd fastapi_backend && python scripts/bench_policy_hybrid.py [--qrels qrels.tsv] [--top-k 10]
+"""
+import sys
+import os
+import time
+import argparse
+import statistics
+from collections import defaultdict
+
+# 添加项目根目录到 path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services.policy_vector as pv
+from services import policy_bm25
+
+DEFAULT_QUERIES = [
+    "请假制度", "加班费标准", "年休假天数", "出差补贴", "考勤打卡规定", "婚假", "产假规定",
+    "病假工资", "安全生产责任", "保密管理", "工艺文件编号", "技术文件审批流程", "换休票有效期",
+    "高温假", "值班费", "第3条", "GB/T 19001", "培训管理办法", "质量事故处理", "设备维护保养",
+]
+
+
+def _timed(fn, queries):
+    latencies, results = [], {}
+    for q in queries:
+        t0 = time.perf_counter()
+        results[q] = fn(q)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    latencies.sort()
+    return results, {
+        "p50": statistics.median(latencies),
+        "p95": latencies[max(0, int(len(latencies) * 0.95) - 1)],
+    }
+
+
+def _load_qrels(path):
+    qrels = defaultdict(set)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) >= 2 and parts[0].strip():
+                qrels[parts[0].strip()].add(parts[1].strip())
+    return qrels
+
+
+def _quality(results, qrels, k):
+    recalls, rr = [], []
+    for q, relevant in qrels.items():
+        ranked = [pid for pid, _, _ in results.get(q, [])][:k]
+        recalls.append(len(relevant & set(ranked)) / len(relevant))
+        rr.append(next((1.0 / (i + 1) for i, pid in enumerate(ranked) if pid in relevant), 0.0))
+    return sum(recalls) / len(recalls), sum(rr) / len(rr)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--qrels", help="标注文件：查询<TAB>制度ID")
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    qrels = _load_qrels(args.qrels) if args.qrels else {}
+    queries = list(qrels) or DEFAULT_QUERIES
+    if not pv.warm_up():
+        print("模型或 Chroma 不可用，无法评测")
+        return
+    coll = pv._get_collection()
+    t0 = time.perf_counter()
+    idx = policy_bm25.build_now(coll)
+    print(f"关键词索引: {len(idx)} 个切片，建立耗时 {(time.perf_counter() - t0) * 1000:.0f} ms")
+    pv._index_version = lambda: None  # 关闭结果缓存，测量真实延迟
+    for q in queries:
+        pv._cached_query_embedding(pv.normalize_query(q))  # 查询向量预热，两种方式都不计编码耗时差异
+
+    k = args.top_k
+    vec, vec_lat = _timed(lambda q: pv.search(q, k, hybrid=False), queries)
+    _, kw_lat = _timed(lambda q: idx.search(pv.normalize_query(q), k * 3), queries)
+    hyb, hyb_lat = _timed(lambda q: pv.search(q, k, hybrid=True), queries)
+    print(f"纯向量    p50 {vec_lat['p50']:.1f} ms, p95 {vec_lat['p95']:.1f} ms")
+    print(f"BM25      p50 {kw_lat['p50']:.1f} ms, p95 {kw_lat['p95']:.1f} ms")
+    print(f"混合检索  p50 {hyb_lat['p50']:.1f} ms, p95 {hyb_lat['p95']:.1f} ms")
+
+    if qrels:
+        for name, res in (("纯向量", vec), ("混合检索", hyb)):
+            recall, mrr = _quality(res, qrels, k)
+            print(f"{name}: Recall@{k} {recall:.3f}, MRR {mrr:.3f}（{len(qrels)} 个查询）")
+    else:
+        overlap = [
+            len({p for p, _, _ in vec[q]} & {p for p, _, _ in hyb[q]}) / max(1, len(vec[q]))
+            for q in queries
+        ]
+        print(f"top-{k} 重合度（混合 vs 纯向量）: {sum(overlap) / len(overlap):.2f}；传 --qrels 可评估召回")
+
+
+if __name__ == "__main__":
+    main()
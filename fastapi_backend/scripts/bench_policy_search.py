@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+制度向量检索压测 - 20 个并发检索下对比「逐条 encode」与「合批 encode」的吞吐与延迟
+- direct：每个线程各自调用 model.encode([query])（改造前 vector-search 的方式）
+- batched：经 policy_vector.encode_query 合批（当前方式）
+两种方式均包含 Chroma 查询，模型与集合在计时前预热。
+运行: cd fastapi_backend && python scripts/bench_policy_search.py [--concurrency 20] [--rounds 10]
+"""
+import sys
+import os
+import time
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+# 添加项目根目录到 path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services.policy_vector as pv
+
+QUERIES = [
+    "请假制度", "加班费标准", "年休假天数", "出差补贴", "考勤打卡规定", "婚假", "产假规定",
+    "病假工资", "安全生产责任", "保密管理", "工艺文件编号", "技术文件审批流程", "换休票有效期",
+    "高温假", "值班费", "公出登记", "培训管理办法", "奖金分配", "设备维护", "质量事故处理",
+]
+
+
+def _direct(query: str):
+    coll = pv._get_collection()
+    emb = pv._get_model().encode([query], normalize_embeddings=True)
+    return coll.query(query_embeddings=emb.tolist(), n_results=60, include=["distances"])
+
+
+def _batched(query: str):
+    return pv.search(query, 20)
+
+
+def _run(fn, concurrency: int, rounds: int):
+    latencies = []
+
+    def _one(q):
+        t0 = time.perf_counter()
+        fn(q)
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    queries = [QUERIES[i % len(QUERIES)] for i in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(rounds):
+            list(pool.map(_one, queries))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "qps": len(latencies) / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "max": latencies[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    if not pv.warm_up():
+        print("模型或 Chroma 不可用，无法压测")
+        return
+    for name, fn in (("direct", _direct), ("batched", _batched)):
+        r = _run(fn, args.concurrency, args.rounds)
+        print(f"{name:8s} 并发 {args.concurrency}: {r['qps']:.1f} 次/秒, "
+              f"p50 {r['p50']:.0f} ms, p95 {r['p95']:.0f} ms, max {r['max']:.0f} ms")
+    print(f"合批统计: {pv.encoder_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+向量存储后端对比 - Chroma 与 NumPy float16 存储的冷启动、常驻内存与检索延迟
+每个后端在独立子进程中测量：导入并打开集合的耗时、200 次 top-60 检索的 p50/p95、进程峰值 RSS。
+查询向量取自库中已有切片（加少量噪声），不加载 embedding 模型。
+运行: cd fastapi_backend && python scripts/bench_vector_store.py [--migrate]
+  --migrate：先将 Chroma 中的全部切片（向量、原文、metadata）复制到 data/policy_vectors，
+             之后可设置 VECTOR_STORE_BACKEND=numpy 切换
+"""
+import sys
+import os
+import json
+import time
+import argparse
+import subprocess
+import statistics
+
+# 添加项目根目录到 path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+N_QUERIES = 200
+
+
+def _rss_mb():
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0  # Linux 单位为 KB
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().rss / 1024.0 / 1024.0
+        except ImportError:
+            return None
+
+
+def _child(backend: str):
+    import numpy as np
+    t0 = time.perf_counter()
+    from services.policy_vector import CHROMA_DIR, COLLECTION_NAME
+    from services.vector_store import open_collection
+    coll = open_collection(backend, CHROMA_DIR, COLLECTION_NAME)
+    n = coll.count()
+    cold_ms = (time.perf_counter() - t0) * 1000
+    if backend == "numpy":
+        base = np.asarray(coll._matrix[: min(n, N_QUERIES)], dtype=np.float32)
+    else:
+        base = np.asarray(coll.get(limit=N_QUERIES, include=["embeddings"])["embeddings"], dtype=np.float32)
+    rng = np.random.default_rng(0)
+    latencies = []
+    for i in range(N_QUERIES if n else 0):
+        q = base[i % len(base)] + rng.normal(0, 0.01, base.shape[1]).astype(np.float32)
+        q /= np.linalg.norm(q)
+        t = time.perf_counter()
+        coll.query(query_embeddings=[q.tolist()], n_results=60, include=["metadatas", "distances", "documents"])
+        latencies.append((time.perf_counter() - t) * 1000)
+    latencies.sort()
+    print(json.dumps({
+        "chunks": n,
+        "cold_ms": cold_ms,
+        "p50": statistics.median(latencies) if latencies else None,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] if latencies else None,
+        "rss_mb": _rss_mb(),
+    }))
+
+
+def _migrate():
+    from services.policy_vector import CHROMA_DIR, COLLECTION_NAME
+    from services.vector_store import NumpyCollection, open_chroma_collection
+    src = open_chroma_collection(CHROMA_DIR, COLLECTION_NAME)
+    data = src.get(include=["embeddings", "documents", "metadatas"])
+    ids = data.get("ids") or []
+    if not ids:
+        print("Chroma 中没有切片，无需复制")
+        return
+    dst = NumpyCollection()
+    dst.delete(ids=dst.get(include=[])["ids"])
+    dst.upsert(ids=ids, embeddings=data["embeddings"], documents=data["documents"], metadatas=data["metadatas"])
+    print(f"已复制 {len(ids)} 个切片到 {dst.directory}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--migrate", action="store_true")
+    parser.add_argument("--child", choices=["chroma", "numpy"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        _child(args.child)
+        return
+    if args.migrate:
+        _migrate()
+
+    for backend in ("chroma", "numpy"):
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", backend],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            print(f"{backend:7s} 测量失败: {proc.stderr.strip().splitlines()[-1:]}")
+            continue
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        rss = f"{r['rss_mb']:.0f} MB" if r.get("rss_mb") is not None else "n/a"
+        if r.get("p50") is None:
+            print(f"{backend:7s} {r['chunks']} 个切片：集合为空，冷启动 {r['cold_ms']:.0f} ms，RSS {rss}")
+            continue
+        print(f"{backend:7s} {r['chunks']} 个切片：冷启动 {r['cold_ms']:.0f} ms，"
+              f"检索 p50 {r['p50']:.2f} ms / p95 {r['p95']:.2f} ms，RSS {rss}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+ONNX 编码器一致性校验 - 对比 sentence_transformers 与 ONNX（fp32 / int8）在本地制度库上的向量与召回
+- 语料：向量库中已有的切片原文（与线上检索的切片一致）
+- 向量：同一切片两种编码的余弦相似度（均值 / 最小值）
+- 召回：每个查询在两种编码下各自的 top-k 切片，计算 Recall@k（以 sentence_transformers 结果为基准）
+- 速度：编码全部切片的耗时
+运行: cd fastapi_backend && python scripts/check_embedding_onnx_parity.py [--top-k 10] [--limit 2000] [--fp32]
+"""
+import sys
+import os
+import time
+import argparse
+
+# 添加项目根目录到 path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import services.policy_vector as pv
+from services.onnx_encoder import OnnxEncoder
+
+QUERIES = [
+    "请假制度", "加班费标准", "年休假天数", "出差补贴", "考勤打卡规定", "婚假", "产假规定",
+    "病假工资", "安全生产责任", "保密管理", "工艺文件编号", "技术文件审批流程", "换休票有效期",
+    "高温假", "值班费", "公出登记", "培训管理办法", "奖金分配", "设备维护", "质量事故处理",
+]
+
+
+def _encode(model, texts, name):
+    t0 = time.perf_counter()
+    emb = np.asarray(model.encode(texts, normalize_embeddings=True, batch_size=64), dtype=np.float32)
+    print(f"{name}: 编码 {len(texts)} 个切片 {time.perf_counter() - t0:.1f}s")
+    return emb
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--limit", type=int, default=2000, help="最多取多少个切片")
+    parser.add_argument("--fp32", action="store_true", help="校验 fp32 ONNX（默认 int8）")
+    args = parser.parse_args()
+
+    docs = [d for d in (pv._get_collection().get(include=["documents"]).get("documents") or []) if d][: args.limit]
+    if not docs:
+        print("向量库中没有切片，请先回填")
+        return
+    from sentence_transformers import SentenceTransformer
+    ref_model = SentenceTransformer(pv._get_model_path())
+    onnx_model = OnnxEncoder(pv._get_onnx_dir(), quantized=not args.fp32)
+    label = onnx_model.model_file
+
+    ref_docs = _encode(ref_model, docs, "sentence_transformers")
+    onnx_docs = _encode(onnx_model, docs, label)
+    cos = np.sum(ref_docs * onnx_docs, axis=1)
+    print(f"切片向量余弦相似度: 均值 {cos.mean():.4f}, 最小 {cos.min():.4f}")
+
+    ref_q = np.asarray(ref_model.encode(QUERIES, normalize_embeddings=True), dtype=np.float32)
+    onnx_q = np.asarray(onnx_model.encode(QUERIES, normalize_embeddings=True), dtype=np.float32)
+    k = min(args.top_k, len(docs))
+    recalls = []
+    for i in range(len(QUERIES)):
+        ref_top = set(np.argsort(-(ref_docs @ ref_q[i]))[:k])
+        onnx_top = set(np.argsort(-(onnx_docs @ onnx_q[i]))[:k])
+        recalls.append(len(ref_top & onnx_top) / k)
+    print(f"Recall@{k}（以 sentence_transformers 为基准）: 均值 {np.mean(recalls):.3f}, 最小 {np.min(recalls):.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+文件编号并发校验 - 多进程 × 多线程同时提交编号，检查 bianhao2 是否重复并统计吞吐
+- sequence：services.file_sequence.insert_numbered（当前方式，file_sequence 原子分配，分配与插入同一事务）
+- legacy：SELECT bianhao2 ... ORDER BY bianhao2 DESC LIMIT 1 后 INSERT（改造前的方式，用于对比重号）
+在 bianhaogl 中写入 bianhao1=压测-、bhyear=9999 的测试记录，结束后删除测试记录与对应顺序号（--keep 保留）。
+每个进程的并发连接数受 database.POOL_SIZE 限制，--processes 模拟多个 uvicorn worker。
+运行: cd fastapi_backend && python scripts/check_file_sequence_concurrency.py [--mode sequence|legacy]
+      [--processes 4] [--threads 8] [--per-thread 25] [--block 1]
+"""
+import sys
+import os
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+# 添加项目根目录到 path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TEST_TABLE = "bianhaogl"
+TEST_PREFIX = "压测-"
+TEST_YEAR = 9999
+_INSERT_SQL = """INSERT INTO bianhaogl (xm,bz,fenlei,cpname,neirong,bhtime,bhyear,bianhao1,bianhao2,bianhao3,yj,content)
+                 VALUES ('压测','压测',%s,'','并发编号校验',%s,%s,%s,%s,%s,'0','')"""
+
+
+def _params(n: int, bhtime: str):
+    return (TEST_PREFIX, bhtime, TEST_YEAR, TEST_PREFIX, n, str(n).zfill(3))
+
+
+def _submit_sequence(bhtime: str) -> int:
+    from services.file_sequence import insert_numbered
+    return insert_numbered(TEST_TABLE, TEST_PREFIX, lambda n: (_INSERT_SQL, _params(n, bhtime)), year=TEST_YEAR)
+
+
+def _submit_legacy(bhtime: str) -> int:
+    from database import db
+    rows = db.execute_query(
+        "SELECT bianhao2 FROM bianhaogl WHERE bianhao1=%s AND bhyear=%s ORDER BY bianhao2 DESC LIMIT 1",
+        (TEST_PREFIX, TEST_YEAR),
+    )
+    n = 1 if not rows else (rows[0].get("bianhao2") or 0) + 1
+    db.execute_update(_INSERT_SQL, _params(n, bhtime))
+    return n
+
+
+def _child(args):
+    mode, threads, per_thread, block = args
+    from config import settings
+    settings.FILE_SEQUENCE_BLOCK_SIZE = block
+    submit = _submit_sequence if mode == "sequence" else _submit_legacy
+    bhtime = time.strftime("%Y-%m-%d")
+
+    def _worker(_):
+        got, errors = [], 0
+        for _ in range(per_thread):
+            try:
+                got.append(submit(bhtime))
+            except Exception:
+                errors += 1
+        return got, errors
+
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        parts = list(ex.map(_worker, range(threads)))
+    return [n for got, _ in parts for n in got], sum(e for _, e in parts)
+
+
+def _cleanup():
+    from database import db
+    db.execute_update("DELETE FROM bianhaogl WHERE bianhao1=%s AND bhyear=%s", (TEST_PREFIX, TEST_YEAR))
+    db.execute_update(
+        "DELETE FROM file_sequence WHERE series=%s AND dept='' AND year=%s",
+        (f"{TEST_TABLE}:{TEST_PREFIX}", TEST_YEAR),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["sequence", "legacy"], default="sequence")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--per-thread", type=int, default=25)
+    parser.add_argument("--block", type=int, default=1, help="FILE_SEQUENCE_BLOCK_SIZE（仅 sequence）")
+    parser.add_argument("--keep", action="store_true", help="保留测试记录")
+    args = parser.parse_args()
+
+    _cleanup()
+    ctx = multiprocessing.get_context("spawn")
+    t0 = time.perf_counter()
+    with ctx.Pool(args.processes) as pool:
+        results = pool.map(_child, [(args.mode, args.threads, args.per_thread, args.block)] * args.processes)
+    elapsed = time.perf_counter() - t0
+
+    handed_out = [n for numbers, _ in results for n in numbers]
+    errors = sum(e for _, e in results)
+    from database import db
+    rows = db.execute_query(
+        "SELECT bianhao2, COUNT(*) AS c FROM bianhaogl WHERE bianhao1=%s AND bhyear=%s GROUP BY bianhao2",
+        (TEST_PREFIX, TEST_YEAR),
+    )
+    stored = sum(int(r["c"]) for r in rows)
+    duplicated = sum(1 for r in rows if int(r["c"]) > 1)
+    top = max((int(r["bianhao2"]) for r in rows), default=0)
+    gaps = top - len(rows)
+
+    total = args.processes * args.threads * args.per_thread
+    print(f"模式 {args.mode}（block={args.block}）：{args.processes} 进程 × {args.threads} 线程 × {args.per_thread} 次 = {total} 次提交")
+    print(f"  耗时 {elapsed:.2f} s，吞吐 {len(handed_out) / elapsed:.0f} 次/s，失败 {errors}")
+    print(f"  写入 {stored} 条，不同编号 {len(rows)} 个，重复编号 {duplicated} 个，最大编号 {top}，空号 {gaps} 个")
+    print("  结果: " + ("通过，编号无重复" if duplicated == 0 and stored == len(handed_out) else "失败，存在重复编号或丢失记录"))
+    if not args.keep:
+        _cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+加班费计算引擎一致性校验 - 对比 services.overtime_pay 与原逐行实现 _aggregate_overtime_with_incentive
+覆盖：激励日恰好 8 小时、同一天多条记录合计满 8 小时、激励日不足 8 小时、非激励日超 8 小时、
+跨月、空姓名/空日期/非法小时数等，以及随机数据；有 numpy 时分别校验 numpy 与纯 Python 两条路径。
+运行: cd fastapi_backend && python scripts/check_overtime_pay_parity.py [--year 2025]
+  传 --year 时另外用数据库中该年真实加班记录再校验一次。
+"""
+import sys
+import os
+import random
+import argparse
+from collections import defaultdict
+from typing import Dict, List
+
+# 添加项目根目录到 path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services.overtime_pay as engine
+
+INCENTIVE_FESTIVALS = {"春节", "国庆节", "高温防暑休假"}
+
+
+# 原实现（routers/statistics.py 改用引擎前的版本），作为基准
+
+def _aggregate_overtime_with_incentive(
+    rows: List[Dict],
+    holiday_festival_map: Dict[str, str],
+    zhibanfei: float,
+):
+    """
+    对原始加班记录按「人+日期」聚合，并按节日激励规则计算：
+    - 春节/国庆节/高温防暑休假 这三类节日当天：若当日加班时长(已扣午休) >= 8 小时，则这天加班费固定 200 元；
+      超过 8 小时不再额外计算；这些小时不再计入普通 15 元/小时部分。
+    - 其他日期或不足 8 小时的节日，加班费按 15 元/小时计算。
+    返回:
+    - per_month: { "YYYY-MM": {"hours": 总小时数, "pay": 总金额} }
+    - per_employee: { name: {"hours": 总小时数, "pay": 总金额} }
+    """
+    # 先按 (name, date_str) 聚合每天的小时数
+    per_day: Dict[tuple, float] = defaultdict(float)
+    for r in rows or []:
+        name = (r.get("emp_name") or r.get("name") or "").strip()
+        if not name:
+            continue
+        timedate = r.get("timedate")
+        if timedate is None:
+            continue
+        date_str = str(timedate)[:10]
+        if len(date_str) < 10:
+            continue
+        try:
+            hours = float(r.get("hours") if r.get("hours") is not None else r.get("jbf") or 0)
+        except (TypeError, ValueError):
+            hours = 0.0
+        if hours <= 0:
+            continue
+        per_day[(name, date_str)] += hours
+
+    per_month: Dict[str, Dict[str, float]] = defaultdict(lambda: {"hours": 0.0, "pay": 0.0})
+    per_employee: Dict[str, Dict[str, float]] = defaultdict(lambda: {"hours": 0.0, "pay": 0.0})
+
+    for (name, date_str), day_hours in per_day.items():
+        month_key = date_str[:7]
+        festival = holiday_festival_map.get(date_str, "")
+        is_incentive = festival in INCENTIVE_FESTIVALS
+
+        incentive_pay = 0.0
+        normal_hours = 0.0
+
+        if is_incentive and day_hours >= 8.0:
+            # 激励日且当日加班满 8 小时：固定 200 元，不再按小时计费
+            incentive_pay = 200.0
+            normal_hours = 0.0
+        else:
+            # 非激励日或不足 8 小时：全部按普通时薪计算
+            normal_hours = day_hours
+
+        day_pay = incentive_pay + normal_hours * zhibanfei
+
+        # 员工维度：小时数依然展示真实加班小时；金额为激励 + 普通小时费
+        per_employee[name]["hours"] += day_hours
+        per_employee[name]["pay"] += day_pay
+
+        # 月维度：同样累计真实小时和金额
+        per_month[month_key]["hours"] += day_hours
+        per_month[month_key]["pay"] += day_pay
+
+    return per_month, per_employee
+
+
+def _edge_rows():
+    return [
+        {"emp_name": "张三", "timedate": "2025-10-01", "hours": 8},            # 国庆恰好 8 小时 -> 200
+        {"emp_name": "张三", "timedate": "2025-10-02", "hours": 4},            # 国庆同日两条合计 8 小时 -> 200
+        {"emp_name": "张三", "timedate": "2025-10-02", "hours": 4},
+        {"emp_name": "李四", "timedate": "2025-10-03", "hours": 7.5},          # 国庆不足 8 小时 -> 按小时
+        {"emp_name": "李四", "timedate": "2025-10-04", "hours": 12},           # 非激励节日超 8 小时 -> 按小时
+        {"emp_name": "李四", "timedate": "2025-11-04", "hours": 3},            # 跨月
+        {"name": "王五", "timedate": "2025-07-20 00:00:00", "jbf": 9},         # name/jbf 字段、带时间的日期
+        {"emp_name": "王五", "timedate": "2025-02-01", "hours": 7.99},         # 春节差一点满 8 小时
+        {"emp_name": "王五", "timedate": "2025-02-02", "hours": 8.01},
+        {"emp_name": " ", "timedate": "2025-10-01", "hours": 8},               # 以下均应被忽略
+        {"emp_name": "赵六", "timedate": None, "hours": 8},
+        {"emp_name": "赵六", "timedate": "2025-1", "hours": 8},
+        {"emp_name": "赵六", "timedate": "2025-10-05", "hours": 0},
+        {"emp_name": "赵六", "timedate": "2025-10-05", "hours": "x"},
+    ]
+
+
+def _random_rows(n: int, seed: int = 7):
+    rnd = random.Random(seed)
+    return [
+        {
+            "emp_name": f"员工{rnd.randint(0, 60)}",
+            "timedate": f"2025-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}",
+            "hours": rnd.choice([0.5, 1, 2, 3.5, 4, 7.99, 8, 8.01, 10, 12]),
+        }
+        for _ in range(n)
+    ]
+
+
+def _holidays():
+    hol = {
+        "2025-10-01": "国庆节", "2025-10-02": "国庆节", "2025-10-03": "国庆节",
+        "2025-10-04": "中秋节", "2025-07-20": "高温防暑休假",
+    }
+    for d in range(1, 29):
+        hol.setdefault(f"2025-02-{d:02d}", "春节")
+    return hol
+
+
+def _compare(label: str, expected: Dict, actual: Dict) -> int:
+    errors = 0
+    if set(expected) != set(actual):
+        print(f"  [{label}] 键不一致: 仅基准有 {sorted(set(expected) - set(actual))[:5]}, 仅引擎有 {sorted(set(actual) - set(expected))[:5]}")
+        errors += 1
+    for k in set(expected) & set(actual):
+        for f in ("hours", "pay"):
+            if abs(expected[k][f] - actual[k][f]) > 1e-6:
+                print(f"  [{label}] {k}.{f}: 基准 {expected[k][f]} != 引擎 {actual[k][f]}")
+                errors += 1
+    return errors
+
+
+def check(rows: List[Dict], holiday_map: Dict[str, str], zhibanfei: float, label: str) -> int:
+    per_month, per_employee = _aggregate_overtime_with_incentive(rows, holiday_map, zhibanfei)
+    book = engine.compute_overtime_pay(rows, holiday_map, zhibanfei)
+    errors = _compare(f"{label}/月", per_month, book.per_month())
+    errors += _compare(f"{label}/人", per_employee, book.per_employee())
+    for month_key in sorted(per_month):
+        sub = [r for r in rows if str(r.get("timedate") or "")[:7] == month_key]
+        _, expected = _aggregate_overtime_with_incentive(sub, holiday_map, zhibanfei)
+        errors += _compare(f"{label}/{month_key}/人", expected, book.per_employee(month_key))
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--year", type=int, default=None, help="另用数据库中该年真实加班记录校验")
+    args = parser.parse_args()
+
+    datasets = [("边界用例", _edge_rows(), _holidays(), 15.0), ("随机数据", _random_rows(5000), _holidays(), 17.5)]
+    if args.year:
+        from database import db
+        rows = db.execute_query(
+            "SELECT jiaban.xm AS emp_name, jiaban.timedate, CAST(COALESCE(jiaban.jbf, 0) AS DECIMAL(10,2)) AS hours "
+            "FROM jiaban INNER JOIN yggl ON jiaban.xm = yggl.name "
+            "WHERE jiaban.jiabanzt = 4 AND (jiaban.hx IS NULL OR TRIM(jiaban.hx) != '是') "
+            "AND (jiaban.timedate LIKE %s OR YEAR(jiaban.timedate) = %s)",
+            (f"{args.year}%", args.year),
+        )
+        datasets.append((f"{args.year} 年数据库", rows, engine.load_holiday_festival_map(args.year), engine.load_zhibanfei()))
+
+    paths = [True, False] if engine.HAS_NUMPY else [False]
+    total_errors = 0
+    for use_numpy in paths:
+        engine.HAS_NUMPY = use_numpy
+        for label, rows, hol, zhibanfei in datasets:
+            errors = check(rows, hol, zhibanfei, f"{'numpy' if use_numpy else 'python'}/{label}")
+            print(f"{'numpy ' if use_numpy else 'python'} {label}: {len(rows)} 条记录, {'一致' if not errors else f'{errors} 处不一致'}")
+            total_errors += errors
+    print("\n全部一致" if not total_errors else f"\n共 {total_errors} 处不一致")
+    sys.exit(1 if total_errors else 0)
+
+
+if __name__ == "__main__":
+    main()
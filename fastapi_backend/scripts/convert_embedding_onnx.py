@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+bge-small-zh 模型转 ONNX（离线）- 从本地 EMBEDDING_MODEL_PATH 导出 fp32 ONNX 并做动态 int8 量化
+输出目录（默认 <EMBEDDING_MODEL_PATH>-onnx，与 EMBEDDING_ONNX_PATH 为空时的默认值一致）：
+  model.onnx、model_int8.onnx、tokenizer.json 等分词器文件
+需要 torch、transformers、onnx、onnxruntime（仅转换时需要；服务端使用 ONNX 后端只需 onnxruntime 与 tokenizers）。
+运行: cd fastapi_backend && python scripts/convert_embedding_onnx.py [--model models/bge-small-zh-v1.5] [--out DIR]
+转换后设置 EMBEDDING_BACKEND=onnx，再运行 scripts/check_embedding_onnx_parity.py 校验召回一致性。
+"""
+import sys
+import os
+import argparse
+
+# 添加项目根目录到 path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+from services.onnx_encoder import FP32_FILE, INT8_FILE, MAX_SEQ_LENGTH
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=(settings.EMBEDDING_MODEL_PATH or "").strip(), help="本地模型目录")
+    parser.add_argument("--out", default="", help="输出目录")
+    parser.add_argument("--opset", type=int, default=14)
+    args = parser.parse_args()
+
+    model_dir = args.model
+    if not model_dir or not os.path.isdir(model_dir):
+        print("请通过 --model 或 EMBEDDING_MODEL_PATH 指定已下载的本地模型目录（离线转换不访问网络）")
+        return
+    out_dir = args.out or (model_dir.rstrip("/\\") + "-onnx")
+    os.makedirs(out_dir, exist_ok=True)
+
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    tokenizer = AutoTokenizer.from_pretrained(model_dir, local_files_only=True)
+    model = AutoModel.from_pretrained(model_dir, local_files_only=True).eval()
+    sample = tokenizer(["部门制度", "请假与加班管理规定"], padding=True, return_tensors="pt")
+    fp32_path = os.path.join(out_dir, FP32_FILE)
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic = {n: {0: "batch", 1: "seq"} for n in names}
+    dynamic["last_hidden_state"] = {0: "batch", 1: "seq"}
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            fp32_path,
+            input_names=names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic,
+            opset_version=args.opset,
+        )
+    print(f"已导出 {fp32_path}")
+
+    int8_path = os.path.join(out_dir, INT8_FILE)
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    print(f"已量化 {int8_path}")
+
+    tokenizer.model_max_length = MAX_SEQ_LENGTH
+    tokenizer.save_pretrained(out_dir)
+    for name in (FP32_FILE, INT8_FILE):
+        size = os.path.getsize(os.path.join(out_dir, name)) / 1024 / 1024
+        print(f"  {name}: {size:.1f} MB")
+    print(f"完成。设置 EMBEDDING_BACKEND=onnx、EMBEDDING_ONNX_PATH={out_dir} 后重启服务")
+
+
+if __name__ == "__main__":
+    main()
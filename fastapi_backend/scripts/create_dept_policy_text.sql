@@ -0,0 +1,12 @@
+-- 制度正文存储（services/policy_text.py 使用，服务启动后也会自动补齐）
+-- 上传/入库时按文件内容哈希提取一次正文，向量入库、检索摘要、关键词搜索直接读取
+CREATE TABLE IF NOT EXISTS dept_policy_text (
+  content_hash CHAR(64) NOT NULL PRIMARY KEY COMMENT '文件内容 SHA-256',
+  file_type VARCHAR(32) NULL COMMENT 'pdf/doc/docx/xls/xlsx',
+  text MEDIUMTEXT NULL COMMENT '提取的正文（最多 50000 字）',
+  page_offsets TEXT NULL COMMENT '各页/工作表在正文中的起始偏移，JSON 数组',
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+) DEFAULT CHARSET=utf8mb4;
+
+ALTER TABLE dept_policy ADD COLUMN content_hash CHAR(64) NULL COMMENT '正文记录（dept_policy_text.content_hash）';
+ALTER TABLE dept_policy ADD INDEX idx_dept_policy_content_hash (content_hash);
@@ -0,0 +1,12 @@
+-- 文件编号顺序号（services/file_sequence.py 使用，服务启动后也会自动创建）
+-- series = 编号表名:bianhao1，dept = 科室（仅技术文件 bianhao 按科室编号，其余为空），year = 编号年份（技术文件为 0，不按年重置）
+-- 分配: UPDATE file_sequence SET v = LAST_INSERT_ID(v + n) WHERE series=... AND dept=... AND year=...
+-- 某个键首次使用时由编号表现有 MAX(bianhao2) 初始化
+CREATE TABLE IF NOT EXISTS file_sequence (
+  series VARCHAR(64) NOT NULL COMMENT '编号表名:bianhao1',
+  dept VARCHAR(64) NOT NULL DEFAULT '' COMMENT '科室',
+  year INT NOT NULL DEFAULT 0 COMMENT '编号年份，0 为不按年重置',
+  v INT NOT NULL DEFAULT 0 COMMENT '已分配的最大顺序号',
+  updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (series, dept, year)
+) DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,28 @@
+-- 换休票台账（services/hxp_ledger.py 使用，服务启动后也会自动补齐）
+-- hxp.expire_date：获得日 + 1 年，扣减按过期日先进先出；hxp_balance：按人有效余额汇总；hxp_archive：已过期归档
+ALTER TABLE hxp ADD COLUMN expire_date DATE NULL COMMENT '过期日（获得日+1年）';
+ALTER TABLE hxp ADD INDEX idx_hxp_name_expire (name, expire_date);
+ALTER TABLE hxp ADD INDEX idx_hxp_expire (expire_date);
+UPDATE hxp SET expire_date = DATE_ADD(DATE(sj), INTERVAL 1 YEAR) WHERE expire_date IS NULL AND sj IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS hxp_balance (
+  name VARCHAR(100) NOT NULL PRIMARY KEY COMMENT '姓名',
+  balance DECIMAL(10,2) NOT NULL DEFAULT 0 COMMENT '有效换休票张数',
+  next_expire DATE NULL COMMENT '最近过期日',
+  updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS hxp_archive (
+  id VARCHAR(64) NOT NULL PRIMARY KEY,
+  name VARCHAR(100) NOT NULL,
+  sl DECIMAL(10,2) NOT NULL DEFAULT 0,
+  sj DATETIME NULL,
+  expire_date DATE NULL,
+  archived_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  INDEX idx_hxp_archive_name (name)
+) DEFAULT CHARSET=utf8mb4;
+
+INSERT INTO hxp_balance (name, balance, next_expire)
+SELECT name, ROUND(SUM(sl), 2), MIN(expire_date) FROM hxp
+WHERE sl > 0 AND (expire_date IS NULL OR expire_date >= CURDATE()) GROUP BY name
+ON DUPLICATE KEY UPDATE balance = VALUES(balance), next_expire = VALUES(next_expire);
@@ -0,0 +1,19 @@
+-- 待审批推送事件表与待办索引（services/pending_notify.py 使用，服务启动后也会自动补齐）
+-- 申请/审批写入受影响审批人的事件，各 worker 按 id 增量读取后推送给本进程的 SSE/WebSocket 订阅者
+CREATE TABLE IF NOT EXISTS pending_events (
+  id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+  approver VARCHAR(100) NOT NULL COMMENT '受影响的审批人',
+  kind VARCHAR(32) NOT NULL COMMENT 'leave/overtime/businessTrip',
+  item_id VARCHAR(64) NULL COMMENT '记录 id（批量审批时为空）',
+  action VARCHAR(16) NULL COMMENT 'new/approve/reject',
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  INDEX idx_pending_events_created (created_at)
+) DEFAULT CHARSET=utf8mb4;
+
+-- /approval/pending-counts 与 /approval/pending/* 的查询条件
+ALTER TABLE qj ADD INDEX idx_qj_pending_spr (qjzt, spr);
+ALTER TABLE qj ADD INDEX idx_qj_pending_spr2 (qjzt, spr2);
+ALTER TABLE jiaban ADD INDEX idx_jiaban_pending_spr (jiabanzt, spr);
+ALTER TABLE jiaban ADD INDEX idx_jiaban_pending_spr2 (jiabanzt, spr2);
+ALTER TABLE gcsqb ADD INDEX idx_gcsqb_pending_szr (szr, bldzt, szrzt);
+ALTER TABLE gcsqb ADD INDEX idx_gcsqb_pending_bld (bld, bldzt, szrzt);
@@ -0,0 +1,14 @@
+-- 制度向量入库队列（services/policy_index_queue.py 使用，服务启动后也会自动创建）
+-- 上传与回填写入，后台入库线程按 claim_token 认领批量处理，失败退避重试
+CREATE TABLE IF NOT EXISTS policy_index_queue (
+  policy_id VARCHAR(36) NOT NULL PRIMARY KEY COMMENT 'dept_policy.id',
+  status VARCHAR(16) NOT NULL DEFAULT 'pending' COMMENT 'pending/running/done/failed',
+  attempts INT NOT NULL DEFAULT 0 COMMENT '已尝试次数',
+  last_error VARCHAR(512) NULL COMMENT '最近一次失败原因',
+  claim_token CHAR(32) NULL COMMENT '认领批次',
+  next_run_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '最早可执行时间（重试退避）',
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  INDEX idx_policy_index_queue_due (status, next_run_at),
+  INDEX idx_policy_index_queue_claim (claim_token)
+) DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,6 @@
+-- 会话令牌撤销表（services/session_token.py 使用，服务启动后也会自动创建）
+-- 员工科室/级别/在职状态或 webconfig 管理员变更时写入；早于 revoked_at 签发的令牌失效，name='*' 表示全部
+CREATE TABLE IF NOT EXISTS session_revocation (
+  name VARCHAR(100) NOT NULL PRIMARY KEY COMMENT '员工姓名，* 表示全部',
+  revoked_at BIGINT NOT NULL COMMENT '撤销时间（毫秒时间戳）'
+) DEFAULT CHARSET=utf8mb4;
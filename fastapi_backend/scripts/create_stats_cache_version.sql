@@ -0,0 +1,8 @@
+-- 统计缓存版本号表（utils/stats_cache.py 使用，服务启动后也会自动创建）
+-- 审批、请假/加班登记、公出、人员管理、假期设置等写操作递增对应 scope 的 version，
+-- 各 uvicorn worker 读取同一版本号判断本地缓存是否失效
+CREATE TABLE IF NOT EXISTS stats_cache_version (
+  scope VARCHAR(32) NOT NULL PRIMARY KEY COMMENT 'leave/overtime/trip/staff/holiday/config',
+  version BIGINT NOT NULL DEFAULT 0 COMMENT '版本号，写操作递增',
+  updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) DEFAULT CHARSET=utf8mb4;
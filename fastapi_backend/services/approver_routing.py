@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+审批人路由表 - 由 yggl 一次查询预先计算各 (lsys, jb 类别) 的候选审批人，GET /api/approvers 直接查内存
+- 候选列表与 routers/approvers.py 中的审批规则一致（部长/副部长、同室主任/副主任、同室组长等），
+  顺序与原 SQL 的 ORDER BY jb, name / ORDER BY lsys, jb, name 一致（排序在 MySQL 中完成）
+- 本进程通过 admin/db_manager 修改员工后调用 invalidate_approver_routing()，下次查询时重建
+- 其他 worker 的修改通过 stats_cache 的 staff 版本号发现，最多每 VERSION_CHECK_SECONDS 秒检查一次
+"""
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from database import db
+from utils.stats_cache import get_stats_version, SCOPE_STAFF
+
+logger = logging.getLogger(__name__)
+
+# 检查 staff 版本号的最小间隔（秒），间隔内的查询不访问 MySQL
+VERSION_CHECK_SECONDS = 30
+
+# 申请人 jb 类别
+CAT_BUBAN = "buban"          # 部办人员
+CAT_DIRECTOR = "director"    # 主任/副主任
+CAT_LEAD = "lead"            # 组长/责任工艺师
+CAT_STAFF = "staff"          # 员工或未填级别
+CAT_OTHER = "other"          # 其他级别
+
+
+def _jb_prefix(jb: str, *prefixes: str) -> bool:
+    """与 SQL 条件 (jb = 'x' OR jb LIKE 'x%') 一致"""
+    return any(jb.startswith(p) for p in prefixes)
+
+
+class ApproverRouting:
+    """某一时刻 yggl 的审批人路由表（只读）。"""
+
+    def __init__(self, rows: List[dict], lsys_order: List[Optional[str]]):
+        lsys_rank = {l: i for i, l in enumerate(lsys_order)}
+        # 申请人信息：与 _get_user_info 一致，不过滤在职状态
+        self.users: Dict[str, Tuple[str, str]] = {}
+        candidates = []
+        for r in rows:
+            name = r.get("name")
+            if name is None:
+                continue
+            key = str(name).rstrip()
+            jb, lsys = r.get("jb") or "", r.get("lsys") or ""
+            self.users.setdefault(key, (jb, lsys))
+            if key and int(r.get("zaizhi") or 0) == 0:
+                candidates.append({"name": name, "jb": r.get("jb"), "lsys": r.get("lsys")})
+
+        # rows 已按 jb, name 排序，以下过滤保持该顺序
+        self.ministers = [c for c in candidates if _jb_prefix(c["jb"] or "", "部长")]
+        self.leaders = [c for c in candidates if _jb_prefix(c["jb"] or "", "部长", "副部长")]
+        self.room_directors: Dict[str, List[dict]] = {}
+        self.room_leads: Dict[str, List[dict]] = {}
+        all_leads = []
+        for c in candidates:
+            jb, lsys = c["jb"] or "", (c["lsys"] or "").rstrip()
+            if _jb_prefix(jb, "主任", "副主任"):
+                self.room_directors.setdefault(lsys, []).append(c)
+            if _jb_prefix(jb, "组长", "主任", "副主任"):
+                self.room_leads.setdefault(lsys, []).append(c)
+                all_leads.append(c)
+        # 无 lsys 的员工：ORDER BY lsys, jb, name
+        self.all_leads = sorted(all_leads, key=lambda c: lsys_rank.get(c["lsys"], len(lsys_rank)))
+
+    def user_info(self, name: str) -> Optional[dict]:
+        u = self.users.get((name or "").rstrip())
+        return {"jb": u[0], "lsys": u[1]} if u else None
+
+    @staticmethod
+    def category(jb: str, lsys: str) -> str:
+        from routers.approvers import _jb_match
+
+        if "部办" in lsys:
+            return CAT_BUBAN
+        if _jb_match(jb, "主任") or _jb_match(jb, "副主任"):
+            return CAT_DIRECTOR
+        if _jb_match(jb, "组长") or _jb_match(jb, "责任工艺师"):
+            return CAT_LEAD
+        if _jb_match(jb, "员工") or not jb:
+            return CAT_STAFF
+        return CAT_OTHER
+
+    def first(self, name: str) -> List[dict]:
+        user = self.user_info(name)
+        if not user:
+            return []
+        jb = (user.get("jb") or "").strip()
+        lsys = (user.get("lsys") or "").strip()
+        cat = self.category(jb, lsys)
+        if cat == CAT_BUBAN:
+            return list(self.ministers)
+        if cat == CAT_DIRECTOR:
+            result = list(self.leaders)
+            if lsys:
+                me = (name or "").rstrip()
+                result += [c for c in self.room_directors.get(lsys, []) if str(c["name"]).rstrip() != me]
+            return result
+        if cat == CAT_LEAD:
+            return list(self.room_directors.get(lsys, [])) if lsys else []
+        if cat == CAT_STAFF:
+            return list(self.room_leads.get(lsys, [])) if lsys else list(self.all_leads)
+        if lsys and self.room_leads.get(lsys):
+            return list(self.room_leads[lsys])
+        return list(self.leaders)
+
+    def second(self) -> List[dict]:
+        return list(self.leaders)
+
+    def room(self, name: str) -> List[dict]:
+        user = self.user_info(name)
+        if not user:
+            return []
+        lsys = (user.get("lsys") or "").strip()
+        return list(self.room_directors.get(lsys, [])) if lsys else []
+
+
+_lock = threading.Lock()
+_routing: Optional[ApproverRouting] = None
+_routing_version: Optional[int] = None
+_last_check = 0.0
+
+
+def _build() -> ApproverRouting:
+    rows = db.execute_query(
+        "SELECT name, jb, lsys, zaizhi FROM yggl WHERE name IS NOT NULL AND name != '' ORDER BY jb, name"
+    ) or []
+    lsys_rows = db.execute_query(
+        "SELECT DISTINCT lsys FROM yggl WHERE name IS NOT NULL AND name != '' ORDER BY lsys"
+    ) or []
+    return ApproverRouting(rows, [r.get("lsys") for r in lsys_rows])
+
+
+def get_approver_routing() -> ApproverRouting:
+    """当前路由表；首次使用、本进程失效或 staff 版本号变化时重建。"""
+    global _routing, _routing_version, _last_check
+    now = time.time()
+    with _lock:
+        routing, version = _routing, _routing_version
+        due = now - _last_check >= VERSION_CHECK_SECONDS
+        if due:
+            _last_check = now
+    if routing is not None and not due:
+        return routing
+    current = get_stats_version(SCOPE_STAFF) if due or routing is None else version
+    if routing is not None and current is not None and current == version:
+        return routing
+    built = _build()
+    with _lock:
+        _routing, _routing_version, _last_check = built, current, now
+    logger.info(f"审批人路由表已重建: {len(built.users)} 人")
+    return built
+
+
+def invalidate_approver_routing() -> None:
+    """员工信息变更后调用：本进程下次查询时重建路由表。"""
+    global _routing
+    with _lock:
+        _routing = None
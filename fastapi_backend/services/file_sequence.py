@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+文件编号顺序号分配 - 技术文件（bianhao）、技术管理（bianhaogljs）、管理文件（bianhaogl）的 bianhao2
+- 顺序号保存在 file_sequence 表，按 (series, dept, year) 一行：series 为 表名:bianhao1，
+  dept 为科室（仅技术文件按科室编号），year 为编号年份（技术文件不按年重置，为 0）
+- 分配为一条 UPDATE file_sequence SET v = LAST_INSERT_ID(v + n)：行锁保证并发提交不会拿到相同编号，
+  不再对编号表 ORDER BY bianhao2 DESC 扫描
+- insert_numbered 默认在写入编号记录的同一事务内分配（FILE_SEQUENCE_BLOCK_SIZE=1）：插入失败时顺序号一并回滚，编号连续
+- FILE_SEQUENCE_BLOCK_SIZE>1 时每个进程一次预取一段编号在内存中发放，减少行锁竞争；
+  代价是进程重启会留下未用的空号，且多进程间编号不再按提交时间递增
+- 某个键首次使用时由编号表现有最大 bianhao2 初始化
+表结构见 scripts/create_file_sequence.sql；进程内首次使用时自动创建。
+"""
+import logging
+import threading
+from typing import Callable, Dict, List, Tuple
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# 可分配顺序号的编号表
+SEQUENCE_TABLES = ("bianhao", "bianhaogljs", "bianhaogl")
+# 按科室（bz）编号的表：科室为空也按 bz = '' 单独编号，不与其他科室合并
+DEPT_TABLES = ("bianhao",)
+
+_schema_ensured = False
+_seeded = set()
+_blocks: Dict[Tuple[str, str, int], List[int]] = {}  # key -> [下一个可用号, 段内最后一个号]
+_blocks_lock = threading.Lock()
+
+
+def ensure_sequence_table_once() -> bool:
+    """确保 file_sequence 表存在，进程内只执行一次。"""
+    global _schema_ensured
+    if _schema_ensured:
+        return True
+    n = db.execute_update(
+        "CREATE TABLE IF NOT EXISTS file_sequence ("
+        " series VARCHAR(64) NOT NULL,"
+        " dept VARCHAR(64) NOT NULL DEFAULT '',"
+        " year INT NOT NULL DEFAULT 0,"
+        " v INT NOT NULL DEFAULT 0,"
+        " updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,"
+        " PRIMARY KEY (series, dept, year)"
+        ") DEFAULT CHARSET=utf8mb4",
+        (),
+    )
+    if n < 0:
+        logger.warning("创建 file_sequence 失败，请手动执行 scripts/create_file_sequence.sql")
+        return False
+    _schema_ensured = True
+    return True
+
+
+def _key(table: str, bianhao1: str, dept: str, year: int) -> Tuple[str, str, int]:
+    if table not in SEQUENCE_TABLES:
+        raise ValueError(f"不支持的编号表 {table}")
+    return f"{table}:{bianhao1}", dept or "", int(year or 0)
+
+
+def _seed_where(table: str, bianhao1: str, dept: str, year: int):
+    where, params = ["bianhao1 = %s"], [bianhao1]
+    if table in DEPT_TABLES:
+        where.append("bz = %s")
+        params.append(dept or "")
+    if year:
+        where.append("bhyear = %s")
+        params.append(year)
+    return " AND ".join(where), params
+
+
+def _seed(cursor, table: str, bianhao1: str, dept: str, year: int) -> None:
+    """键首次使用时以编号表现有最大顺序号建行；已存在则不变"""
+    key = _key(table, bianhao1, dept, year)
+    if key in _seeded:
+        return
+    where, params = _seed_where(table, bianhao1, dept, year)
+    cursor.execute(
+        f"INSERT IGNORE INTO file_sequence (series, dept, year, v) "
+        f"SELECT %s, %s, %s, COALESCE(MAX(bianhao2), 0) FROM {table} WHERE {where}",
+        (*key, *params),
+    )
+    _seeded.add(key)
+
+
+def _allocate(cursor, table: str, bianhao1: str, dept: str, year: int, count: int) -> int:
+    """原子地将顺序号加 count，返回分配段的最后一个号（行锁持有到事务结束）"""
+    key = _key(table, bianhao1, dept, year)
+    for _ in range(2):
+        _seed(cursor, table, bianhao1, dept, year)
+        cursor.execute(
+            "UPDATE file_sequence SET v = LAST_INSERT_ID(v + %s) WHERE series = %s AND dept = %s AND year = %s",
+            (count, *key),
+        )
+        if cursor.rowcount == 1:
+            cursor.execute("SELECT LAST_INSERT_ID() AS v")
+            return int(cursor.fetchone()["v"])
+        # 建行的事务已回滚，重新建行
+        _seeded.discard(key)
+    raise RuntimeError(f"顺序号不存在: {key}")
+
+
+def _legacy_next(cursor, table: str, bianhao1: str, dept: str, year: int) -> int:
+    """file_sequence 不可用时的原方式：编号表最大值 + 1（加锁读，减少同一事务外的重号）"""
+    where, params = _seed_where(table, bianhao1, dept, year)
+    cursor.execute(f"SELECT MAX(bianhao2) AS v FROM {table} WHERE {where} FOR UPDATE", tuple(params))
+    return int(cursor.fetchone()["v"] or 0) + 1
+
+
+def _block_size() -> int:
+    from config import settings
+    return max(1, int(getattr(settings, "FILE_SEQUENCE_BLOCK_SIZE", 1) or 1))
+
+
+def _take_from_block(table: str, bianhao1: str, dept: str, year: int, block: int) -> int:
+    """从本进程预取的编号段中取一个号，段用完时以独立事务再预取 block 个"""
+    key = _key(table, bianhao1, dept, year)
+    with _blocks_lock:
+        cur = _blocks.get(key)
+        if cur is None or cur[0] > cur[1]:
+            with db.transaction() as cursor:
+                last = _allocate(cursor, table, bianhao1, dept, year, block)
+            cur = _blocks[key] = [last - block + 1, last]
+        n = cur[0]
+        cur[0] += 1
+        return n
+
+
+def insert_numbered(table: str, bianhao1: str, build: Callable[[int], Tuple[str, tuple]],
+                    dept: str = "", year: int = 0) -> int:
+    """
+    分配下一个 bianhao2 并写入编号记录，返回分配的顺序号。
+    build(n) 返回插入该编号记录的 (sql, params)；分配与插入在同一事务内，插入失败时一并回滚。
+    dept 仅技术文件传入科室；year 为 0 表示不按年重置。
+    块预取模式下编号在事务前从内存段取得（预取使用独立连接，须在调用方事务外进行，避免占满连接池）。
+    """
+    _key(table, bianhao1, dept, year)
+    has_table = ensure_sequence_table_once()
+    block = _block_size()
+    reserved = _take_from_block(table, bianhao1, dept, year, block) if has_table and block > 1 else None
+    with db.transaction() as cursor:
+        if reserved is not None:
+            n = reserved
+        elif has_table:
+            n = _allocate(cursor, table, bianhao1, dept, year, 1)
+        else:
+            n = _legacy_next(cursor, table, bianhao1, dept, year)
+        sql, params = build(n)
+        cursor.execute(sql, params)
+    return n
@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+"""
+换休票(hxp)台账
+- hxp.expire_date 持久化过期日（获得日 + 1 年），索引 (name, expire_date)，扣减与余额统计不再逐行在 Python 中计算
+- hxp_balance 按人保存有效余额与最近过期日，入账/扣减在同一事务内同步刷新，个人信息页直接读取
+- 扣减：锁定该人有效票（SELECT … FOR UPDATE），按过期日先进先出，一条 DELETE + 至多一条 UPDATE
+- 过期票由定时任务归档到 hxp_archive 并从 hxp 删除
+表结构见 scripts/create_hxp_ledger.sql；进程内首次使用时自动补齐。
+"""
+import asyncio
+import logging
+import time
+import uuid
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+_ledger_ensured = False
+_ledger_failed_at = 0.0
+_hxp_uuid_id = None
+
+# 表结构补齐失败后的重试间隔（秒），避免每次调用都执行 information_schema 查询与 DDL
+ENSURE_RETRY_SECONDS = 300
+
+# 单次归档的最大行数，避免长事务
+SWEEP_BATCH_SIZE = 1000
+
+
+def _column_exists(table: str, column: str) -> bool:
+    rows = db.execute_query(
+        "SELECT 1 FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+        (table, column),
+    )
+    return bool(rows)
+
+
+def _index_exists(table: str, index: str) -> bool:
+    rows = db.execute_query(
+        "SELECT 1 FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+        (table, index),
+    )
+    return bool(rows)
+
+
+def ensure_hxp_ledger_once() -> bool:
+    """
+    确保 hxp.expire_date 列及索引、hxp_balance、hxp_archive 存在，进程内只执行一次（启动时调用）。
+    含 DDL 与全量重建，不能在调用方事务内调用；失败后 ENSURE_RETRY_SECONDS 内不再重试。
+    """
+    global _ledger_ensured, _ledger_failed_at
+    if _ledger_ensured:
+        return True
+    if _ledger_failed_at and time.time() - _ledger_failed_at < ENSURE_RETRY_SECONDS:
+        return False
+    _ledger_failed_at = time.time()
+    try:
+        if not _column_exists("hxp", "expire_date"):
+            db.execute_update("ALTER TABLE hxp ADD COLUMN expire_date DATE NULL", ())
+        if not _index_exists("hxp", "idx_hxp_name_expire"):
+            db.execute_update("ALTER TABLE hxp ADD INDEX idx_hxp_name_expire (name, expire_date)", ())
+        if not _index_exists("hxp", "idx_hxp_expire"):
+            db.execute_update("ALTER TABLE hxp ADD INDEX idx_hxp_expire (expire_date)", ())
+        db.execute_update(
+            "CREATE TABLE IF NOT EXISTS hxp_balance ("
+            " name VARCHAR(100) NOT NULL PRIMARY KEY,"
+            " balance DECIMAL(10,2) NOT NULL DEFAULT 0,"
+            " next_expire DATE NULL,"
+            " updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"
+            ") DEFAULT CHARSET=utf8mb4",
+            (),
+        )
+        db.execute_update(
+            "CREATE TABLE IF NOT EXISTS hxp_archive ("
+            " id VARCHAR(64) NOT NULL PRIMARY KEY,"
+            " name VARCHAR(100) NOT NULL,"
+            " sl DECIMAL(10,2) NOT NULL DEFAULT 0,"
+            " sj DATETIME NULL,"
+            " expire_date DATE NULL,"
+            " archived_at DATETIME DEFAULT CURRENT_TIMESTAMP,"
+            " INDEX idx_hxp_archive_name (name)"
+            ") DEFAULT CHARSET=utf8mb4",
+            (),
+        )
+        if not _column_exists("hxp", "expire_date"):
+            logger.warning("hxp.expire_date 列不存在，请手动执行 scripts/create_hxp_ledger.sql")
+            return False
+    except Exception as e:
+        logger.warning(f"换休票台账表结构检查失败，请手动执行 scripts/create_hxp_ledger.sql: {e}")
+        return False
+    _needs_uuid_id()
+    _ledger_ensured = True
+    _ledger_failed_at = 0.0
+    rebuild_balances()
+    return True
+
+
+def compute_expire(sj) -> Optional[date]:
+    """获得日 + 1 年（与 utils.hxp_helper.compute_expire_date 规则一致）。"""
+    from utils.hxp_helper import compute_expire_date
+
+    exp = compute_expire_date(sj)
+    return datetime.strptime(exp, "%Y-%m-%d").date() if exp else None
+
+
+def _needs_uuid_id(cursor=None) -> bool:
+    """
+    hxp.id 若非自增（如 VARCHAR(36)）需显式传入 uuid，进程内只检查一次。
+    在事务内调用时传入 cursor，使用同一连接查询，不另占连接池。
+    """
+    global _hxp_uuid_id
+    if _hxp_uuid_id is None:
+        sql = ("SELECT EXTRA FROM information_schema.COLUMNS "
+               "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'hxp' AND COLUMN_NAME = 'id'")
+        if cursor is not None:
+            cursor.execute(sql)
+            rows = cursor.fetchall()
+        else:
+            rows = db.execute_query(sql, ())
+        _hxp_uuid_id = bool(rows) and "auto_increment" not in (rows[0].get("EXTRA") or "").lower()
+    return _hxp_uuid_id
+
+
+def _refresh_balances_tx(cursor, names: Iterable[str]) -> None:
+    """在调用方事务内按人重算 hxp_balance（走 (name, expire_date) 索引）。"""
+    names = sorted({n for n in names if n})
+    if not names:
+        return
+    placeholders = ", ".join(["%s"] * len(names))
+    cursor.execute(
+        f"UPDATE hxp_balance SET balance = 0, next_expire = NULL WHERE name IN ({placeholders})",
+        tuple(names),
+    )
+    cursor.execute(
+        "INSERT INTO hxp_balance (name, balance, next_expire) "
+        "SELECT name, ROUND(SUM(sl), 2), MIN(expire_date) FROM hxp "
+        f"WHERE name IN ({placeholders}) AND sl > 0 AND (expire_date IS NULL OR expire_date >= CURDATE()) "
+        "GROUP BY name "
+        "ON DUPLICATE KEY UPDATE balance = VALUES(balance), next_expire = VALUES(next_expire)",
+        tuple(names),
+    )
+
+
+def rebuild_balances() -> bool:
+    """
+    全量重建：补齐缺失的 expire_date（如通过数据库管理页直接插入的行），并重算所有人的余额。
+    启动时与通用增删改 hxp 表后调用。
+    """
+    if not _ledger_ensured and not ensure_hxp_ledger_once():
+        return False
+    try:
+        with db.transaction() as cursor:
+            cursor.execute(
+                "UPDATE hxp SET expire_date = DATE_ADD(DATE(sj), INTERVAL 1 YEAR) "
+                "WHERE expire_date IS NULL AND sj IS NOT NULL"
+            )
+            cursor.execute("DELETE FROM hxp_balance")
+            cursor.execute(
+                "INSERT INTO hxp_balance (name, balance, next_expire) "
+                "SELECT name, ROUND(SUM(sl), 2), MIN(expire_date) FROM hxp "
+                "WHERE sl > 0 AND (expire_date IS NULL OR expire_date >= CURDATE()) GROUP BY name"
+            )
+        return True
+    except Exception as e:
+        logger.warning(f"重建换休票余额失败: {e}")
+        return False
+
+
+def add_tickets_tx(cursor, items: List[tuple]) -> None:
+    """
+    在调用方事务内批量入账换休票。items 为 [(name, tickets), ...]，tickets 已按 0.25 取整。
+    台账未就绪（启动时补齐失败）时按原表结构写入，不在事务内执行 DDL。
+    """
+    ledger = _ledger_ensured
+    now = datetime.now()
+    values = [(name.strip(), round(float(t), 2)) for name, t in items if name and t and float(t) > 0]
+    if not values:
+        return
+    sj = now.strftime("%Y-%m-%d %H:%M:%S")
+    cols, extra = ("name, sl, sj, expire_date", (compute_expire(now),)) if ledger else ("name, sl, sj", ())
+    if _needs_uuid_id(cursor):
+        cols = "id, " + cols
+        rows = [(uuid.uuid4().hex, name, t, sj) + extra for name, t in values]
+    else:
+        rows = [(name, t, sj) + extra for name, t in values]
+    placeholders = ", ".join(["%s"] * len(rows[0]))
+    cursor.executemany(f"INSERT INTO hxp ({cols}) VALUES ({placeholders})", rows)
+    if ledger:
+        _refresh_balances_tx(cursor, (name for name, _ in values))
+
+
+def deduct_tickets_tx(cursor, name: str, consume: float) -> float:
+    """
+    在调用方事务内扣减换休票：锁定该人有效票（FOR UPDATE），按过期日先进先出，支持0.5张。
+    返回未能扣减的张数（余额不足时 > 0）。台账未就绪时按获得时间逐行判断有效期。
+    """
+    ledger = _ledger_ensured
+    name = (name or "").strip()
+    remain = round(float(consume), 2)
+    if not name or remain <= 0:
+        return 0.0
+    if ledger:
+        cursor.execute(
+            "SELECT id, sl FROM hxp WHERE name = %s AND sl > 0 "
+            "AND (expire_date IS NULL OR expire_date >= CURDATE()) "
+            "ORDER BY expire_date IS NULL, expire_date, id FOR UPDATE",
+            (name,),
+        )
+        rows = cursor.fetchall()
+    else:
+        rows = _legacy_valid_rows_tx(cursor, name)
+    used_up, partial = [], None
+    for row in rows:
+        if remain <= 0:
+            break
+        try:
+            sl = float(row.get("sl") or 0)
+        except (TypeError, ValueError):
+            sl = 0.0
+        if sl <= 0:
+            continue
+        if remain >= sl:
+            used_up.append(row["id"])
+            remain = round(remain - sl, 2)
+        else:
+            partial = (round(remain, 2), row["id"])
+            remain = 0
+    if used_up:
+        placeholders = ", ".join(["%s"] * len(used_up))
+        cursor.execute(f"DELETE FROM hxp WHERE id IN ({placeholders})", tuple(used_up))
+    if partial:
+        cursor.execute("UPDATE hxp SET sl = sl - %s WHERE id = %s", partial)
+    if ledger:
+        _refresh_balances_tx(cursor, [name])
+    return max(0.0, remain)
+
+
+def _legacy_valid_rows_tx(cursor, name: str) -> List[Dict]:
+    """台账表不可用时：锁定该人全部票，按 sj 计算过期日，剔除已过期并按过期日排序（旧逻辑）。"""
+    from utils.hxp_helper import compute_expire_date, parse_expire_for_sort
+
+    today = date.today().strftime("%Y-%m-%d")
+    cursor.execute("SELECT id, sl, sj FROM hxp WHERE name = %s AND sl > 0 ORDER BY id FOR UPDATE", (name,))
+    rows_with_exp = []
+    for r in cursor.fetchall():
+        exp = compute_expire_date(r.get("sj"))
+        if exp and exp < today:
+            continue  # 已过期，不参与扣减
+        rows_with_exp.append((r, parse_expire_for_sort(exp) if exp else (9999, 12)))
+    rows_with_exp.sort(key=lambda x: x[1])
+    return [r for r, _ in rows_with_exp]
+
+
+def get_balance(name: str) -> Dict:
+    """
+    个人换休票余额：{ total, details: [{expireDate, count}] }。
+    总数读 hxp_balance；若最近过期日已过（余额中含刚过期的票）先按人刷新再读。
+    """
+    name = (name or "").strip()
+    if not name:
+        return {"total": 0.0, "details": []}
+    if not ensure_hxp_ledger_once():
+        return _legacy_balance(name)
+    rows = db.execute_query("SELECT balance, next_expire FROM hxp_balance WHERE name = %s", (name,))
+    today = date.today()
+    if rows and rows[0].get("next_expire") is not None and _as_date(rows[0]["next_expire"]) < today:
+        try:
+            with db.transaction() as cursor:
+                _refresh_balances_tx(cursor, [name])
+            rows = db.execute_query("SELECT balance, next_expire FROM hxp_balance WHERE name = %s", (name,))
+        except Exception as e:
+            logger.warning(f"刷新换休票余额失败: {e}")
+    total = float(rows[0].get("balance") or 0) if rows else 0.0
+    details = []
+    if total > 0:
+        groups = db.execute_query(
+            "SELECT expire_date, ROUND(SUM(sl), 2) AS cnt FROM hxp "
+            "WHERE name = %s AND sl > 0 AND expire_date >= CURDATE() "
+            "GROUP BY expire_date ORDER BY expire_date",
+            (name,),
+        )
+        details = [
+            {"expireDate": _as_date(g["expire_date"]).strftime("%Y-%m-%d"), "count": round(float(g.get("cnt") or 0), 2)}
+            for g in groups or []
+            if g.get("expire_date") is not None
+        ]
+    return {"total": round(total, 2), "details": details}
+
+
+def _as_date(v) -> date:
+    if isinstance(v, datetime):
+        return v.date()
+    if isinstance(v, date):
+        return v
+    return datetime.strptime(str(v)[:10], "%Y-%m-%d").date()
+
+
+def _legacy_balance(name: str) -> Dict:
+    """台账表不可用时按 sj 逐行计算（旧逻辑）。"""
+    from utils.hxp_helper import compute_expire_date, parse_expire_for_sort
+
+    today = date.today().strftime("%Y-%m-%d")
+    total = 0.0
+    expire_groups: Dict[str, float] = {}
+    for row in db.execute_query("SELECT id, sl, sj FROM hxp WHERE name = %s AND sl > 0", (name,)) or []:
+        try:
+            sl = float(row.get("sl") or 0)
+        except (TypeError, ValueError):
+            sl = 0.0
+        if sl <= 0:
+            continue
+        exp = compute_expire_date(row.get("sj"))
+        if exp and exp < today:
+            continue  # 已过期，不计入
+        total += sl
+        if exp:
+            expire_groups[exp] = expire_groups.get(exp, 0.0) + sl
+    details = [
+        {"expireDate": k, "count": round(v, 2)}
+        for k, v in sorted(expire_groups.items(), key=lambda x: parse_expire_for_sort(x[0]))
+    ]
+    return {"total": round(total, 2), "details": details}
+
+
+def sweep_expired_tickets(batch_size: int = SWEEP_BATCH_SIZE) -> int:
+    """把已过期的票归档到 hxp_archive 并从 hxp 删除，按批提交，返回归档行数。"""
+    if not ensure_hxp_ledger_once():
+        return 0
+    archived = 0
+    while True:
+        try:
+            with db.transaction() as cursor:
+                cursor.execute(
+                    "SELECT id, name FROM hxp WHERE expire_date < CURDATE() LIMIT %s FOR UPDATE",
+                    (int(batch_size),),
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                ids = tuple(r["id"] for r in rows)
+                placeholders = ", ".join(["%s"] * len(ids))
+                cursor.execute(
+                    "INSERT IGNORE INTO hxp_archive (id, name, sl, sj, expire_date) "
+                    f"SELECT id, name, sl, sj, expire_date FROM hxp WHERE id IN ({placeholders})",
+                    ids,
+                )
+                cursor.execute(f"DELETE FROM hxp WHERE id IN ({placeholders})", ids)
+                _refresh_balances_tx(cursor, (r.get("name") for r in rows))
+        except Exception as e:
+            logger.warning(f"归档过期换休票失败: {e}")
+            break
+        archived += len(rows)
+        if len(rows) < batch_size:
+            break
+    if archived:
+        logger.info(f"已归档过期换休票 {archived} 条")
+    return archived
+
+
+async def sweep_loop(interval_hours: float) -> None:
+    """定时归档过期换休票（启动后立即执行一次，之后每 interval_hours 小时执行一次）。"""
+    loop = asyncio.get_event_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, sweep_expired_tickets)
+        except Exception as e:
+            logger.warning(f"换休票定时归档异常: {e}")
+        await asyncio.sleep(max(1.0, float(interval_hours)) * 3600)
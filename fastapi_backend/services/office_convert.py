@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+"""
+Word/Excel 转 PDF 转换池 - 固定数量的 LibreOffice 工作线程处理转换队列，供制度预览使用
+- 每个进程启动转换池时以文件锁认领一个槽位 S（多个 uvicorn worker 各自一个），工作线程 N 使用
+  独立的用户配置目录 data/lo_profiles/pS/wN 与端口 OFFICE_BASE_PORT + S*OFFICE_POOL_SIZE + N，
+  进程之间、线程之间都不共用 LibreOffice 配置目录与监听端口
+- 可导入 uno（LibreOffice 自带 Python / python3-uno）时，每个工作线程持有一个常驻的 soffice 监听进程，
+  通过 UNO 加载并导出 PDF，省去每次启动 LibreOffice 的数秒开销；否则每次转换启动一次 soffice（仍使用独立配置目录）
+- 单次转换超过 OFFICE_CONVERT_TIMEOUT 秒即终止并重启该工作线程的 soffice；失败重试一次
+- 同一输出文件的转换请求在队列中合并；输出先写临时文件再替换，预览不会读到半个 PDF
+- metrics() 返回队列长度、转换中数量、完成/失败/超时/重启次数与转换耗时
+"""
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, Optional
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+try:
+    import msvcrt
+    HAS_MSVCRT = True
+except ImportError:
+    HAS_MSVCRT = False
+
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+    HAS_UNO = True
+except ImportError:
+    HAS_UNO = False
+
+logger = logging.getLogger(__name__)
+
+_BASE_DIR = Path(__file__).resolve().parent.parent
+PROFILE_DIR = _BASE_DIR / "data" / "lo_profiles"
+
+# 常驻 soffice 启动后等待 UNO 连接就绪的最长秒数
+_CONNECT_SECONDS = 30
+_CALC_TYPES = {".xls", ".xlsx"}
+# 可认领的进程槽位数上限（即同时使用转换池的进程数）
+_MAX_SLOTS = 64
+
+
+def get_libreoffice_cmd() -> str:
+    from config import settings
+    if getattr(settings, "LIBREOFFICE_CMD", "") and str(settings.LIBREOFFICE_CMD).strip():
+        return str(settings.LIBREOFFICE_CMD).strip()
+    return shutil.which("libreoffice") or shutil.which("soffice") or "libreoffice"
+
+
+def _claim_slot():
+    """
+    认领一个进程槽位：对 data/lo_profiles/slotS.lock 加非阻塞独占锁，锁文件在进程存活期间保持打开，
+    进程退出后锁自动释放，槽位（及其已初始化的配置目录）可被新进程复用。返回 (槽位, 锁文件)。
+    """
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    if HAS_FCNTL or HAS_MSVCRT:
+        for slot in range(_MAX_SLOTS):
+            f = open(PROFILE_DIR / f"slot{slot}.lock", "a+")
+            try:
+                if HAS_FCNTL:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                return slot, f
+            except OSError:
+                f.close()
+    raise RuntimeError("无法认领 LibreOffice 转换池槽位（进程数超过上限或系统不支持文件锁）")
+
+
+class ConversionTimeout(Exception):
+    pass
+
+
+class _OfficeWorker:
+    """一个工作线程对应的 LibreOffice 实例（独立配置目录，UNO 模式下为常驻进程）"""
+
+    def __init__(self, slot: int, index: int, port: int):
+        self.index = index
+        self.port = port
+        self.profile = PROFILE_DIR / f"p{slot}" / f"w{index}"
+        self.profile.mkdir(parents=True, exist_ok=True)
+        self.profile_url = self.profile.resolve().as_uri()
+        self.proc: Optional[subprocess.Popen] = None
+        self.desktop = None
+
+    # ---- UNO 常驻模式 ----
+
+    def _start_listener(self) -> None:
+        self.stop()
+        self.proc = subprocess.Popen(
+            [
+                get_libreoffice_cmd(),
+                f"-env:UserInstallation={self.profile_url}",
+                "--headless", "--invisible", "--norestore", "--nologo", "--nodefault",
+                f"--accept=socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext",
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        local = uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local)
+        deadline = time.time() + _CONNECT_SECONDS
+        while True:
+            try:
+                ctx = resolver.resolve(
+                    f"uno:socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext"
+                )
+                self.desktop = ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+                return
+            except Exception:
+                if time.time() > deadline or self.proc.poll() is not None:
+                    raise RuntimeError(f"LibreOffice 监听进程启动失败（端口 {self.port}）")
+                time.sleep(0.5)
+
+    @staticmethod
+    def _prop(name, value):
+        p = PropertyValue()
+        p.Name, p.Value = name, value
+        return p
+
+    def _convert_uno(self, source: str, out_pdf: str, timeout: float) -> None:
+        if self.desktop is None or self.proc is None or self.proc.poll() is not None:
+            self._start_listener()
+        # UNO 调用会阻塞，超时由看门狗结束 soffice 进程使调用抛出
+        timed_out = threading.Event()
+
+        def _kill():
+            timed_out.set()
+            self.stop()
+
+        watchdog = threading.Timer(timeout, _kill)
+        watchdog.start()
+        try:
+            doc = self.desktop.loadComponentFromURL(
+                uno.systemPathToFileUrl(os.path.abspath(source)), "_blank", 0,
+                (self._prop("Hidden", True), self._prop("ReadOnly", True)),
+            )
+            try:
+                flt = "calc_pdf_Export" if Path(source).suffix.lower() in _CALC_TYPES else "writer_pdf_Export"
+                doc.storeToURL(uno.systemPathToFileUrl(os.path.abspath(out_pdf)), (self._prop("FilterName", flt),))
+            finally:
+                doc.close(True)
+        except Exception:
+            if timed_out.is_set():
+                raise ConversionTimeout()
+            self.desktop = None
+            raise
+        finally:
+            watchdog.cancel()
+
+    # ---- 逐次启动模式 ----
+
+    def _convert_subprocess(self, source: str, out_pdf: str, timeout: float) -> None:
+        out_dir = tempfile.mkdtemp(prefix="lo_", dir=str(self.profile))
+        try:
+            result = subprocess.run(
+                [
+                    get_libreoffice_cmd(),
+                    f"-env:UserInstallation={self.profile_url}",
+                    "--headless", "--norestore", "--convert-to", "pdf", "--outdir", out_dir, source,
+                ],
+                capture_output=True,
+                timeout=timeout,
+            )
+            produced = os.path.join(out_dir, Path(source).stem + ".pdf")
+            if result.returncode != 0 or not os.path.isfile(produced):
+                raise RuntimeError(result.stderr.decode("utf-8", errors="ignore").strip() or "LibreOffice 未生成 PDF")
+            os.replace(produced, out_pdf)
+        except subprocess.TimeoutExpired:
+            raise ConversionTimeout()
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+    def convert(self, source: str, dest_pdf: str, timeout: float) -> None:
+        """转换为 dest_pdf（先写同目录临时文件再替换）；失败抛异常"""
+        os.makedirs(os.path.dirname(dest_pdf), exist_ok=True)
+        tmp_pdf = f"{dest_pdf}.{os.getpid()}.{self.index}.tmp.pdf"
+        try:
+            if HAS_UNO:
+                self._convert_uno(source, tmp_pdf, timeout)
+            else:
+                self._convert_subprocess(source, tmp_pdf, timeout)
+            os.replace(tmp_pdf, dest_pdf)
+        finally:
+            if os.path.exists(tmp_pdf):
+                try:
+                    os.remove(tmp_pdf)
+                except OSError:
+                    pass
+
+    def stop(self) -> None:
+        self.desktop = None
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.kill()
+            try:
+                self.proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                pass
+        self.proc = None
+
+
+class OfficePool:
+    """转换队列与工作线程"""
+
+    def __init__(self, size: int, timeout: float, base_port: int):
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self.slot, self._slot_lock = _claim_slot()
+        self._workers = [
+            _OfficeWorker(self.slot, i, base_port + self.slot * self.size + i) for i in range(self.size)
+        ]
+        self._threads = []
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._durations = deque(maxlen=200)
+        self._waits = deque(maxlen=200)
+        self.completed = self.failed = self.timeouts = self.restarts = self.running = 0
+
+    def _ensure_threads(self) -> None:
+        if self._threads:
+            return
+        for w in self._workers:
+            t = threading.Thread(target=self._run, args=(w,), name=f"office-convert-{w.index}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, source: str, dest_pdf: str) -> Future:
+        """加入转换队列，返回 Future（结果为 PDF 路径，失败为 None）；同一 dest_pdf 的请求合并"""
+        with self._lock:
+            self._ensure_threads()
+            fut = self._inflight.get(dest_pdf)
+            if fut is not None:
+                return fut
+            fut = Future()
+            self._inflight[dest_pdf] = fut
+        self._queue.put((source, dest_pdf, fut, time.time()))
+        return fut
+
+    def _run(self, worker: _OfficeWorker) -> None:
+        while True:
+            source, dest_pdf, fut, queued_at = self._queue.get()
+            start = time.time()
+            with self._lock:
+                self.running += 1
+                self._waits.append(start - queued_at)
+            result = None
+            for attempt in (1, 2):
+                try:
+                    worker.convert(source, dest_pdf, self.timeout)
+                    result = dest_pdf
+                    break
+                except ConversionTimeout:
+                    logger.error(f"LibreOffice 转换超时（{self.timeout}s）: {source}")
+                    with self._lock:
+                        self.timeouts += 1
+                except FileNotFoundError:
+                    logger.warning("未找到 LibreOffice，请安装 libreoffice 或 soffice")
+                    break
+                except Exception as e:
+                    logger.error(f"LibreOffice 转换失败（第 {attempt} 次）{source}: {e}")
+                worker.stop()  # 出错后重启该工作线程的 soffice
+                with self._lock:
+                    self.restarts += 1
+            with self._lock:
+                self.running -= 1
+                self._inflight.pop(dest_pdf, None)
+                if result:
+                    self.completed += 1
+                    self._durations.append(time.time() - start)
+                else:
+                    self.failed += 1
+            if not fut.done():
+                fut.set_result(result)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            durations = sorted(self._durations)
+            waits = list(self._waits)
+            return {
+                "mode": "uno" if HAS_UNO else "subprocess",
+                "poolSize": self.size,
+                "slot": self.slot,
+                "queueDepth": self._queue.qsize(),
+                "running": self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "timeouts": self.timeouts,
+                "restarts": self.restarts,
+                "avgConvertMs": round(sum(durations) / len(durations) * 1000) if durations else 0,
+                "p95ConvertMs": round(durations[max(0, int(len(durations) * 0.95) - 1)] * 1000) if durations else 0,
+                "avgQueueWaitMs": round(sum(waits) / len(waits) * 1000) if waits else 0,
+            }
+
+    def shutdown(self) -> None:
+        for w in self._workers:
+            w.stop()
+
+
+_pool: Optional[OfficePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_office_pool() -> OfficePool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from config import settings
+            _pool = OfficePool(
+                int(getattr(settings, "OFFICE_POOL_SIZE", 2) or 2),
+                float(getattr(settings, "OFFICE_CONVERT_TIMEOUT", 60) or 60),
+                int(getattr(settings, "OFFICE_BASE_PORT", 2202) or 2202),
+            )
+        return _pool
+
+
+def shutdown_pool() -> None:
+    """应用退出时结束常驻的 soffice 进程"""
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+bge-small-zh ONNX Runtime 编码器 - EMBEDDING_BACKEND=onnx 时替代 sentence_transformers（不加载 PyTorch）
+- 模型目录由 scripts/convert_embedding_onnx.py 从本地 EMBEDDING_MODEL_PATH 离线生成：
+  model.onnx（fp32）、model_int8.onnx（动态 int8 量化）与 tokenizer.json
+- 与 SentenceTransformer 一致：CLS 池化、最长 512 token，encode(texts, normalize_embeddings, batch_size) 返回 ndarray
+"""
+import logging
+import os
+from typing import List
+
+try:
+    import onnxruntime as ort
+    HAS_ORT = True
+except ImportError:
+    HAS_ORT = False
+
+logger = logging.getLogger(__name__)
+
+MAX_SEQ_LENGTH = 512
+FP32_FILE = "model.onnx"
+INT8_FILE = "model_int8.onnx"
+
+
+def _load_tokenizer(model_dir: str):
+    """优先用 tokenizers（无 transformers 依赖），否则用 transformers 的 fast tokenizer"""
+    tok_file = os.path.join(model_dir, "tokenizer.json")
+    try:
+        from tokenizers import Tokenizer
+        tok = Tokenizer.from_file(tok_file)
+        tok.enable_truncation(MAX_SEQ_LENGTH)
+        tok.enable_padding()
+        return tok, True
+    except ImportError:
+        from transformers import AutoTokenizer
+        return AutoTokenizer.from_pretrained(model_dir), False
+
+
+class OnnxEncoder:
+    """ONNX Runtime 版 bge 编码器，接口与 SentenceTransformer.encode 的常用参数一致"""
+
+    def __init__(self, model_dir: str, quantized: bool = True, threads: int = 0):
+        if not HAS_ORT:
+            raise ImportError("未安装 onnxruntime")
+        file_name = INT8_FILE if quantized else FP32_FILE
+        path = os.path.join(model_dir, file_name)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"未找到 {path}，请先运行 scripts/convert_embedding_onnx.py")
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            opts.intra_op_num_threads = threads
+        self._session = ort.InferenceSession(path, sess_options=opts, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self._session.get_inputs()}
+        self._tokenizer, self._fast = _load_tokenizer(model_dir)
+        self.model_file = file_name
+
+    def _tokenize(self, texts: List[str]):
+        import numpy as np
+        if self._fast:
+            encs = self._tokenizer.encode_batch(texts)
+            ids = np.asarray([e.ids for e in encs], dtype=np.int64)
+            mask = np.asarray([e.attention_mask for e in encs], dtype=np.int64)
+            types = np.asarray([e.type_ids for e in encs], dtype=np.int64)
+        else:
+            enc = self._tokenizer(texts, padding=True, truncation=True, max_length=MAX_SEQ_LENGTH, return_tensors="np")
+            ids = enc["input_ids"].astype(np.int64)
+            mask = enc["attention_mask"].astype(np.int64)
+            types = enc.get("token_type_ids", np.zeros_like(ids)).astype(np.int64)
+        feeds = {"input_ids": ids, "attention_mask": mask, "token_type_ids": types}
+        return {k: v for k, v in feeds.items() if k in self._input_names}
+
+    def encode(self, sentences, normalize_embeddings: bool = True, batch_size: int = 32, **kwargs):
+        import numpy as np
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        # 按长度排序后分批，减少 padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out = [None] * len(texts)
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            hidden = self._session.run(None, self._tokenize([texts[i] for i in idx]))[0]
+            cls = hidden[:, 0].astype(np.float32)  # CLS 池化
+            if normalize_embeddings:
+                cls /= np.maximum(np.linalg.norm(cls, axis=1, keepdims=True), 1e-12)
+            for k, i in enumerate(idx):
+                out[i] = cls[k]
+        emb = np.vstack(out)
+        return emb[0] if single else emb
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+加班费计算引擎 - 按列（NumPy 数组）一次性计算整年加班费
+- 一条 SQL 取整年已审核通过(jiabanzt=4)且换休票为否的加班记录
+- 按「人+日期」合并当天小时数，应用节日激励规则：
+  春节/国庆节/高温防暑休假 当天加班满 8 小时固定 200 元，其余按 webconfig.zhibanfei 元/小时
+- 结果可按 人 / 日 / 月 / 科室 任意筛选汇总，供 /dept/overtime-pay-by-month、
+  /dept/overtime-pay-by-employee、/dept/overtime-pay-export 共用
+未安装 numpy 时退化为纯 Python 实现，结果一致。
+"""
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from database import db
+from utils.stats_cache import cached_call, SCOPE_OVERTIME, SCOPE_STAFF, SCOPE_HOLIDAY, SCOPE_CONFIG
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+logger = logging.getLogger(__name__)
+
+INCENTIVE_FESTIVALS = {"春节", "国庆节", "高温防暑休假"}
+INCENTIVE_MIN_HOURS = 8.0
+INCENTIVE_PAY = 200.0
+DEFAULT_ZHIBANFEI = 15.0
+
+
+def load_zhibanfei() -> float:
+    """读取 webconfig.zhibanfei（元/小时），失败时默认 15。"""
+    try:
+        wc = db.execute_query("SELECT zhibanfei FROM webconfig WHERE id = 1 LIMIT 1")
+        if wc and wc[0].get("zhibanfei") is not None:
+            return float(wc[0]["zhibanfei"])
+    except Exception:
+        pass
+    return DEFAULT_ZHIBANFEI
+
+
+def load_holiday_festival_map(year: int) -> Dict[str, str]:
+    """加载某年假期的 日期 -> 节日名称(festival) 映射，读取失败返回空字典。"""
+    try:
+        from utils.holiday_loader import load_holidays_for_year
+
+        mapping: Dict[str, str] = {}
+        for r in load_holidays_for_year(str(year)):
+            date_str = (r.get("date") or "").strip()
+            if date_str:
+                mapping[date_str] = (r.get("festival") or "").strip()
+        return mapping
+    except Exception:
+        return {}
+
+
+class OvertimePayBook:
+    """
+    按「人+日期」聚合后的加班费明细（列存）。
+    names/dates 为去重后的姓名、日期字典；day_name/day_date 为每个「人+日」对应的下标，
+    day_hours/day_pay 为当天小时数与金额；lsys_of 为 姓名 -> 科室。
+    """
+
+    def __init__(self, names: List[str], dates: List[str], day_name, day_date, day_hours, day_pay,
+                 lsys_of: Optional[Dict[str, str]] = None, zhibanfei: float = DEFAULT_ZHIBANFEI):
+        self.names = names
+        self.dates = dates
+        self.months = [d[:7] for d in dates]
+        self.day_name = day_name
+        self.day_date = day_date
+        self.day_hours = day_hours
+        self.day_pay = day_pay
+        self.lsys_of = lsys_of or {}
+        self.zhibanfei = zhibanfei
+
+    def __len__(self):
+        return len(self.day_hours)
+
+    def _selected(self, month_key: Optional[str] = None, names: Optional[Iterable[str]] = None,
+                  lsys: Optional[str] = None, exclude_lsys: Optional[str] = None):
+        """返回满足筛选条件的「人+日」下标。"""
+        if len(self.day_hours) == 0:
+            return []
+        name_ok = [True] * len(self.names)
+        if names is not None:
+            wanted = set(names)
+            name_ok = [ok and n in wanted for ok, n in zip(name_ok, self.names)]
+        if lsys is not None:
+            name_ok = [ok and self.lsys_of.get(n, "") == lsys for ok, n in zip(name_ok, self.names)]
+        if exclude_lsys is not None:
+            name_ok = [ok and self.lsys_of.get(n, "") != exclude_lsys for ok, n in zip(name_ok, self.names)]
+        date_ok = [month_key is None or m == month_key for m in self.months]
+        if HAS_NUMPY:
+            mask = np.asarray(name_ok, dtype=bool)[self.day_name] & np.asarray(date_ok, dtype=bool)[self.day_date]
+            return np.nonzero(mask)[0]
+        return [i for i in range(len(self.day_hours)) if name_ok[self.day_name[i]] and date_ok[self.day_date[i]]]
+
+    def _group(self, labels: List[str], label_of_day, idx) -> Dict[str, Dict[str, float]]:
+        """按 label_of_day（每个「人+日」的分组下标）汇总小时数与金额。"""
+        out: Dict[str, Dict[str, float]] = {}
+        if len(idx) == 0:
+            return out
+        if HAS_NUMPY:
+            sel = label_of_day[idx]
+            hours = np.bincount(sel, weights=self.day_hours[idx], minlength=len(labels))
+            pay = np.bincount(sel, weights=self.day_pay[idx], minlength=len(labels))
+            for c in np.unique(sel):
+                out[labels[c]] = {"hours": float(hours[c]), "pay": float(pay[c])}
+            return out
+        for i in idx:
+            agg = out.setdefault(labels[label_of_day[i]], {"hours": 0.0, "pay": 0.0})
+            agg["hours"] += self.day_hours[i]
+            agg["pay"] += self.day_pay[i]
+        return out
+
+    def _map_days(self, per_key: List[int], by_date: bool):
+        """把姓名/日期维度的分组下标展开到每个「人+日」。"""
+        src = self.day_date if by_date else self.day_name
+        if HAS_NUMPY:
+            return np.asarray(per_key, dtype=np.int64)[src]
+        return [per_key[c] for c in src]
+
+    def per_month(self, month_key: Optional[str] = None, names: Optional[Iterable[str]] = None,
+                  lsys: Optional[str] = None, exclude_lsys: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        """{ "YYYY-MM": {"hours", "pay"} }"""
+        idx = self._selected(month_key, names, lsys, exclude_lsys)
+        if len(idx) == 0:
+            return {}
+        labels = sorted(set(self.months))
+        pos = {m: i for i, m in enumerate(labels)}
+        return self._group(labels, self._map_days([pos[m] for m in self.months], by_date=True), idx)
+
+    def per_employee(self, month_key: Optional[str] = None, names: Optional[Iterable[str]] = None,
+                     lsys: Optional[str] = None, exclude_lsys: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        """{ name: {"hours", "pay"} }"""
+        idx = self._selected(month_key, names, lsys, exclude_lsys)
+        return self._group(self.names, self.day_name, idx)
+
+    def per_dept(self, month_key: Optional[str] = None,
+                 exclude_lsys: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        """{ lsys: {"hours", "pay"} }（按员工所在科室汇总）"""
+        idx = self._selected(month_key, exclude_lsys=exclude_lsys)
+        if len(idx) == 0:
+            return {}
+        labels = sorted({self.lsys_of.get(n, "") for n in self.names})
+        pos = {d: i for i, d in enumerate(labels)}
+        return self._group(labels, self._map_days([pos[self.lsys_of.get(n, "")] for n in self.names], by_date=False), idx)
+
+    def per_day(self, month_key: Optional[str] = None, names: Optional[Iterable[str]] = None,
+                lsys: Optional[str] = None, exclude_lsys: Optional[str] = None) -> List[Dict]:
+        """[{ name, date, hours, pay }]，按日期、姓名排序。"""
+        idx = self._selected(month_key, names, lsys, exclude_lsys)
+        out = [
+            {
+                "name": self.names[int(self.day_name[i])],
+                "date": self.dates[int(self.day_date[i])],
+                "hours": float(self.day_hours[i]),
+                "pay": float(self.day_pay[i]),
+            }
+            for i in idx
+        ]
+        out.sort(key=lambda x: (x["date"], x["name"]))
+        return out
+
+
+def compute_overtime_pay(rows: List[Dict], holiday_festival_map: Dict[str, str], zhibanfei: float,
+                         lsys_of: Optional[Dict[str, str]] = None) -> OvertimePayBook:
+    """
+    由原始加班记录（emp_name/name, timedate, hours/jbf）计算加班费明细。
+    记录过滤规则与 routers.statistics._aggregate_overtime_with_incentive 一致。
+    """
+    name_pos: Dict[str, int] = {}
+    date_pos: Dict[str, int] = {}
+    rec_name: List[int] = []
+    rec_date: List[int] = []
+    rec_hours: List[float] = []
+    for r in rows or []:
+        name = (r.get("emp_name") or r.get("name") or "").strip()
+        if not name:
+            continue
+        timedate = r.get("timedate")
+        if timedate is None:
+            continue
+        date_str = str(timedate)[:10]
+        if len(date_str) < 10:
+            continue
+        try:
+            hours = float(r.get("hours") if r.get("hours") is not None else r.get("jbf") or 0)
+        except (TypeError, ValueError):
+            hours = 0.0
+        if hours <= 0:
+            continue
+        rec_name.append(name_pos.setdefault(name, len(name_pos)))
+        rec_date.append(date_pos.setdefault(date_str, len(date_pos)))
+        rec_hours.append(hours)
+        if lsys_of is not None and name not in lsys_of:
+            lsys_of[name] = (r.get("lsys") or "").strip()
+
+    names = list(name_pos)
+    dates = list(date_pos)
+    incentive_date = [holiday_festival_map.get(d, "") in INCENTIVE_FESTIVALS for d in dates]
+
+    if HAS_NUMPY:
+        n_dates = max(1, len(dates))
+        key = np.asarray(rec_name, dtype=np.int64) * n_dates + np.asarray(rec_date, dtype=np.int64)
+        uniq, inverse = np.unique(key, return_inverse=True)
+        day_hours = np.bincount(inverse, weights=np.asarray(rec_hours, dtype=np.float64), minlength=len(uniq))
+        day_name = uniq // n_dates
+        day_date = uniq % n_dates
+        is_incentive = np.asarray(incentive_date, dtype=bool)[day_date] if dates else np.zeros(0, dtype=bool)
+        full_day = is_incentive & (day_hours >= INCENTIVE_MIN_HOURS)
+        day_pay = np.where(full_day, INCENTIVE_PAY, day_hours * zhibanfei)
+    else:
+        per_day: Dict[tuple, float] = defaultdict(float)
+        for n, d, h in zip(rec_name, rec_date, rec_hours):
+            per_day[(n, d)] += h
+        day_name = [k[0] for k in per_day]
+        day_date = [k[1] for k in per_day]
+        day_hours = list(per_day.values())
+        day_pay = [
+            INCENTIVE_PAY if incentive_date[d] and h >= INCENTIVE_MIN_HOURS else h * zhibanfei
+            for d, h in zip(day_date, day_hours)
+        ]
+    return OvertimePayBook(names, dates, day_name, day_date, day_hours, day_pay, lsys_of, zhibanfei)
+
+
+def _load_year_book(year: int) -> OvertimePayBook:
+    rows = db.execute_query(
+        """
+        SELECT jiaban.xm AS emp_name,
+               yggl.lsys,
+               jiaban.timedate,
+               CAST(COALESCE(jiaban.jbf, 0) AS DECIMAL(10,2)) AS hours
+        FROM jiaban
+        INNER JOIN yggl ON jiaban.xm = yggl.name
+        WHERE jiaban.jiabanzt = 4
+          AND (jiaban.hx IS NULL OR TRIM(jiaban.hx) != '是')
+          AND (jiaban.timedate LIKE %s OR YEAR(jiaban.timedate) = %s)
+          AND RIGHT(TRIM(yggl.name), 1) != '1'
+          AND RIGHT(TRIM(yggl.lsys), 1) != '1'
+          AND (COALESCE(yggl.zaizhi,0)=0)
+        """,
+        (f"{year}%", year),
+    )
+    return compute_overtime_pay(rows, load_holiday_festival_map(year), load_zhibanfei(), lsys_of={})
+
+
+def load_year_overtime_pay(year: int) -> OvertimePayBook:
+    """整年加班费明细（一次查询，按版本号缓存，供各加班费接口共享）。"""
+    return cached_call(
+        "overtime_pay_year_book",
+        {"year": int(year)},
+        (SCOPE_OVERTIME, SCOPE_STAFF, SCOPE_HOLIDAY, SCOPE_CONFIG),
+        lambda: _load_year_book(int(year)),
+    )
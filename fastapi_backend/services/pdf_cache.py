@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+制度预览 PDF 缓存 - 按源文件内容哈希（dept_policy.content_hash）存放转换结果
+- 文件为 data/policy_files/pdf_cache/{sha256}.pdf，内容相同的多次上传共用一份 PDF，无需按修改时间判断新旧
+- index.json 记录每个 PDF 的大小与最近访问时间，查找不扫描目录；总大小超过 PDF_CACHE_MAX_MB 时按最近最少使用淘汰
+- 多个 worker 共用同一目录：写索引时加文件锁并合并其他进程的修改；命中只更新内存中的访问时间，定期写回
+- stats() 返回命中/未命中/淘汰次数与占用字节，purge() 清空缓存
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+logger = logging.getLogger(__name__)
+
+_BASE_DIR = Path(__file__).resolve().parent.parent
+PDF_CACHE_DIR = _BASE_DIR / "data" / "policy_files" / "pdf_cache"
+
+# 命中时访问时间的写回间隔（秒）
+_TOUCH_FLUSH_SECONDS = 30
+_HASH_NAME = re.compile(r"^[0-9a-f]{64}\.pdf$")
+
+
+class PdfCache:
+    """内容寻址、按总字节数 LRU 淘汰的 PDF 缓存"""
+
+    def __init__(self, directory: Path = PDF_CACHE_DIR, max_bytes: int = 1 << 30):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._index_path = self.directory / "index.json"
+        self._lock_path = self.directory / ".lock"
+        self._lock = threading.RLock()
+        self._entries: Dict[str, List[float]] = {}  # hash -> [size, last_access]
+        self._touched: Dict[str, float] = {}
+        self._stamp = None
+        self._last_flush = time.time()
+        self.hits = self.misses = self.evictions = 0
+        if not self._index_path.exists():
+            with self._write():
+                pass  # 首次使用时由目录内容建立索引
+        self._reload_if_changed()
+
+    def path_for(self, content_hash: str) -> Path:
+        return self.directory / f"{content_hash}.pdf"
+
+    # ---- 索引持久化 ----
+
+    def _stat(self):
+        try:
+            st = self._index_path.stat()
+            return st.st_mtime_ns, st.st_size
+        except FileNotFoundError:
+            return None
+
+    def _load(self) -> Dict[str, List[float]]:
+        try:
+            with open(self._index_path, encoding="utf-8") as f:
+                return {h: list(v) for h, v in (json.load(f).get("entries") or {}).items()}
+        except FileNotFoundError:
+            return self._scan()
+        except (OSError, ValueError) as e:
+            logger.warning(f"PDF 缓存索引损坏，重新扫描目录: {e}")
+            return self._scan()
+
+    def _scan(self) -> Dict[str, List[float]]:
+        """由目录内容重建索引；旧版按文件名缓存的 PDF 无法对应内容哈希，直接删除"""
+        entries = {}
+        for p in self.directory.glob("*.pdf"):
+            if _HASH_NAME.match(p.name):
+                st = p.stat()
+                entries[p.stem] = [st.st_size, st.st_atime]
+            else:
+                try:
+                    p.unlink()
+                except OSError:
+                    pass
+        return entries
+
+    def _reload_if_changed(self) -> None:
+        stamp = self._stat()
+        if stamp is not None and stamp == self._stamp:
+            return
+        self._entries = self._load()
+        self._stamp = stamp
+
+    @contextmanager
+    def _write(self):
+        """跨进程写锁：加锁后重新读取索引并合并本进程的访问时间，退出时淘汰超限条目并写回"""
+        with self._lock:
+            lock_file = open(self._lock_path, "a+")
+            try:
+                if HAS_FCNTL:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                entries = self._load()
+                for h, ts in self._touched.items():
+                    if h in entries:
+                        entries[h][1] = max(entries[h][1], ts)
+                self._touched.clear()
+                yield entries
+                self._evict(entries)
+                tmp = self.directory / "index.json.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump({"entries": entries}, f)
+                os.replace(tmp, self._index_path)
+                self._entries = entries
+                self._stamp = self._stat()
+                self._last_flush = time.time()
+            finally:
+                if HAS_FCNTL:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                lock_file.close()
+
+    def _evict(self, entries: Dict[str, List[float]]) -> None:
+        total = sum(v[0] for v in entries.values())
+        if total <= self.max_bytes:
+            return
+        for h, (size, _) in sorted(entries.items(), key=lambda kv: kv[1][1]):
+            if total <= self.max_bytes:
+                break
+            self._remove_file(h)
+            del entries[h]
+            total -= size
+            self.evictions += 1
+
+    def _remove_file(self, content_hash: str) -> None:
+        try:
+            self.path_for(content_hash).unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"删除 PDF 缓存失败 {content_hash}: {e}")
+
+    # ---- 对外接口 ----
+
+    def lookup(self, content_hash: str) -> Optional[str]:
+        """命中返回 PDF 路径并记录访问时间，否则 None"""
+        path = self.path_for(content_hash)
+        with self._lock:
+            self._reload_if_changed()
+            if content_hash in self._entries and path.is_file():
+                self.hits += 1
+                self._touched[content_hash] = time.time()
+                flush = time.time() - self._last_flush > _TOUCH_FLUSH_SECONDS
+            else:
+                self.misses += 1
+                return None
+        if flush:
+            with self._write():
+                pass
+        return str(path)
+
+    def contains(self, content_hash: str) -> bool:
+        """是否已缓存（不计入命中统计）"""
+        with self._lock:
+            self._reload_if_changed()
+            return content_hash in self._entries and self.path_for(content_hash).is_file()
+
+    def record(self, content_hash: str) -> None:
+        """转换完成后登记 PDF，必要时淘汰最久未访问的条目"""
+        path = self.path_for(content_hash)
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            return
+        with self._write() as entries:
+            entries[content_hash] = [size, time.time()]
+
+    def convert(self, source_path: str, content_hash: str):
+        """加入转换池队列，完成后登记到缓存；返回 concurrent.futures.Future（结果为 PDF 路径或 None）"""
+        from services.office_convert import get_office_pool
+
+        def _done(fut):
+            if not fut.cancelled() and fut.result():
+                self.record(content_hash)
+
+        fut = get_office_pool().submit(source_path, str(self.path_for(content_hash)))
+        fut.add_done_callback(_done)
+        return fut
+
+    def discard(self, content_hash: str) -> None:
+        """删除某个内容哈希的 PDF（源文件已无制度引用时调用）"""
+        with self._write() as entries:
+            entries.pop(content_hash, None)
+            self._remove_file(content_hash)
+
+    def purge(self) -> dict:
+        """清空缓存，返回删除的文件数与字节数"""
+        with self._write() as entries:
+            removed, freed = len(entries), sum(v[0] for v in entries.values())
+            for h in list(entries):
+                self._remove_file(h)
+            entries.clear()
+        return {"removed": removed, "freedBytes": int(freed)}
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._reload_if_changed()
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": int(sum(v[0] for v in self._entries.values())),
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+_cache: Optional[PdfCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_pdf_cache() -> PdfCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            from config import settings
+            max_mb = int(getattr(settings, "PDF_CACHE_MAX_MB", 1024) or 1024)
+            _cache = PdfCache(PDF_CACHE_DIR, max_mb * 1024 * 1024)
+        return _cache
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+待审批推送 - 审批人订阅一次（SSE / WebSocket），待办变化时推送数量与新事项事件，替代轮询三个 pending 列表
+- 请假申请、加班登记、公出登记及各审批操作调用 publish_pending_change()，向 pending_events 表写入受影响审批人
+- 每个 worker 有一个后台轮询任务（仅在有订阅者时运行），按 id 增量读取 pending_events，
+  对本进程订阅者重新计数并推送；多 worker 下每个进程各自读取，因此任一进程写入都能送达
+- count_pending() 为一条带索引的 COUNT 查询，同时作为 /approval/pending-counts 的后备接口
+表结构见 scripts/create_pending_events.sql；进程内首次使用时自动补齐。
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+KIND_LEAVE = "leave"
+KIND_OVERTIME = "overtime"
+KIND_TRIP = "businessTrip"
+
+# 推送轮询间隔（秒）、事件保留时长（秒）
+POLL_INTERVAL = 1.0
+EVENT_RETENTION_SECONDS = 86400
+_CLEANUP_INTERVAL = 600
+
+_schema_ensured = False
+
+# 待办查询使用的索引：(表, 索引名, 列)
+_PENDING_INDEXES = (
+    ("qj", "idx_qj_pending_spr", "qjzt, spr"),
+    ("qj", "idx_qj_pending_spr2", "qjzt, spr2"),
+    ("jiaban", "idx_jiaban_pending_spr", "jiabanzt, spr"),
+    ("jiaban", "idx_jiaban_pending_spr2", "jiabanzt, spr2"),
+    ("gcsqb", "idx_gcsqb_pending_szr", "szr, bldzt, szrzt"),
+    ("gcsqb", "idx_gcsqb_pending_bld", "bld, bldzt, szrzt"),
+)
+
+
+def _ensure_schema_once() -> bool:
+    """确保 pending_events 表与待办索引存在，进程内只执行一次。"""
+    global _schema_ensured
+    if _schema_ensured:
+        return True
+    n = db.execute_update(
+        "CREATE TABLE IF NOT EXISTS pending_events ("
+        " id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,"
+        " approver VARCHAR(100) NOT NULL,"
+        " kind VARCHAR(32) NOT NULL,"
+        " item_id VARCHAR(64) NULL,"
+        " action VARCHAR(16) NULL,"
+        " created_at DATETIME DEFAULT CURRENT_TIMESTAMP,"
+        " INDEX idx_pending_events_created (created_at)"
+        ") DEFAULT CHARSET=utf8mb4",
+        (),
+    )
+    if n < 0:
+        logger.warning("创建 pending_events 失败，待办推送不生效，请手动执行 scripts/create_pending_events.sql")
+        return False
+    for table, index, cols in _PENDING_INDEXES:
+        rows = db.execute_query(
+            "SELECT 1 FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+            (table, index),
+        )
+        if not rows and db.execute_update(f"ALTER TABLE {table} ADD INDEX {index} ({cols})", ()) < 0:
+            logger.warning(f"创建索引 {table}.{index} 失败，待办计数将退化为全表扫描")
+    _schema_ensured = True
+    return True
+
+
+def count_pending(approver: str) -> Dict[str, int]:
+    """
+    某审批人的待办数量（与 /approval/pending/* 列表条件一致），一条查询：
+    { leave, overtime, businessTrip, total }
+    """
+    approver = (approver or "").strip()
+    out = {KIND_LEAVE: 0, KIND_OVERTIME: 0, KIND_TRIP: 0, "total": 0}
+    if not approver:
+        return out
+    _ensure_schema_once()
+    rows = db.execute_query(
+        """
+        SELECT
+          (SELECT COUNT(*) FROM qj WHERE qjzt = 1 AND spr = %s)
+            + (SELECT COUNT(*) FROM qj WHERE qjzt = 3 AND spr2 = %s) AS leave_cnt,
+          (SELECT COUNT(*) FROM jiaban WHERE jiabanzt IN (0, 1) AND spr = %s)
+            + (SELECT COUNT(*) FROM jiaban WHERE jiabanzt = 3 AND spr2 = %s)
+            + (SELECT COUNT(*) FROM jiaban WHERE jiabanzt = 5
+                 AND EXISTS (SELECT 1 FROM webconfig WHERE id = 1 AND TRIM(dakaman) = %s)) AS overtime_cnt,
+          (SELECT COUNT(*) FROM gcsqb WHERE szr = %s AND bldzt = 1 AND szrzt = 1)
+            + (SELECT COUNT(*) FROM gcsqb WHERE bld = %s AND bldzt = 1 AND szrzt = 2) AS trip_cnt
+        """,
+        (approver,) * 7,
+    )
+    if rows:
+        r = rows[0]
+        out[KIND_LEAVE] = int(r.get("leave_cnt") or 0)
+        out[KIND_OVERTIME] = int(r.get("overtime_cnt") or 0)
+        out[KIND_TRIP] = int(r.get("trip_cnt") or 0)
+        out["total"] = out[KIND_LEAVE] + out[KIND_OVERTIME] + out[KIND_TRIP]
+    return out
+
+
+def publish_pending_change(kind: str, approvers: Iterable[Optional[str]], item_id=None, action: str = "new") -> None:
+    """
+    待办变化后调用：为每个受影响的审批人写一条事件（一条 INSERT）。
+    action: new 新提交 / approve 通过 / reject 驳回。失败只记日志，不影响业务写操作。
+    """
+    names = sorted({(a or "").strip() for a in approvers if a and (a or "").strip()})
+    if not names or not _ensure_schema_once():
+        return
+    placeholders = ", ".join(["(%s, %s, %s, %s)"] * len(names))
+    params = []
+    for name in names:
+        params.extend((name, kind, str(item_id) if item_id is not None else None, action))
+    n = db.execute_update(
+        f"INSERT INTO pending_events (approver, kind, item_id, action) VALUES {placeholders}",
+        tuple(params),
+    )
+    if n < 0:
+        logger.warning(f"写入待办事件失败: {kind} {names}")
+
+
+class PendingHub:
+    """本进程的订阅者表与事件轮询任务。"""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._task: Optional[asyncio.Task] = None
+        self._last_id: Optional[int] = None
+        self._last_cleanup = 0.0
+
+    def subscriber_count(self) -> int:
+        return sum(len(qs) for qs in self._subscribers.values())
+
+    def subscribe(self, approver: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=100)
+        self._subscribers[approver].add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        return queue
+
+    def unsubscribe(self, approver: str, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(approver)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                self._subscribers.pop(approver, None)
+
+    @staticmethod
+    def _put(queue: asyncio.Queue, msg: dict) -> None:
+        try:
+            queue.put_nowait(msg)
+        except asyncio.QueueFull:
+            pass  # 客户端消费过慢时丢弃，后续 counts 消息会带上最新数量
+
+    def _fetch(self, approvers):
+        if not _ensure_schema_once():
+            return []
+        if self._last_id is None:
+            rows = db.execute_query("SELECT COALESCE(MAX(id), 0) AS max_id FROM pending_events")
+            self._last_id = int(rows[0]["max_id"]) if rows else 0
+            return []
+        # 先取游标上界，再读 (last_id, top] 内本进程订阅者的事件；其他审批人的事件随游标一并跳过
+        top = db.execute_query("SELECT COALESCE(MAX(id), 0) AS max_id FROM pending_events")
+        top_id = int(top[0]["max_id"]) if top else self._last_id
+        rows = []
+        if top_id > self._last_id:
+            placeholders = ", ".join(["%s"] * len(approvers))
+            rows = db.execute_query(
+                "SELECT id, approver, kind, item_id, action FROM pending_events "
+                f"WHERE id > %s AND id <= %s AND approver IN ({placeholders}) ORDER BY id",
+                (self._last_id, top_id) + tuple(approvers),
+            ) or []
+            self._last_id = top_id
+        now = time.time()
+        if now - self._last_cleanup > _CLEANUP_INTERVAL:
+            self._last_cleanup = now
+            db.execute_update(
+                "DELETE FROM pending_events WHERE created_at < NOW() - INTERVAL %s SECOND",
+                (EVENT_RETENTION_SECONDS,),
+            )
+        return rows
+
+    async def _run(self) -> None:
+        loop = asyncio.get_event_loop()
+        while self._subscribers:
+            try:
+                approvers = sorted(self._subscribers)
+                rows = await loop.run_in_executor(None, self._fetch, approvers)
+                by_approver = defaultdict(list)
+                for r in rows:
+                    by_approver[r["approver"]].append(r)
+                for approver, events in by_approver.items():
+                    queues = list(self._subscribers.get(approver, ()))
+                    if not queues:
+                        continue
+                    counts = await loop.run_in_executor(None, count_pending, approver)
+                    for q in queues:
+                        for e in events:
+                            self._put(q, {"type": "event", "kind": e["kind"], "id": e.get("item_id"),
+                                          "action": e.get("action")})
+                        self._put(q, {"type": "counts", **counts})
+            except Exception as e:
+                logger.warning(f"待办推送轮询异常: {e}")
+            await asyncio.sleep(POLL_INTERVAL)
+        self._last_id = None
+
+
+pending_hub = PendingHub()
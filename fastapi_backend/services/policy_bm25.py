@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+制度切片关键词索引 - 进程内 BM25 倒排索引，与向量检索按倒数排名融合（RRF）
+- 切片与 Chroma 中的切片完全一致（policy_vector._prepare_chunks），切片原文从 Chroma 读取，不另存文件
+- 分词：中文按字二元组（单字片段保留单字），字母数字按整词（含 3.2、GB-T 等条款编号）
+- 本进程 index_documents / remove_from_index 时增量更新；其他 worker 的变更通过索引版本号发现，
+  后台线程重建，重建期间继续使用旧索引
+- search() 有时间预算：超时停止累加剩余词项，返回已有结果
+"""
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+K1 = 1.5
+B = 0.75
+
+_CJK_RUN = re.compile(r"[㐀-䶿一-鿿豈-﫿]+")
+_WORD = re.compile(r"[a-z0-9]+(?:[.\-_][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """中文字二元组 + 字母数字整词"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    tokens = []
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    tokens.extend(_WORD.findall(text))
+    return tokens
+
+
+class BM25Index:
+    """切片级 BM25 倒排索引（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._docs: Dict[str, Tuple[str, int, str]] = {}   # chunk_id -> (policy_id, 长度, 原文)
+        self._by_policy: Dict[str, List[str]] = defaultdict(list)
+        self._total_len = 0
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _add(self, chunk_id: str, policy_id: str, text: str) -> None:
+        tf = Counter(tokenize(text))
+        length = sum(tf.values())
+        self._docs[chunk_id] = (policy_id, length, text)
+        self._by_policy[policy_id].append(chunk_id)
+        self._total_len += length
+        for term, n in tf.items():
+            self._postings[term][chunk_id] = n
+
+    def _remove_policy(self, policy_id: str) -> None:
+        for chunk_id in self._by_policy.pop(policy_id, []):
+            doc = self._docs.pop(chunk_id, None)
+            if not doc:
+                continue
+            self._total_len -= doc[1]
+            for term in set(tokenize(doc[2])):
+                posting = self._postings.get(term)
+                if posting is not None:
+                    posting.pop(chunk_id, None)
+                    if not posting:
+                        del self._postings[term]
+
+    def replace_policy(self, policy_id: str, chunks: Iterable[Tuple[str, str]]) -> None:
+        """用 [(chunk_id, 原文)] 替换某制度的全部切片"""
+        with self._lock:
+            self._remove_policy(policy_id)
+            for chunk_id, text in chunks:
+                self._add(chunk_id, policy_id, text)
+
+    def remove_policy(self, policy_id: str) -> None:
+        with self._lock:
+            self._remove_policy(policy_id)
+
+    def search(self, query: str, top_n: int = 60, budget_ms: Optional[float] = None) -> List[Tuple[str, str, float, str]]:
+        """返回 [(chunk_id, policy_id, score, 原文)]，按分数降序"""
+        return self.search_with_status(query, top_n, budget_ms)[0]
+
+    def search_with_status(self, query: str, top_n: int = 60,
+                           budget_ms: Optional[float] = None) -> Tuple[List[Tuple[str, str, float, str]], bool]:
+        """同 search，另返回是否处理完全部词项（预算耗尽提前结束时为 False，结果不宜缓存）"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return [], True
+        deadline = time.perf_counter() + budget_ms / 1000.0 if budget_ms else None
+        scores: Dict[str, float] = defaultdict(float)
+        complete = True
+        with self._lock:
+            n_docs = len(self._docs)
+            if not n_docs:
+                return [], True
+            avg_len = self._total_len / n_docs or 1.0
+            # 先处理区分度高（文档频率低）的词项，预算耗尽时丢弃的是最常见的词
+            terms.sort(key=lambda t: len(self._postings.get(t, ())))
+            for i, term in enumerate(terms):
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                for chunk_id, tf in posting.items():
+                    length = self._docs[chunk_id][1]
+                    scores[chunk_id] += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / avg_len))
+                if deadline and time.perf_counter() > deadline:
+                    complete = i == len(terms) - 1
+                    if not complete:
+                        logger.debug(f"关键词检索超出预算 {budget_ms}ms，已处理部分词项")
+                    break
+            ranked = sorted(scores.items(), key=lambda x: -x[1])[:top_n]
+            return [(cid, self._docs[cid][0], sc, self._docs[cid][2]) for cid, sc in ranked], complete
+
+
+_index: Optional[BM25Index] = None
+_index_version = None
+_build_lock = threading.Lock()
+_building = False
+
+
+def _build(coll) -> BM25Index:
+    idx = BM25Index()
+    data = coll.get(include=["documents", "metadatas"]) or {}
+    grouped: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+    for cid, doc, meta in zip(data.get("ids") or [], data.get("documents") or [], data.get("metadatas") or []):
+        policy_id = (meta or {}).get("policy_id")
+        if policy_id and doc:
+            grouped[policy_id].append((cid, doc))
+    for policy_id, chunks in grouped.items():
+        idx.replace_policy(policy_id, chunks)
+    return idx
+
+
+def _rebuild(coll, version) -> None:
+    global _index, _index_version, _building
+    try:
+        start = time.time()
+        built = _build(coll)
+        with _build_lock:
+            _index, _index_version = built, version
+        logger.info(f"关键词索引已重建: {len(built)} 个切片，耗时 {time.time() - start:.2f}s")
+    except Exception as e:
+        logger.warning(f"关键词索引重建失败: {e}")
+    finally:
+        with _build_lock:
+            _building = False
+
+
+def get_index(coll, version) -> Optional[BM25Index]:
+    """
+    当前关键词索引。版本号变化时在后台线程重建并先返回旧索引；
+    尚未建立时同样后台建立并返回 None（本次检索仅用向量结果）。
+    """
+    global _building
+    with _build_lock:
+        current, current_version = _index, _index_version
+        stale = current is None or (version is not None and version != current_version)
+        start = stale and not _building
+        if start:
+            _building = True
+    if start:
+        threading.Thread(target=_rebuild, args=(coll, version), name="policy-bm25", daemon=True).start()
+    return current
+
+
+def build_now(coll, version=None) -> BM25Index:
+    """同步建立索引（预热、压测脚本用）"""
+    global _index, _index_version
+    built = _build(coll)
+    with _build_lock:
+        _index, _index_version = built, version
+    return built
+
+
+def on_policy_indexed(policy_id: str, chunks: Iterable[Tuple[str, str]]) -> None:
+    """本进程写入 Chroma 后同步更新关键词索引（索引尚未建立时忽略，建立时会从 Chroma 读取）"""
+    idx = _index
+    if idx is not None:
+        idx.replace_policy(policy_id, chunks)
+
+
+def on_policy_removed(policy_id: str) -> None:
+    idx = _index
+    if idx is not None:
+        idx.remove_policy(policy_id)
+
+
+def rrf_fuse(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """倒数排名融合：每个排名列表中第 r 名（从 1 起）贡献 1/(k+r)"""
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for r, key in enumerate(ranking, start=1):
+            scores[key] += 1.0 / (k + r)
+    return sorted(scores.items(), key=lambda x: -x[1])
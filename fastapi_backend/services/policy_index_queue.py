@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+制度向量入库队列 - 上传与回填只写入 policy_index_queue，由专用后台线程批量入库
+- 每个制度一行（policy_id 主键），重复入队重置为 pending；服务重启后未完成的任务仍在表中
+- 工作线程以 claim_token 原子认领一批任务（多 worker 进程同时运行不会重复处理），
+  多个制度的切片合并编码（policy_vector.index_documents），失败按指数退避重试，超过次数标记 failed
+- 运行中超过 STALE_SECONDS 未完成的任务（进程崩溃）会被重新认领
+- 入库在独立线程执行，不占用处理请求的默认线程池
+表结构见 scripts/create_policy_index_queue.sql；进程内首次使用时自动创建。
+"""
+import logging
+import threading
+import uuid
+from typing import Dict, Iterable, List, Optional
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+# 空闲时轮询间隔（秒），用于发现其他进程或回填脚本写入的任务
+POLL_SECONDS = 5
+# 运行中任务超过该秒数视为进程已崩溃，可重新认领
+STALE_SECONDS = 600
+# 重试退避上限（秒）
+MAX_BACKOFF_SECONDS = 3600
+
+_schema_ensured = False
+_wake = threading.Event()
+_worker: Optional[threading.Thread] = None
+_worker_lock = threading.Lock()
+
+
+def _ensure_schema_once() -> bool:
+    """确保 policy_index_queue 表存在，进程内只执行一次。"""
+    global _schema_ensured
+    if _schema_ensured:
+        return True
+    n = db.execute_update(
+        "CREATE TABLE IF NOT EXISTS policy_index_queue ("
+        " policy_id VARCHAR(36) NOT NULL PRIMARY KEY,"
+        " status VARCHAR(16) NOT NULL DEFAULT 'pending',"
+        " attempts INT NOT NULL DEFAULT 0,"
+        " last_error VARCHAR(512) NULL,"
+        " claim_token CHAR(32) NULL,"
+        " next_run_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,"
+        " created_at DATETIME DEFAULT CURRENT_TIMESTAMP,"
+        " updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,"
+        " INDEX idx_policy_index_queue_due (status, next_run_at),"
+        " INDEX idx_policy_index_queue_claim (claim_token)"
+        ") DEFAULT CHARSET=utf8mb4",
+        (),
+    )
+    if n < 0:
+        logger.warning("创建 policy_index_queue 失败，请手动执行 scripts/create_policy_index_queue.sql")
+        return False
+    _schema_ensured = True
+    return True
+
+
+def enqueue(policy_ids: Iterable[str]) -> int:
+    """制度入队（已在队列中的重置为 pending 并清零重试次数），返回入队条数；失败返回 -1"""
+    ids = sorted({(pid or "").strip() for pid in policy_ids if (pid or "").strip()})
+    if not ids:
+        return 0
+    if not _ensure_schema_once():
+        return -1
+    for start in range(0, len(ids), 500):
+        part = ids[start:start + 500]
+        placeholders = ", ".join(["(%s)"] * len(part))
+        n = db.execute_update(
+            f"INSERT INTO policy_index_queue (policy_id) VALUES {placeholders} "
+            "ON DUPLICATE KEY UPDATE status = 'pending', attempts = 0, last_error = NULL, "
+            "claim_token = NULL, next_run_at = CURRENT_TIMESTAMP",
+            tuple(part),
+        )
+        if n < 0:
+            logger.warning(f"制度入库任务入队失败: {len(part)} 条")
+            return -1
+    _wake.set()
+    return len(ids)
+
+
+def dequeue(policy_id: str) -> None:
+    """删除制度时调用：移除其入库任务"""
+    if _ensure_schema_once():
+        db.execute_update("DELETE FROM policy_index_queue WHERE policy_id = %s", (policy_id,))
+
+
+def get_status(policy_ids: Optional[List[str]] = None) -> dict:
+    """
+    入库状态：传 policy_ids 时返回各制度 {status, attempts, lastError, updatedAt}，
+    否则返回各状态的数量汇总。
+    """
+    if not _ensure_schema_once():
+        return {}
+    if policy_ids:
+        placeholders = ", ".join(["%s"] * len(policy_ids))
+        rows = db.execute_query(
+            f"SELECT policy_id, status, attempts, last_error, updated_at FROM policy_index_queue "
+            f"WHERE policy_id IN ({placeholders})",
+            tuple(policy_ids),
+        ) or []
+        return {
+            r["policy_id"]: {
+                "status": r.get("status"),
+                "attempts": int(r.get("attempts") or 0),
+                "lastError": r.get("last_error"),
+                "updatedAt": str(r.get("updated_at") or "")[:19],
+            }
+            for r in rows
+        }
+    rows = db.execute_query("SELECT status, COUNT(*) AS n FROM policy_index_queue GROUP BY status") or []
+    out = {STATUS_PENDING: 0, STATUS_RUNNING: 0, STATUS_DONE: 0, STATUS_FAILED: 0}
+    for r in rows:
+        out[r["status"]] = int(r.get("n") or 0)
+    return out
+
+
+def next_due_seconds() -> Optional[float]:
+    """
+    距最早一个任务可被认领还有多少秒（已到期为 0）：pending 按 next_run_at，
+    running 按超过 STALE_SECONDS 后可重新认领计算。没有 pending/running 任务时返回 None。
+    """
+    if not _ensure_schema_once():
+        return None
+    rows = db.execute_query(
+        "SELECT TIMESTAMPDIFF(SECOND, NOW(), MIN(IF(status = 'pending', next_run_at, "
+        "updated_at + INTERVAL %s SECOND))) AS due_in "
+        "FROM policy_index_queue WHERE status IN ('pending', 'running')",
+        (STALE_SECONDS,),
+    ) or []
+    if not rows or rows[0].get("due_in") is None:
+        return None
+    return max(0.0, float(rows[0]["due_in"]))
+
+
+def _claim(batch_size: int) -> List[dict]:
+    token = uuid.uuid4().hex
+    n = db.execute_update(
+        "UPDATE policy_index_queue SET status = 'running', claim_token = %s, attempts = attempts + 1 "
+        "WHERE (status = 'pending' AND next_run_at <= NOW()) "
+        "OR (status = 'running' AND updated_at < NOW() - INTERVAL %s SECOND) "
+        "ORDER BY next_run_at LIMIT %s",
+        (token, STALE_SECONDS, batch_size),
+    )
+    if n <= 0:
+        return []
+    rows = db.execute_query(
+        "SELECT q.policy_id, q.attempts, q.claim_token, p.id AS pid, p.title, p.issue_time, p.remark, "
+        "p.file_path, p.file_type FROM policy_index_queue q LEFT JOIN dept_policy p ON p.id = q.policy_id "
+        "WHERE q.claim_token = %s",
+        (token,),
+    ) or []
+    gone = [r["policy_id"] for r in rows if r.get("pid") is None]
+    if gone:
+        # 制度已删除
+        placeholders = ", ".join(["%s"] * len(gone))
+        db.execute_update(
+            f"DELETE FROM policy_index_queue WHERE claim_token = %s AND policy_id IN ({placeholders})",
+            (token,) + tuple(gone),
+        )
+    return [r for r in rows if r.get("pid") is not None]
+
+
+def _finish(claimed: List[dict], results: Dict[str, Optional[str]], max_attempts: int) -> None:
+    token = claimed[0]["claim_token"]
+    done = [r["policy_id"] for r in claimed if results.get(r["policy_id"], "未处理") is None]
+    if done:
+        placeholders = ", ".join(["%s"] * len(done))
+        db.execute_update(
+            "UPDATE policy_index_queue SET status = 'done', last_error = NULL, claim_token = NULL "
+            f"WHERE claim_token = %s AND policy_id IN ({placeholders})",
+            (token,) + tuple(done),
+        )
+    for r in claimed:
+        err = results.get(r["policy_id"], "未处理")
+        if err is None:
+            continue
+        db.execute_update(
+            "UPDATE policy_index_queue SET status = IF(attempts >= %s, 'failed', 'pending'), "
+            "last_error = %s, claim_token = NULL, "
+            "next_run_at = NOW() + INTERVAL LEAST(%s, 30 * POW(2, attempts)) SECOND "
+            "WHERE claim_token = %s AND policy_id = %s",
+            (max_attempts, str(err)[:500], MAX_BACKOFF_SECONDS, token, r["policy_id"]),
+        )
+        logger.warning(f"制度入库失败（第 {r['attempts']} 次）{r['policy_id']}: {err}")
+
+
+def process_once(batch_size: Optional[int] = None) -> int:
+    """认领并处理一批任务，返回处理条数（0 表示当前无到期任务）"""
+    from config import settings
+    from services.policy_vector import index_documents
+
+    if not _ensure_schema_once():
+        return 0
+    batch_size = batch_size or max(1, int(settings.POLICY_INDEX_BATCH_SIZE))
+    claimed = _claim(batch_size)
+    if not claimed:
+        return 0
+    docs = [
+        {
+            "policy_id": r["policy_id"],
+            "title": (r.get("title") or "").strip(),
+            "issue_time": (r.get("issue_time") or "").strip(),
+            "remark": (r.get("remark") or "").strip(),
+            "file_path": (r.get("file_path") or "").strip(),
+            "file_type": (r.get("file_type") or "").strip().lower(),
+        }
+        for r in claimed
+    ]
+    try:
+        results = index_documents(docs)
+    except Exception as e:
+        results = {d["policy_id"]: str(e) for d in docs}
+    _finish(claimed, results, max(1, int(settings.POLICY_INDEX_MAX_ATTEMPTS)))
+    return len(claimed)
+
+
+def _run() -> None:
+    while True:
+        try:
+            if process_once():
+                continue
+        except Exception as e:
+            logger.warning(f"制度入库队列处理异常: {e}")
+        _wake.wait(POLL_SECONDS)
+        _wake.clear()
+
+
+def start_worker() -> None:
+    """启动本进程的入库线程（重复调用无副作用）"""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name="policy-index", daemon=True)
+            _worker.start()
+
+
+def wake_worker() -> None:
+    _wake.set()
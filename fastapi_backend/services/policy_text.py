@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+制度正文存储 - 上传/入库时提取一次 PDF/Word/Excel 正文，按文件内容哈希存入 dept_policy_text
+- dept_policy.content_hash 指向正文记录，内容相同的文件共用一条
+- page_offsets 为各页（PDF 页 / Excel 工作表）在正文中的起始偏移，JSON 数组
+- 向量入库、检索摘要、关键词搜索均读取存储的正文，检索请求路径上不再解析文档
+表结构见 scripts/create_dept_policy_text.sql；进程内首次使用时自动补齐。
+"""
+import hashlib
+import json
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# 与 extract_text_from_file 一致的正文长度上限
+MAX_TEXT_CHARS = 50000
+
+_schema_ensured = False
+
+
+def ensure_text_store_once() -> bool:
+    """确保 dept_policy_text 表与 dept_policy.content_hash 列存在，进程内只执行一次。"""
+    global _schema_ensured
+    if _schema_ensured:
+        return True
+    n = db.execute_update(
+        "CREATE TABLE IF NOT EXISTS dept_policy_text ("
+        " content_hash CHAR(64) NOT NULL PRIMARY KEY,"
+        " file_type VARCHAR(32) NULL,"
+        " text MEDIUMTEXT NULL,"
+        " page_offsets TEXT NULL,"
+        " created_at DATETIME DEFAULT CURRENT_TIMESTAMP"
+        ") DEFAULT CHARSET=utf8mb4",
+        (),
+    )
+    if n < 0:
+        logger.warning("创建 dept_policy_text 失败，请手动执行 scripts/create_dept_policy_text.sql")
+        return False
+    rows = db.execute_query(
+        "SELECT 1 FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'dept_policy' AND COLUMN_NAME = 'content_hash'"
+    )
+    if not rows:
+        if db.execute_update("ALTER TABLE dept_policy ADD COLUMN content_hash CHAR(64) NULL", ()) < 0:
+            logger.warning("dept_policy 增加 content_hash 列失败，请手动执行 scripts/create_dept_policy_text.sql")
+            return False
+        db.execute_update("ALTER TABLE dept_policy ADD INDEX idx_dept_policy_content_hash (content_hash)", ())
+    _schema_ensured = True
+    return True
+
+
+def file_content_hash(path: str) -> Optional[str]:
+    """文件内容 SHA-256，读取失败返回 None"""
+    h = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    except OSError as e:
+        logger.warning(f"读取文件失败 {path}: {e}")
+        return None
+    return h.hexdigest()
+
+
+def _join_pages(pages: List[str]):
+    """与 extract_text_from_file 相同的拼接与截断，同时返回各页起始偏移"""
+    raw = "\n".join(pages)
+    lead = len(raw) - len(raw.lstrip())
+    text = raw.strip()[:MAX_TEXT_CHARS]
+    offsets, pos = [], 0
+    for p in pages:
+        o = max(0, pos - lead)
+        if o < len(text) or not offsets:
+            offsets.append(o)
+        pos += len(p) + 1
+    return text, offsets
+
+
+def store_policy_text(policy_id: str, full_path: str, file_type: str) -> Optional[dict]:
+    """
+    提取并保存某制度的正文（同一内容哈希只提取一次），更新 dept_policy.content_hash。
+    返回 {"hash", "text", "pages"}，文件不可读时返回 None。
+    """
+    from services.policy_vector import extract_pages
+
+    content_hash = file_content_hash(full_path)
+    if not content_hash:
+        return None
+    if not ensure_text_store_once():
+        text, offsets = _join_pages(extract_pages(full_path, file_type))
+        return {"hash": content_hash, "text": text, "pages": offsets}
+    rows = db.execute_query(
+        "SELECT text, page_offsets FROM dept_policy_text WHERE content_hash = %s LIMIT 1", (content_hash,)
+    )
+    if rows:
+        text, offsets = rows[0].get("text") or "", _load_offsets(rows[0].get("page_offsets"))
+    else:
+        text, offsets = _join_pages(extract_pages(full_path, file_type))
+        db.execute_update(
+            "INSERT IGNORE INTO dept_policy_text (content_hash, file_type, text, page_offsets) VALUES (%s, %s, %s, %s)",
+            (content_hash, (file_type or "").lower(), text, json.dumps(offsets)),
+        )
+    db.execute_update("UPDATE dept_policy SET content_hash = %s WHERE id = %s", (content_hash, policy_id))
+    return {"hash": content_hash, "text": text, "pages": offsets}
+
+
+def _load_offsets(raw) -> List[int]:
+    try:
+        return [int(o) for o in json.loads(raw or "[]")]
+    except (TypeError, ValueError):
+        return []
+
+
+def get_policy_text(policy_id: str, full_path: Optional[str] = None, file_type: Optional[str] = None) -> Optional[dict]:
+    """读取已存储的正文；尚未存储且给出文件路径时提取并保存"""
+    if ensure_text_store_once():
+        rows = db.execute_query(
+            "SELECT t.content_hash, t.text, t.page_offsets FROM dept_policy p "
+            "JOIN dept_policy_text t ON t.content_hash = p.content_hash WHERE p.id = %s LIMIT 1",
+            (policy_id,),
+        )
+        if rows:
+            r = rows[0]
+            return {"hash": r["content_hash"], "text": r.get("text") or "", "pages": _load_offsets(r.get("page_offsets"))}
+    if full_path:
+        return store_policy_text(policy_id, full_path, file_type)
+    return None
+
+
+def get_snippets(policy_ids: Iterable[str], length: int = 200) -> Dict[str, str]:
+    """批量读取各制度正文开头作为摘要（一次查询），未存储正文的制度不在结果中"""
+    ids = [pid for pid in policy_ids if pid]
+    if not ids or not ensure_text_store_once():
+        return {}
+    placeholders = ", ".join(["%s"] * len(ids))
+    rows = db.execute_query(
+        f"SELECT p.id, LEFT(t.text, %s) AS head, CHAR_LENGTH(t.text) > %s AS more FROM dept_policy p "
+        f"JOIN dept_policy_text t ON t.content_hash = p.content_hash WHERE p.id IN ({placeholders})",
+        (length, length) + tuple(ids),
+    ) or []
+    out = {}
+    for r in rows:
+        head = (r.get("head") or "").strip()
+        if head:
+            out[str(r["id"]).strip()] = head + "…" if r.get("more") else head
+    return out
+
+
+def page_of(offsets: List[int], pos: int) -> int:
+    """正文偏移所在页号（从 1 开始）"""
+    page = 1
+    for i, o in enumerate(offsets):
+        if o <= pos:
+            page = i + 1
+        else:
+            break
+    return page
+
+
+def release_policy_text(policy_id: str) -> None:
+    """删除制度前调用：正文不再被其他制度引用时一并删除"""
+    if not ensure_text_store_once():
+        return
+    db.execute_update(
+        "DELETE t FROM dept_policy_text t JOIN dept_policy p ON p.content_hash = t.content_hash "
+        "WHERE p.id = %s AND NOT EXISTS (SELECT 1 FROM (SELECT content_hash FROM dept_policy WHERE id != %s) o "
+        "WHERE o.content_hash = t.content_hash)",
+        (policy_id, policy_id),
+    )
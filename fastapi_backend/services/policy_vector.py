@@ -1,10 +1,25 @@
 # -*- coding: utf-8 -*-
 """
-部门制度向量检索服务 - bge-small-zh-v1.5 + Chroma
+部门制度向量检索服务 - bge-small-zh-v1.5 + Chroma / NumPy 向量存储（VECTOR_STORE_BACKEND）
+- 启动时可预热模型与集合（EMBEDDING_WARMUP），避免首个检索用户等待模型加载
+- 查询向量经 _EncodeBatcher 合批：并发检索在 EMBEDDING_BATCH_WINDOW_MS 窗口内合并为一次 model.encode
+- 增量入库：切片 ID 为 (模型, 切片原文) 的哈希，只编码新增/变化的切片，删除孤立切片
+- 混合检索：向量结果与 BM25 关键词结果（services/policy_bm25）按倒数排名融合
+- 配置 VECTOR_SIDECAR_URL 时，检索/入库/删除转发到 services/vector_sidecar 进程，本进程不加载模型与向量库
+- 检索缓存：规范化查询 → 向量（LRU），(查询, top_k, 索引版本) → 结果（LRU）。
+  add_to_index / remove_from_index 递增索引版本（stats_cache 的 policy_index 范围），其他 worker 最多
+  INDEX_VERSION_CHECK_SECONDS 秒后发现；版本号读取失败时结果缓存不生效
 """
 import os
+import hashlib
+import queue
+import threading
+import time
 import logging
-from typing import Optional, List, Tuple
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, Optional, List, Tuple
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
@@ -14,8 +29,26 @@ CHROMA_DIR = _BASE_DIR / "data" / "policy_chroma"
 COLLECTION_NAME = "dept_policy_cos"  # 使用余弦距离，需重新回填
 
 _model = None
-_chroma_client = None
 _collection = None
+_in_process = False  # sidecar 进程内置为 True，不再转发
+
+
+def run_in_process() -> None:
+    """sidecar 进程启动时调用：本进程直接持有模型与向量库"""
+    global _in_process
+    _in_process = True
+
+
+def _sidecar():
+    """配置了 VECTOR_SIDECAR_URL 且本进程不是 sidecar 时返回客户端，否则 None"""
+    if _in_process:
+        return None
+    from config import settings
+    url = str(getattr(settings, "VECTOR_SIDECAR_URL", "") or "").strip()
+    if not url:
+        return None
+    from services.vector_sidecar import get_client
+    return get_client(url)
 
 
 def _get_model_path():
@@ -28,11 +61,39 @@ def _get_model_path():
     return "BAAI/bge-small-zh-v1.5"
 
 
+def _get_onnx_dir() -> str:
+    """ONNX 模型目录：EMBEDDING_ONNX_PATH，未配置时为 <EMBEDDING_MODEL_PATH>-onnx"""
+    from config import settings
+    path = str(getattr(settings, "EMBEDDING_ONNX_PATH", "") or "").strip()
+    if path:
+        return path
+    return _get_model_path().rstrip("/\\") + "-onnx"
+
+
+def _use_onnx() -> bool:
+    from config import settings
+    return str(getattr(settings, "EMBEDDING_BACKEND", "torch") or "torch").strip().lower() == "onnx"
+
+
 def _get_model():
-    """懒加载 embedding 模型"""
+    """懒加载 embedding 模型：EMBEDDING_BACKEND=onnx 时用 ONNX Runtime（失败退回 sentence_transformers）"""
     global _model
     if _model is not None:
         return _model
+    if _use_onnx():
+        try:
+            from config import settings
+            from services.onnx_encoder import OnnxEncoder
+            path = _get_onnx_dir()
+            logger.info(f"加载 ONNX 向量模型: {path}")
+            _model = OnnxEncoder(
+                path,
+                quantized=bool(getattr(settings, "EMBEDDING_ONNX_QUANTIZED", True)),
+                threads=int(getattr(settings, "EMBEDDING_ONNX_THREADS", 0) or 0),
+            )
+            return _model
+        except Exception as e:
+            logger.warning(f"加载 ONNX 向量模型失败，改用 sentence_transformers: {e}")
     try:
         from sentence_transformers import SentenceTransformer
         path = _get_model_path()
@@ -44,42 +105,229 @@ def _get_model():
         raise
 
 
+class _EncodeBatcher:
+    """
+    查询编码合批：submit() 返回 Future，后台线程取到第一个请求后在窗口内继续收集，
+    最多 max_batch 条合为一次 encode，结果按顺序回填各 Future。
+    """
+
+    def __init__(self):
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+
+    def _ensure_thread(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="policy-encode", daemon=True)
+                self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        fut: Future = Future()
+        self._ensure_thread()
+        self._queue.put((text, fut))
+        return fut
+
+    def _run(self) -> None:
+        from config import settings
+        while True:
+            window = max(0.0, float(getattr(settings, "EMBEDDING_BATCH_WINDOW_MS", 5) or 0)) / 1000.0
+            max_batch = max(1, int(getattr(settings, "EMBEDDING_MAX_BATCH", 32) or 1))
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + window
+            while len(batch) < max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                emb = _get_model().encode([t for t, _ in batch], normalize_embeddings=True)
+                for i, (_, fut) in enumerate(batch):
+                    fut.set_result(emb[i])
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+            self.batches += 1
+            self.items += len(batch)
+
+
+_batcher = _EncodeBatcher()
+
+
+def encode_query(text: str, timeout: float = 30.0):
+    """编码单条查询（经合批线程），返回归一化向量"""
+    return _batcher.submit(text).result(timeout=timeout)
+
+
+def encoder_stats() -> dict:
+    """合批统计：批次数、条数、平均批大小"""
+    b, n = _batcher.batches, _batcher.items
+    return {"batches": b, "items": n, "avgBatchSize": round(n / b, 2) if b else 0}
+
+
+# 结果缓存检查索引版本的最小间隔（秒）
+INDEX_VERSION_CHECK_SECONDS = 5
+
+
+class _LRU:
+    """带命中计数的线程安全 LRU"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[object, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            h, m = self.hits, self.misses
+            return {"size": len(self._data), "hits": h, "misses": m, "hitRate": round(h / (h + m), 4) if (h + m) else 0.0}
+
+
+_embedding_cache = _LRU(1024)
+_result_cache = _LRU(512)
+_version_lock = threading.Lock()
+_local_generation = 0          # 本进程索引变更次数，变更后立即生效
+_remote_version: Optional[int] = None
+_remote_checked_at = 0.0
+
+
+def normalize_query(query: str) -> str:
+    """全角转半角、合并空白、英文小写，作为缓存键"""
+    return " ".join(unicodedata.normalize("NFKC", query or "").split()).lower()
+
+
+def _index_version() -> Optional[Tuple[int, int]]:
+    """(本进程变更次数, 共享版本号)；共享版本号读取失败返回 None"""
+    global _remote_version, _remote_checked_at
+    from utils.stats_cache import get_stats_version, SCOPE_POLICY_INDEX
+    now = time.time()
+    with _version_lock:
+        due = _remote_version is None or now - _remote_checked_at >= INDEX_VERSION_CHECK_SECONDS
+    if due:
+        remote = get_stats_version(SCOPE_POLICY_INDEX)
+        with _version_lock:
+            _remote_version, _remote_checked_at = remote, now
+    with _version_lock:
+        if _remote_version is None:
+            return None
+        return _local_generation, _remote_version
+
+
+def _bump_index_version() -> None:
+    """索引变更后调用：本进程结果缓存立即失效，并通知其他 worker"""
+    global _local_generation
+    from utils.stats_cache import bump_stats_version, SCOPE_POLICY_INDEX
+    with _version_lock:
+        _local_generation += 1
+    _result_cache.clear()
+    bump_stats_version(SCOPE_POLICY_INDEX)
+
+
+def _cached_query_embedding(norm_query: str):
+    emb = _embedding_cache.get(norm_query)
+    if emb is None:
+        emb = encode_query(norm_query)
+        _embedding_cache.put(norm_query, emb)
+    return emb
+
+
+def search_cache_stats() -> dict:
+    """检索缓存与合批统计（当前 worker 进程；使用 sidecar 时为 sidecar 进程）"""
+    client = _sidecar()
+    if client is not None:
+        return client.call("stats")
+    return {
+        "pid": os.getpid(),
+        "embedding": _embedding_cache.stats(),
+        "result": _result_cache.stats(),
+        "encoder": encoder_stats(),
+    }
+
+
+def warm_up() -> bool:
+    """预加载模型、Chroma 集合与关键词索引并做一次编码，供启动时调用；失败只记日志"""
+    client = _sidecar()
+    if client is not None:
+        try:
+            return bool(client.call("warmup", write=True))
+        except Exception as e:
+            logger.warning(f"向量 sidecar 预热失败: {e}")
+            return False
+    try:
+        start = time.time()
+        coll = _get_collection()
+        _get_model().encode(["预热"], normalize_embeddings=True)
+        from services import policy_bm25
+        version = _index_version()
+        policy_bm25.build_now(coll, version[1] if version else None)
+        logger.info(f"向量模型预热完成，耗时 {time.time() - start:.1f}s")
+        return True
+    except Exception as e:
+        logger.warning(f"向量模型预热失败，首次检索时再加载: {e}")
+        return False
+
+
 def _get_collection():
-    """获取 Chroma 集合（使用余弦距离，便于相关性分数直观 0-100%）"""
-    global _chroma_client, _collection
+    """获取向量集合：按 VECTOR_STORE_BACKEND 打开 Chroma 或 NumPy 存储（services/vector_store）"""
+    global _collection
     if _collection is not None:
         return _collection
     try:
-        import chromadb
-        CHROMA_DIR.mkdir(parents=True, exist_ok=True)
-        _chroma_client = chromadb.PersistentClient(path=str(CHROMA_DIR))
-        _collection = _chroma_client.get_or_create_collection(
-            name=COLLECTION_NAME,
-            metadata={"hnsw:space": "cosine", "description": "部门制度向量库"}
-        )
+        from config import settings
+        from services.vector_store import open_collection
+        _collection = open_collection(getattr(settings, "VECTOR_STORE_BACKEND", "chroma"), CHROMA_DIR, COLLECTION_NAME)
         return _collection
     except Exception as e:
-        logger.error(f"Chroma 初始化失败: {e}")
+        logger.error(f"向量库初始化失败: {e}")
         raise
 
 
-def extract_text_from_file(file_path: str, file_type: str) -> str:
-    """从 PDF/Word/Excel 提取正文文本"""
+def extract_pages(file_path: str, file_type: str) -> List[str]:
+    """从 PDF/Word/Excel 按页提取正文：PDF 每页一项，Excel 每个非空工作表一项，Word 整篇一项"""
     path = Path(file_path)
     if not path.is_file():
-        return ""
+        return []
     ft = (file_type or "").lower()
-    text_parts = []
+    pages = []
     try:
         if ft == "pdf":
             import fitz  # PyMuPDF
             doc = fitz.open(str(path))
             for page in doc:
-                text_parts.append(page.get_text())
+                pages.append(page.get_text())
             doc.close()
         elif ft in ("doc", "docx"):
             from docx import Document
             doc = Document(str(path))
+            text_parts = []
             for para in doc.paragraphs:
                 if para.text.strip():
                     text_parts.append(para.text)
@@ -88,18 +336,28 @@ def extract_text_from_file(file_path: str, file_type: str) -> str:
                     for cell in row.cells:
                         if cell.text.strip():
                             text_parts.append(cell.text)
+            if text_parts:
+                pages.append("\n".join(text_parts))
         elif ft in ("xls", "xlsx"):
             import openpyxl
             wb = openpyxl.load_workbook(str(path), read_only=True, data_only=True)
             for sheet in wb.worksheets:
+                lines = []
                 for row in sheet.iter_rows(values_only=True):
                     vals = [str(v).strip() for v in (row or []) if v is not None and str(v).strip()]
                     if vals:
-                        text_parts.append(" ".join(vals))
+                        lines.append(" ".join(vals))
+                if lines:
+                    pages.append("\n".join(lines))
             wb.close()
     except Exception as e:
         logger.warning(f"提取文本失败 {path}: {e}")
-    text = "\n".join(text_parts).strip()
+    return pages
+
+
+def extract_text_from_file(file_path: str, file_type: str) -> str:
+    """从 PDF/Word/Excel 提取正文文本"""
+    text = "\n".join(extract_pages(file_path, file_type)).strip()
     if len(text) > 50000:
         text = text[:50000]
     return text
@@ -123,47 +381,166 @@ def _split_chunks(text: str, chunk_size: int, overlap: int) -> List[str]:
     return chunks if chunks else [text[:chunk_size]]
 
 
-def add_to_index(policy_id: str, title: str, issue_time: str, remark: str, file_path: str, file_type: str) -> bool:
-    """将制度加入向量库（按切片存储，便于展示匹配切片）"""
-    try:
-        from config import settings
-        chunk_size = getattr(settings, "VECTOR_CHUNK_SIZE", 400) or 400
-        overlap = getattr(settings, "VECTOR_CHUNK_OVERLAP", 80) or 80
-        chunk_size = max(100, min(2000, int(chunk_size)))
-        overlap = max(0, min(chunk_size - 50, int(overlap)))
+def _chunk_params() -> Tuple[int, int]:
+    from config import settings
+    chunk_size = getattr(settings, "VECTOR_CHUNK_SIZE", 400) or 400
+    overlap = getattr(settings, "VECTOR_CHUNK_OVERLAP", 80) or 80
+    chunk_size = max(100, min(2000, int(chunk_size)))
+    overlap = max(0, min(chunk_size - 50, int(overlap)))
+    return chunk_size, overlap
+
+
+def model_id() -> str:
+    """当前编码模型标识，参与切片哈希：换模型或换 ONNX/int8 后端后所有切片视为变化"""
+    model = _get_model()
+    onnx_file = getattr(model, "model_file", None)
+    if onnx_file:
+        return f"{_get_model_path()}:onnx:{onnx_file}"
+    return _get_model_path()
+
+
+def _prepare_chunks(doc: dict) -> List[str]:
+    """
+    制度切片：标题、发行时间、备注单独切为表头切片，正文按内容哈希存储后单独切片。
+    两部分分开切，修改标题/备注只影响表头切片，正文切片保持不变。
+    """
+    from services.policy_text import get_policy_text
+    chunk_size, overlap = _chunk_params()
+    policy_id = doc["policy_id"]
+    title = doc.get("title") or ""
+    file_full = _BASE_DIR / "data" / (doc.get("file_path") or "").replace("/", os.sep)
+    stored = get_policy_text(policy_id, str(file_full), doc.get("file_type") or "") if doc.get("file_path") else None
+    doc_text = (stored["text"] if stored else "").strip()
+    prefix = f"{title}\n{doc.get('issue_time') or ''}\n{doc.get('remark') or ''}\n".strip()
+    chunks = (_split_chunks(prefix, chunk_size, overlap) if prefix else []) + \
+        (_split_chunks(doc_text, chunk_size, overlap) if doc_text else [])
+    return chunks if chunks else [(title or policy_id)[:chunk_size]]
+
 
+def chunk_id(policy_id: str, text: str, mid: str) -> str:
+    """切片 ID：制度 ID + (模型标识, 切片原文) 的哈希，内容不变则 ID 不变"""
+    h = hashlib.sha1(f"{mid}\0{text}".encode("utf-8")).hexdigest()[:20]
+    return f"{policy_id}_{h}"
+
+
+def index_documents(docs: List[dict], batch_size: int = 64) -> Dict[str, Optional[str]]:
+    """
+    增量入库多个制度：切片 ID 由内容与模型哈希得出，只编码新增/变化的切片（多个制度合并为一次 model.encode），
+    仅顺序变化的切片只更新 metadata，不再出现的切片（含旧格式 {id}_c{n}）删除；切片全部未变的制度直接跳过。
+    docs 每项含 policy_id, title, issue_time, remark, file_path, file_type。
+    返回 {policy_id: None 表示成功 / 错误信息}
+    """
+    client = _sidecar()
+    if client is not None:
+        try:
+            return client.call("index", {"docs": docs, "batch_size": batch_size}, write=True)
+        except Exception as e:
+            return {doc["policy_id"]: str(e) for doc in docs}
+    results: Dict[str, Optional[str]] = {}
+    prepared = []
+    for doc in docs:
+        try:
+            prepared.append((doc["policy_id"], _prepare_chunks(doc)))
+        except Exception as e:
+            results[doc["policy_id"]] = f"切片失败: {e}"
+    if not prepared:
+        return results
+    try:
         coll = _get_collection()
-        model = _get_model()
-        file_full = _BASE_DIR / "data" / file_path.replace("/", os.sep)
-        doc_text = extract_text_from_file(str(file_full), file_type)
-        prefix = f"{title or ''}\n{issue_time or ''}\n{remark or ''}\n".strip()
-        combined = f"{prefix}\n{doc_text}".strip()
-        if not combined:
-            combined = title or policy_id
-
-        chunks = _split_chunks(combined, chunk_size, overlap)
-        if not chunks:
-            chunks = [combined[:chunk_size]]
-
-        ids = [f"{policy_id}_c{i}" for i in range(len(chunks))]
-        metadatas = [{"policy_id": policy_id, "chunk_index": i} for i in range(len(chunks))]
-        emb = model.encode(chunks, normalize_embeddings=True)
-        coll.upsert(
-            ids=ids,
-            embeddings=emb.tolist(),
-            documents=chunks,
-            metadatas=metadatas,
-        )
-        coll.delete(ids=[policy_id])  # 删除旧的全文档记录（如有）
-        logger.info(f"向量入库成功: {policy_id}, {len(chunks)} 个切片")
-        return True
+        mid = model_id()
     except Exception as e:
-        logger.error(f"向量入库失败 {policy_id}: {e}")
-        return False
+        for policy_id, _ in prepared:
+            results[policy_id] = str(e)
+        return results
+
+    from services import policy_bm25
+    new_chunks: Dict[str, List[Tuple[str, str]]] = {}
+    plans = []
+    to_embed: List[str] = []
+    for policy_id, chunks in prepared:
+        try:
+            existing = coll.get(where={"policy_id": policy_id}, include=["metadatas"]) or {}
+            old = dict(zip(existing.get("ids") or [], existing.get("metadatas") or []))
+            new_ids, seen = [], set()
+            for text in chunks:
+                cid = chunk_id(policy_id, text, mid)
+                if cid not in seen:  # 同一制度内重复的切片只保留一条
+                    seen.add(cid)
+                    new_ids.append((cid, text))
+            embed = [(cid, text, i) for i, (cid, text) in enumerate(new_ids) if cid not in old]
+            remeta = [(cid, i) for i, (cid, _) in enumerate(new_ids)
+                      if cid in old and (old[cid] or {}).get("chunk_index") != i]
+            orphans = [cid for cid in old if cid not in seen]
+            new_chunks[policy_id] = new_ids
+            plans.append((policy_id, len(to_embed), embed, remeta, orphans))
+            to_embed.extend(text for _, text, _ in embed)
+        except Exception as e:
+            results[policy_id] = str(e)
+
+    emb = None
+    if to_embed:
+        try:
+            emb = _get_model().encode(to_embed, normalize_embeddings=True, batch_size=batch_size)
+        except Exception as e:
+            logger.error(f"向量编码失败: {e}")
+            for policy_id, *_ in plans:
+                results[policy_id] = str(e)
+            return results
+
+    changed = skipped = 0
+    for policy_id, offset, embed, remeta, orphans in plans:
+        try:
+            if embed:
+                part = emb[offset:offset + len(embed)]
+                coll.upsert(
+                    ids=[cid for cid, _, _ in embed],
+                    embeddings=part.tolist(),
+                    documents=[text for _, text, _ in embed],
+                    metadatas=[{"policy_id": policy_id, "chunk_index": i} for _, _, i in embed],
+                )
+            if remeta:
+                coll.update(
+                    ids=[cid for cid, _ in remeta],
+                    metadatas=[{"policy_id": policy_id, "chunk_index": i} for _, i in remeta],
+                )
+            if orphans or embed:
+                coll.delete(ids=orphans + [policy_id])  # 含旧的全文档记录（如有）
+            results[policy_id] = None
+            policy_bm25.on_policy_indexed(policy_id, new_chunks[policy_id])
+            if embed or remeta or orphans:
+                changed += 1
+                logger.info(f"向量入库: {policy_id} 新增 {len(embed)}、更新 {len(remeta)}、删除 {len(orphans)} 个切片")
+            else:
+                skipped += 1
+        except Exception as e:
+            logger.error(f"向量入库失败 {policy_id}: {e}")
+            results[policy_id] = str(e)
+    if changed:
+        _bump_index_version()
+    if skipped:
+        logger.info(f"向量入库: {skipped} 个制度切片未变化，已跳过")
+    return results
+
+
+def add_to_index(policy_id: str, title: str, issue_time: str, remark: str, file_path: str, file_type: str) -> bool:
+    """将制度加入向量库（按切片存储，便于展示匹配切片）"""
+    doc = {"policy_id": policy_id, "title": title, "issue_time": issue_time, "remark": remark,
+           "file_path": file_path, "file_type": file_type}
+    err = index_documents([doc]).get(policy_id)
+    if err:
+        logger.error(f"向量入库失败 {policy_id}: {err}")
+    return err is None
 
 
 def remove_from_index(policy_id: str) -> bool:
     """从向量库删除（删除该 policy 的所有切片）"""
+    client = _sidecar()
+    if client is not None:
+        try:
+            return bool(client.call("remove", {"policy_id": policy_id}, write=True))
+        except Exception as e:
+            logger.warning(f"向量删除失败 {policy_id}: {e}")
+            return False
     try:
         coll = _get_collection()
         try:
@@ -176,44 +553,115 @@ def remove_from_index(policy_id: str) -> bool:
             coll.delete(ids=[policy_id])
         except Exception:
             pass
+        from services.policy_bm25 import on_policy_removed
+        on_policy_removed(policy_id)
+        _bump_index_version()
         return True
     except Exception as e:
         logger.warning(f"向量删除失败 {policy_id}: {e}")
         return False
 
 
-def search(query: str, top_k: int = 20) -> List[Tuple[str, float, str]]:
-    """向量检索，返回 [(policy_id, score, snippet), ...]，snippet 为匹配到的切片原文"""
-    if not (query or "").strip():
+def _dense_search(coll, norm: str, n_results: int) -> List[Tuple[str, float, str]]:
+    """向量检索，按制度去重（保留最相似切片），相似度降序"""
+    q_emb = _cached_query_embedding(norm)
+    results = coll.query(
+        query_embeddings=[q_emb.tolist()],
+        n_results=n_results,
+        include=["metadatas", "distances", "documents"],
+    )
+    ids = results.get("ids", [[]])[0] or []
+    dists = results.get("distances", [[]])[0] or []
+    docs = results.get("documents", [[]])[0] or []
+    metadatas = results.get("metadatas", [[]])[0] or []
+    seen = {}
+    for i, chunk_id in enumerate(ids):
+        meta = metadatas[i] if i < len(metadatas) else {}
+        policy_id = meta.get("policy_id") or (chunk_id.split("_c")[0] if "_c" in str(chunk_id) else chunk_id)
+        d = float(dists[i] if i < len(dists) else 1.0)
+        # 余弦距离：distance = 1 - cos_sim，故 cos_sim = 1 - distance，直接作为相关性
+        score = max(0.0, min(1.0, 1.0 - d))
+        doc_text = docs[i] if i < len(docs) else ""
+        snippet = (doc_text or "").strip()
+        if policy_id not in seen or score > seen[policy_id][1]:
+            seen[policy_id] = (snippet, score)
+    out = [(pid, sc, sn) for pid, (sn, sc) in seen.items()]
+    out.sort(key=lambda x: -x[1])
+    return out
+
+
+def _keyword_search(coll, norm: str, n_results: int, version) -> Tuple[List[Tuple[str, float, str]], bool]:
+    """
+    BM25 关键词检索，按制度去重（保留最高分切片）。
+    返回 (结果, 是否完整)：索引未就绪（返回空）或预算耗尽提前结束时不完整，融合结果不应写入缓存。
+    """
+    from config import settings
+    from services import policy_bm25
+    idx = policy_bm25.get_index(coll, version[1] if version else None)
+    if idx is None:
+        return [], False
+    budget = float(getattr(settings, "HYBRID_KEYWORD_BUDGET_MS", 50) or 0) or None
+    rows, complete = idx.search_with_status(norm, n_results, budget)
+    out, seen = [], set()
+    for _, policy_id, score, text in rows:
+        if policy_id not in seen:
+            seen.add(policy_id)
+            out.append((policy_id, score, text.strip()))
+    return out, complete
+
+
+def search(query: str, top_k: int = 20, hybrid: Optional[bool] = None) -> List[Tuple[str, float, str]]:
+    """
+    制度检索，返回 [(policy_id, score, snippet), ...]，snippet 为匹配到的切片原文。
+    hybrid（默认取 HYBRID_SEARCH）：向量与 BM25 关键词结果按 RRF 融合排序；score 仍为向量余弦相似度，
+    仅关键词命中的制度 score 为归一化的融合分。
+    """
+    from config import settings
+    client = _sidecar()
+    if client is not None:
+        rows = client.call("search", {"query": query, "top_k": top_k, "hybrid": hybrid})
+        return [(pid, score, snippet) for pid, score, snippet in rows or []]
+    if hybrid is None:
+        hybrid = bool(getattr(settings, "HYBRID_SEARCH", True))
+    norm = normalize_query(query)
+    if not norm:
         return []
+    version = _index_version()
+    key = (norm, int(top_k), bool(hybrid), version)
+    if version is not None:
+        cached = _result_cache.get(key)
+        if cached is not None:
+            return list(cached)
     try:
         coll = _get_collection()
-        model = _get_model()
-        q_emb = model.encode([query.strip()], normalize_embeddings=True)
         n_results = min(top_k * 3, 150)  # 多取一些，便于按 policy 去重后保留 top_k
-        results = coll.query(
-            query_embeddings=q_emb.tolist(),
-            n_results=n_results,
-            include=["metadatas", "distances", "documents"],
-        )
-        ids = results.get("ids", [[]])[0] or []
-        dists = results.get("distances", [[]])[0] or []
-        docs = results.get("documents", [[]])[0] or []
-        metadatas = results.get("metadatas", [[]])[0] or []
-        seen = {}
-        for i, chunk_id in enumerate(ids):
-            meta = metadatas[i] if i < len(metadatas) else {}
-            policy_id = meta.get("policy_id") or (chunk_id.split("_c")[0] if "_c" in str(chunk_id) else chunk_id)
-            d = float(dists[i] if i < len(dists) else 1.0)
-            # 余弦距离：distance = 1 - cos_sim，故 cos_sim = 1 - distance，直接作为相关性
-            score = max(0.0, min(1.0, 1.0 - d))
-            doc_text = docs[i] if i < len(docs) else ""
-            snippet = (doc_text or "").strip()
-            if policy_id not in seen or score > seen[policy_id][1]:
-                seen[policy_id] = (snippet, score)
-        out = [(pid, sc, sn) for pid, (sn, sc) in seen.items()]
-        out.sort(key=lambda x: -x[1])
-        return out[:top_k]
+        dense = _dense_search(coll, norm, n_results)
+        keyword, cacheable = [], True
+        if hybrid:
+            try:
+                keyword, cacheable = _keyword_search(coll, norm, n_results, version)
+            except Exception as e:
+                cacheable = False
+                logger.warning(f"关键词检索失败，仅使用向量结果: {e}")
+        if keyword:
+            from services.policy_bm25 import rrf_fuse
+            k = int(getattr(settings, "HYBRID_RRF_K", 60) or 60)
+            dense_rank = {pid: (r, sc, sn) for r, (pid, sc, sn) in enumerate(dense)}
+            kw_rank = {pid: (r, sn) for r, (pid, _, sn) in enumerate(keyword)}
+            fused = rrf_fuse([[pid for pid, _, _ in dense], [pid for pid, _, _ in keyword]], k)
+            top = 2.0 / (k + 1)
+            out = []
+            for pid, rrf in fused[:top_k]:
+                d, kw = dense_rank.get(pid), kw_rank.get(pid)
+                # 摘要取排名更靠前一侧的切片
+                snippet = d[2] if d and (not kw or d[0] <= kw[0]) else kw[1]
+                out.append((pid, d[1] if d else round(min(1.0, rrf / top), 4), snippet))
+        else:
+            out = dense[:top_k]
+        # 关键词索引未就绪、检索失败或超出预算时结果不完整，不缓存，避免混合检索长期只返回向量结果
+        if version is not None and cacheable:
+            _result_cache.put(key, tuple(out))
+        return out
     except Exception as e:
         logger.error(f"向量检索失败: {e}")
         raise
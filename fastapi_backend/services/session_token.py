@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+登录会话令牌 - /auth/login 签发，携带已解析的姓名、科室、级别与管理员标识，校验时不访问数据库
+- 格式与 routers/sso.py 的 ticket 相同：base64url(json(payload)) + "." + HMAC-SHA256 十六进制签名；
+  但签名密钥为 HMAC(secret, "session") 派生的独立密钥，且要求 typ=session 与 iat，SSO ticket 不能当作会话令牌使用
+- 前端以 Authorization: Bearer <token>（或 X-Session-Token）携带；全局依赖 load_session 校验后放入上下文，
+  各权限判断（管理范围、考勤异常、系统管理员、制度上传等）在令牌姓名与 current_user 一致时直接使用令牌中的角色
+- 撤销：员工科室/级别/在职状态或 webconfig 管理员变更时调用 revoke_sessions()，写入 session_revocation 表
+  （name='*' 表示全部）；早于撤销时间签发的令牌失效。各 worker 由后台任务定时同步撤销表，请求路径上不查库
+未配置 SESSION_SECRET 与 SSO_SECRET 时不签发令牌，各接口沿用按 current_user 查库的方式。
+"""
+import asyncio
+import base64
+import contextvars
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from fastapi import HTTPException, Request
+
+from config import settings
+from database import db
+
+logger = logging.getLogger(__name__)
+
+REVOKE_ALL = "*"
+TOKEN_TYPE = "session"
+# 携带无效令牌时不返回 401 的公开接口（登录、健康检查、文档），旧令牌不影响重新登录
+_PUBLIC_PATHS = {p.rstrip("/") for p in ("/", "/health", "/docs", "/redoc", "/openapi.json", f"{settings.API_PREFIX}/auth/login")}
+
+_schema_ensured = False
+_lock = threading.Lock()
+# name -> 撤销时间（毫秒）；由本进程写入或后台任务从 session_revocation 同步
+_revoked_at: Dict[str, int] = {}
+
+_current_session: contextvars.ContextVar = contextvars.ContextVar("current_session", default=None)
+
+
+def sign_payload(payload_obj: dict, secret: str) -> str:
+    """base64url(json) + "." + HMAC-SHA256(secret, payload_b64) 十六进制签名"""
+    payload_b64 = base64.urlsafe_b64encode(json.dumps(payload_obj, ensure_ascii=False).encode()).decode().rstrip("=")
+    sig = hmac.new(secret.encode("utf-8"), payload_b64.encode("utf-8"), hashlib.sha256).hexdigest()
+    return f"{payload_b64}.{sig}"
+
+
+def verify_payload(token: str, secret: str) -> Optional[dict]:
+    """校验签名与 exp，通过时返回 payload，否则 None"""
+    try:
+        payload_b64, sig = (token or "").strip().rsplit(".", 1)
+    except ValueError:
+        return None
+    expected = hmac.new(secret.encode("utf-8"), payload_b64.encode("utf-8"), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, sig):
+        return None
+    try:
+        padded = payload_b64 + "=" * (-len(payload_b64) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except Exception:
+        return None
+    if not isinstance(payload, dict) or int(payload.get("exp") or 0) < time.time():
+        return None
+    return payload
+
+
+def _secret() -> str:
+    return (settings.SESSION_SECRET or "").strip() or (settings.SSO_SECRET or "").strip()
+
+
+def _session_key() -> str:
+    """会话令牌签名密钥：由共享密钥派生，与 SSO ticket 的签名密钥不同"""
+    secret = _secret()
+    if not secret:
+        return ""
+    return hmac.new(secret.encode("utf-8"), TOKEN_TYPE.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def session_enabled() -> bool:
+    return bool(_secret())
+
+
+def _ensure_schema_once() -> bool:
+    """确保 session_revocation 表存在，进程内只执行一次。"""
+    global _schema_ensured
+    if _schema_ensured:
+        return True
+    n = db.execute_update(
+        "CREATE TABLE IF NOT EXISTS session_revocation ("
+        " name VARCHAR(100) NOT NULL PRIMARY KEY,"
+        " revoked_at BIGINT NOT NULL"
+        ") DEFAULT CHARSET=utf8mb4",
+        (),
+    )
+    if n < 0:
+        logger.warning("创建 session_revocation 失败，角色变更后旧令牌仅在本进程失效")
+        return False
+    _schema_ensured = True
+    return True
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def issue_session_token(name: str, lsys: str, jb: str, webconfig: Optional[dict]) -> Optional[str]:
+    """签发会话令牌；webconfig 为 id=1 行（含 admin1/admin2/dakaman），未配置密钥时返回 None"""
+    key = _session_key()
+    if not key:
+        return None
+    name = (name or "").strip()
+    wc = webconfig or {}
+
+    def _is(col: str) -> bool:
+        return bool(name) and (wc.get(col) or "").strip() == name
+
+    now = _now_ms()
+    payload = {
+        "typ": TOKEN_TYPE,
+        "name": name,
+        "lsys": (lsys or "").strip(),
+        "jb": (jb or "").strip(),
+        "admin1": _is("admin1"),
+        "admin2": _is("admin2"),
+        "dakaman": _is("dakaman"),
+        "iat": now,
+        "exp": now // 1000 + int(settings.SESSION_TOKEN_EXPIRE_SECONDS),
+    }
+    return sign_payload(payload, key)
+
+
+def _is_revoked(claims: dict) -> bool:
+    iat = int(claims.get("iat") or 0)
+    with _lock:
+        cutoff = max(_revoked_at.get(claims.get("name") or "", 0), _revoked_at.get(REVOKE_ALL, 0))
+    return iat < cutoff
+
+
+def verify_session_token(token: str) -> Optional[dict]:
+    """校验令牌（签名、有效期、撤销表），不访问数据库"""
+    key = _session_key()
+    if not key or not token:
+        return None
+    claims = verify_payload(token, key)
+    if (not claims or claims.get("typ") != TOKEN_TYPE or not claims.get("name")
+            or not claims.get("iat") or _is_revoked(claims)):
+        return None
+    return claims
+
+
+def revoke_sessions(name: Optional[str] = None) -> None:
+    """撤销某员工（name=None 时为全部）在此之前签发的令牌"""
+    key = (name or "").strip() or REVOKE_ALL
+    now = _now_ms()
+    with _lock:
+        _revoked_at[key] = max(_revoked_at.get(key, 0), now)
+    if not _ensure_schema_once():
+        return
+    n = db.execute_update(
+        "INSERT INTO session_revocation (name, revoked_at) VALUES (%s, %s) "
+        "ON DUPLICATE KEY UPDATE revoked_at = GREATEST(revoked_at, VALUES(revoked_at))",
+        (key, now),
+    )
+    if n < 0:
+        logger.warning(f"写入令牌撤销记录失败: {key}")
+
+
+def refresh_revocations() -> None:
+    """从 session_revocation 同步其他 worker 写入的撤销时间，并清理已超过令牌有效期的记录"""
+    if not _ensure_schema_once():
+        return
+    horizon = _now_ms() - int(settings.SESSION_TOKEN_EXPIRE_SECONDS) * 1000
+    db.execute_update("DELETE FROM session_revocation WHERE revoked_at < %s", (horizon,))
+    rows = db.execute_query("SELECT name, revoked_at FROM session_revocation") or []
+    with _lock:
+        for r in rows:
+            key = r.get("name") or ""
+            _revoked_at[key] = max(_revoked_at.get(key, 0), int(r.get("revoked_at") or 0))
+        for key in [k for k, v in _revoked_at.items() if v < horizon]:
+            _revoked_at.pop(key, None)
+
+
+async def revocation_loop(interval_seconds: float) -> None:
+    """后台任务：定时同步撤销表"""
+    loop = asyncio.get_event_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, refresh_revocations)
+        except Exception as e:
+            logger.warning(f"同步令牌撤销表失败: {e}")
+        await asyncio.sleep(interval_seconds)
+
+
+def _token_from_request(request: Request) -> str:
+    auth = request.headers.get("authorization") or ""
+    if auth[:7].lower() == "bearer ":
+        return auth[7:].strip()
+    return (request.headers.get("x-session-token") or "").strip()
+
+
+async def load_session(request: Request) -> Optional[dict]:
+    """
+    全局依赖：校验请求携带的令牌并放入上下文，供 session_for() 读取。
+    未携带令牌时为 None；携带了无效/过期/已撤销的令牌返回 401，前端据此重新登录；
+    登录、健康检查等公开接口忽略无效令牌。
+    """
+    token = _token_from_request(request)
+    if not token:
+        _current_session.set(None)
+        return None
+    claims = verify_session_token(token)
+    if claims is None and session_enabled() and request.url.path.rstrip("/") not in _PUBLIC_PATHS:
+        raise HTTPException(status_code=401, detail="登录已失效，请重新登录")
+    _current_session.set(claims)
+    return claims
+
+
+def current_session() -> Optional[dict]:
+    return _current_session.get()
+
+
+def session_for(name: str) -> Optional[dict]:
+    """
+    当前请求令牌对应 name 时返回其 claims，否则 None（调用方回退为查库）。
+    SESSION_REQUIRED 开启时，无匹配令牌直接 401，不再信任仅凭 current_user 传入的身份。
+    """
+    claims = _current_session.get()
+    name = (name or "").strip()
+    if claims and name and claims.get("name") == name:
+        return claims
+    if settings.SESSION_REQUIRED and session_enabled():
+        raise HTTPException(status_code=401, detail="请先登录")
+    return None
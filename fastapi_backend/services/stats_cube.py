@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+请假/加班/公出 统计立方体 - 按年在内存中构建列存事实表，供通用聚合查询
+- 事实来源：已通过请假 qj(qjzt=4)、已通过加班 jiaban(jiabanzt=4)、已批准公出 gcsqb(bldzt=2, szrzt=2)，
+  人员与科室以 yggl 在职名单为准（排除名字/科室末尾为1、离职人员）
+- 维度：fact(leave/overtime/trip)、lsys、person、month、quarter、type、festival
+  （请假 type=qjfs；加班 type=jb 平时加班/值班；公出无 type）
+- 度量：days、hours、pay、count，以及 full_rate 满勤率（仅可按 lsys/person/month/quarter 分组）
+- 公出按「人+日」展开并去重，与科室统计「区间并集计天数」口径一致；加班费按人+日应用节日激励规则后，
+  按当天各条记录小时数分摊到记录
+构建结果按年缓存（随统计缓存版本号失效）。
+"""
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+from database import db
+from services.overtime_pay import compute_overtime_pay, load_holiday_festival_map, load_zhibanfei
+from utils.stats_cache import cached_call, ALL_SCOPES
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+logger = logging.getLogger(__name__)
+
+LEADER_EXCLUDE_LSYS = "部办"
+
+DIMENSIONS = ("fact", "lsys", "person", "month", "quarter", "type", "festival")
+MEASURES = ("days", "hours", "pay", "count", "full_rate")
+# 满勤率只能按这些维度分组/筛选（其余维度对「无请假」没有意义）
+FULL_RATE_DIMENSIONS = ("lsys", "person", "month", "quarter")
+
+_STAFF_COND = (
+    "RIGHT(TRIM(yggl.name), 1) != '1' AND RIGHT(TRIM(yggl.lsys), 1) != '1' "
+    "AND TRIM(yggl.lsys) != %s AND (COALESCE(yggl.zaizhi,0)=0)"
+)
+
+
+def _to_date(v) -> Optional[date]:
+    if v is None:
+        return None
+    if isinstance(v, datetime):
+        return v.date()
+    if isinstance(v, date):
+        return v
+    s = str(v)[:10]
+    try:
+        return datetime.strptime(s, "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def _to_float(v) -> float:
+    try:
+        return float(v) if v is not None else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class StatsCube:
+    """
+    列存事实表：维度列为字典编码（labels[dim] 为取值表，codes[dim] 为每行下标），度量列为 float 数组。
+    roster 为在职名单 [(name, lsys)]，用于满勤率分母。
+    """
+
+    def __init__(self, year: int, facts: List[dict], roster: List[tuple]):
+        self.year = year
+        self.size = len(facts)
+        self.labels: Dict[str, list] = {}
+        self.codes: Dict[str, object] = {}
+        for dim in DIMENSIONS:
+            values = [f[dim] for f in facts]
+            labels = sorted(set(values), key=lambda x: (str(type(x)), x))
+            pos = {v: i for i, v in enumerate(labels)}
+            self.labels[dim] = labels
+            self.codes[dim] = self._array([pos[v] for v in values], int)
+        self.values = {m: self._array([f[m] for f in facts], float) for m in ("days", "hours", "pay", "count")}
+        self.roster = roster
+
+    @staticmethod
+    def _array(values, kind):
+        if HAS_NUMPY:
+            return np.asarray(values, dtype=np.int64 if kind is int else np.float64)
+        return list(values)
+
+    def _mask(self, filters: Dict[str, Sequence]):
+        """按筛选条件返回行下标。"""
+        keep_codes = {}
+        for dim, allowed in (filters or {}).items():
+            allowed_set = {_normalize(dim, v) for v in allowed}
+            keep_codes[dim] = [i for i, v in enumerate(self.labels[dim]) if v in allowed_set]
+        if HAS_NUMPY:
+            mask = np.ones(self.size, dtype=bool)
+            for dim, keep in keep_codes.items():
+                mask &= np.isin(self.codes[dim], np.asarray(keep, dtype=np.int64))
+            return np.nonzero(mask)[0]
+        rows = range(self.size)
+        for dim, keep in keep_codes.items():
+            keep_set = set(keep)
+            col = self.codes[dim]
+            rows = [i for i in rows if col[i] in keep_set]
+        return list(rows)
+
+    def aggregate(self, dims: List[str], measures: List[str], filters: Dict[str, Sequence]) -> List[dict]:
+        """按 dims 分组汇总 measures（不含 full_rate）。"""
+        idx = self._mask(filters)
+        if len(idx) == 0:
+            return []
+        if HAS_NUMPY:
+            key = np.zeros(len(idx), dtype=np.int64)
+            for dim in dims:
+                key = key * max(1, len(self.labels[dim])) + self.codes[dim][idx]
+            groups, inverse = np.unique(key, return_inverse=True)
+            sums = {m: np.bincount(inverse, weights=self.values[m][idx], minlength=len(groups)) for m in measures}
+            out = []
+            for g, k in enumerate(groups.tolist()):
+                picked = {}
+                for dim in reversed(dims):
+                    n = max(1, len(self.labels[dim]))
+                    picked[dim] = self.labels[dim][k % n]
+                    k //= n
+                row = {dim: picked[dim] for dim in dims}
+                for m in measures:
+                    row[m] = round(float(sums[m][g]), 2)
+                out.append(row)
+            return out
+        acc: Dict[tuple, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        for i in idx:
+            k = tuple(self.codes[dim][i] for dim in dims)
+            for m in measures:
+                acc[k][m] += self.values[m][i]
+        out = []
+        for k, sums in acc.items():
+            row = {dim: self.labels[dim][c] for dim, c in zip(dims, k)}
+            for m in measures:
+                row[m] = round(sums[m], 2)
+            out.append(row)
+        return out
+
+    def full_rate(self, dims: List[str], filters: Dict[str, Sequence]) -> List[dict]:
+        """
+        满勤率：分组内在职人数中，该期间（month/quarter，未分组则全年）无已通过请假者所占比例。
+        """
+        period_dim = "month" if "month" in dims else ("quarter" if "quarter" in dims else None)
+        periods = list(range(1, 13)) if period_dim == "month" else ([1, 2, 3, 4] if period_dim == "quarter" else [None])
+        period_filter = {_normalize(period_dim, v) for v in filters.get(period_dim, [])} if period_dim else set()
+        if period_filter:
+            periods = [p for p in periods if p in period_filter]
+        if period_dim == "month" and filters.get("quarter"):
+            quarters = {_normalize("quarter", v) for v in filters["quarter"]}
+            periods = [p for p in periods if (p - 1) // 3 + 1 in quarters]
+        leave_filters = dict(filters, fact=["leave"])
+        leave_dims = ["person"] + ([period_dim] if period_dim else [])
+        on_leave = {
+            (r["person"], r.get(period_dim)) for r in self.aggregate(leave_dims, ["days"], leave_filters) if r["days"] > 0
+        }
+        lsys_filter = {_normalize("lsys", v) for v in filters.get("lsys", [])}
+        person_filter = {_normalize("person", v) for v in filters.get("person", [])}
+        groups: Dict[tuple, List[int]] = defaultdict(lambda: [0, 0])
+        for name, lsys in self.roster:
+            if (lsys_filter and lsys not in lsys_filter) or (person_filter and name not in person_filter):
+                continue
+            for p in periods:
+                values = {"lsys": lsys, "person": name}
+                if period_dim == "month":
+                    values.update({"month": p, "quarter": (p - 1) // 3 + 1})
+                elif period_dim == "quarter":
+                    values["quarter"] = p
+                k = tuple(values.get(d) for d in dims)
+                groups[k][0] += 1
+                if (name, p) not in on_leave:
+                    groups[k][1] += 1
+        out = []
+        for k, (total, full) in groups.items():
+            row = dict(zip(dims, k))
+            row.update({"people": total, "fullCount": full, "full_rate": round(full / total, 4) if total else 0})
+            out.append(row)
+        return out
+
+
+def _normalize(dim: Optional[str], v):
+    """筛选值规范化：month/quarter 转 int，其余转去空格字符串。"""
+    if dim in ("month", "quarter"):
+        try:
+            return int(v)
+        except (TypeError, ValueError):
+            return None
+    return str(v).strip() if v is not None else ""
+
+
+def _fact(kind: str, name: str, lsys: str, d: date, type_: str, festival_map: Dict[str, str],
+          days: float = 0.0, hours: float = 0.0, pay: float = 0.0, count: float = 1.0) -> dict:
+    return {
+        "fact": kind,
+        "lsys": lsys,
+        "person": name,
+        "month": d.month,
+        "quarter": (d.month - 1) // 3 + 1,
+        "type": type_,
+        "festival": festival_map.get(d.strftime("%Y-%m-%d"), ""),
+        "days": days,
+        "hours": hours,
+        "pay": pay,
+        "count": count,
+    }
+
+
+def build_cube(year: int) -> StatsCube:
+    """从数据库构建某年的统计立方体。"""
+    festival_map = load_holiday_festival_map(year)
+    facts: List[dict] = []
+
+    roster_rows = db.execute_query(
+        f"SELECT name, lsys FROM yggl WHERE name IS NOT NULL AND name != '' AND {_STAFF_COND}",
+        (LEADER_EXCLUDE_LSYS,),
+    )
+    roster = [((r.get("name") or "").strip(), (r.get("lsys") or "").strip()) for r in roster_rows or []]
+    roster = [(n, l) for n, l in roster if n]
+
+    # 请假：按开始日期归月
+    leave_rows = db.execute_query(
+        f"""
+        SELECT qj.xm AS name, yggl.lsys, qj.timefrom, qj.timefromdate, qj.tian, qj.xiaoshi, qj.qjfs
+        FROM qj INNER JOIN yggl ON qj.xm = yggl.name
+        WHERE qj.qjzt = 4 AND {_STAFF_COND}
+          AND (qj.timefrom LIKE %s OR qj.timefromdate LIKE %s OR YEAR(qj.timefrom) = %s)
+        """,
+        (LEADER_EXCLUDE_LSYS, f"{year}%", f"{year}%", year),
+    )
+    for r in leave_rows or []:
+        d = _to_date(r.get("timefrom")) or _to_date(r.get("timefromdate"))
+        name = (r.get("name") or "").strip()
+        if not d or d.year != year or not name:
+            continue
+        facts.append(_fact("leave", name, (r.get("lsys") or "").strip(), d, (r.get("qjfs") or "").strip(),
+                           festival_map, days=_to_float(r.get("tian")), hours=_to_float(r.get("xiaoshi"))))
+
+    # 加班：加班费按人+日计算后按小时数分摊到各条记录（换休票为「是」的记录不计加班费）
+    ot_rows = db.execute_query(
+        f"""
+        SELECT jiaban.xm AS emp_name, yggl.lsys, jiaban.timedate, jiaban.jb, jiaban.hx,
+               CAST(COALESCE(jiaban.jbf, 0) AS DECIMAL(10,2)) AS jbf, jiaban.tian1
+        FROM jiaban INNER JOIN yggl ON jiaban.xm = yggl.name
+        WHERE jiaban.jiabanzt = 4 AND {_STAFF_COND}
+          AND (jiaban.timedate LIKE %s OR YEAR(jiaban.timedate) = %s)
+        """,
+        (LEADER_EXCLUDE_LSYS, f"{year}%", year),
+    )
+    paid_rows = []
+    for r in ot_rows or []:
+        if (r.get("hx") or "").strip() != "是":
+            paid_rows.append({"emp_name": r.get("emp_name"), "timedate": r.get("timedate"), "hours": r.get("jbf")})
+    book = compute_overtime_pay(paid_rows, festival_map, load_zhibanfei())
+    rate_by_day = {}
+    for item in book.per_day():
+        rate_by_day[(item["name"], item["date"])] = item["pay"] / item["hours"] if item["hours"] else 0.0
+    for r in ot_rows or []:
+        d = _to_date(r.get("timedate"))
+        name = (r.get("emp_name") or "").strip()
+        if not d or d.year != year or not name:
+            continue
+        paid = (r.get("hx") or "").strip() != "是"
+        jbf = _to_float(r.get("jbf"))
+        hours = jbf if paid else (_to_float(r.get("tian1")) or jbf)
+        pay = jbf * rate_by_day.get((name, d.strftime("%Y-%m-%d")), 0.0) if paid and jbf > 0 else 0.0
+        facts.append(_fact("overtime", name, (r.get("lsys") or "").strip(), d, (r.get("jb") or "").strip(),
+                           festival_map, hours=max(0.0, hours), pay=pay))
+
+    # 公出：展开为「人+日」并去重（区间并集），count 记在每条公出的首日
+    trip_rows = db.execute_query(
+        f"""
+        SELECT gcsqb.gcr AS name, yggl.lsys, gcsqb.gcsj, gcsqb.sjfhtime, gcsqb.yjfhsj, gcsqb.wpsj
+        FROM gcsqb INNER JOIN yggl ON gcsqb.gcr = yggl.name
+        WHERE gcsqb.bldzt = 2 AND gcsqb.szrzt = 2 AND {_STAFF_COND}
+          AND COALESCE(gcsqb.gcsj, gcsqb.wpsj) <= %s
+          AND COALESCE(gcsqb.sjfhtime, gcsqb.yjfhsj, gcsqb.gcsj, gcsqb.wpsj) >= %s
+        """,
+        (LEADER_EXCLUDE_LSYS, f"{year}-12-31", f"{year}-01-01"),
+    )
+    year_start, year_end = date(year, 1, 1), date(year, 12, 31)
+    trip_days: Dict[tuple, dict] = {}
+    for r in trip_rows or []:
+        name = (r.get("name") or "").strip()
+        start = _to_date(r.get("gcsj") or r.get("wpsj"))
+        end = _to_date(r.get("sjfhtime") or r.get("yjfhsj") or r.get("gcsj") or r.get("wpsj"))
+        if not name or not start or not end or end < start:
+            continue
+        lsys = (r.get("lsys") or "").strip()
+        d, last = max(start, year_start), min(end, year_end)
+        while d <= last:
+            f = trip_days.get((name, d))
+            if f is None:
+                f = trip_days[(name, d)] = _fact("trip", name, lsys, d, "", festival_map, days=1.0, count=0.0)
+            if d == start:
+                f["count"] += 1.0
+            d += timedelta(days=1)
+    facts.extend(trip_days.values())
+
+    logger.info(f"统计立方体 {year}: {len(facts)} 行事实（请假 {len(leave_rows or [])}、加班 {len(ot_rows or [])}、公出日 {len(trip_days)}）")
+    return StatsCube(year, facts, roster)
+
+
+def get_cube(year: int) -> StatsCube:
+    """某年的统计立方体（按统计缓存版本号缓存，写操作后自动重建）。"""
+    return cached_call("stats_cube", {"year": int(year)}, ALL_SCOPES, lambda: build_cube(int(year)))
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+制度向量 sidecar - 单独一个本机进程持有 embedding 模型、向量库与关键词索引，多个 uvicorn worker 通过 HTTP 调用
+- 配置 VECTOR_SIDECAR_URL（如 http://127.0.0.1:8765）后，policy_vector 的 search / index_documents /
+  remove_from_index / warm_up / search_cache_stats 转发到 sidecar，worker 进程不再加载模型与向量库
+- sidecar 内检索可并发（查询编码合批），写入（入库/删除）串行执行，避免多进程同时写 data/policy_chroma
+- 客户端每个线程复用一条 keep-alive 连接，检索与写入分别使用 VECTOR_SIDECAR_TIMEOUT / VECTOR_SIDECAR_INDEX_TIMEOUT
+运行: cd fastapi_backend && python -m services.vector_sidecar [--host 127.0.0.1] [--port 8765]
+"""
+import argparse
+import http.client
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+
+
+class SidecarError(Exception):
+    """sidecar 不可用或返回错误"""
+
+
+class SidecarClient:
+    """sidecar 的 HTTP 客户端：每线程一条持久连接，断线自动重连一次"""
+
+    def __init__(self, url: str, timeout: float = 10.0, index_timeout: float = 300.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or DEFAULT_PORT
+        self.timeout = timeout
+        self.index_timeout = index_timeout
+        self._local = threading.local()
+
+    def _conn(self, timeout: float) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+            self._local.conn = conn
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn
+
+    def _drop(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+        self._local.conn = None
+
+    def call(self, op: str, payload: Optional[dict] = None, write: bool = False):
+        body = json.dumps(payload or {}, ensure_ascii=False).encode("utf-8")
+        timeout = self.index_timeout if write else self.timeout
+        for attempt in (1, 2):
+            conn = self._conn(timeout)
+            try:
+                conn.request("POST", f"/{op}", body=body, headers={"Content-Type": "application/json"})
+                resp = conn.getresponse()
+                data = json.loads(resp.read().decode("utf-8") or "{}")
+            except (ConnectionError, http.client.HTTPException, OSError) as e:
+                self._drop()
+                # 空闲连接被服务端关闭时重连一次；超时不重试，避免重复写入
+                if attempt == 1 and not isinstance(e, TimeoutError):
+                    continue
+                raise SidecarError(f"向量 sidecar 不可用 {self.host}:{self.port}: {e}")
+            if resp.status != 200 or not data.get("ok"):
+                raise SidecarError(data.get("error") or f"向量 sidecar 返回 {resp.status}")
+            return data.get("result")
+        raise SidecarError("向量 sidecar 调用失败")
+
+
+_client: Optional[SidecarClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client(url: str) -> SidecarClient:
+    global _client
+    with _client_lock:
+        if _client is None or (_client.host, _client.port) != (urlparse(url).hostname, urlparse(url).port or DEFAULT_PORT):
+            from config import settings
+            _client = SidecarClient(
+                url,
+                timeout=float(getattr(settings, "VECTOR_SIDECAR_TIMEOUT", 10) or 10),
+                index_timeout=float(getattr(settings, "VECTOR_SIDECAR_INDEX_TIMEOUT", 300) or 300),
+            )
+        return _client
+
+
+# ---- 服务端 ----
+
+_write_lock = threading.Lock()
+
+
+def _dispatch(op: str, payload: dict):
+    import services.policy_vector as pv
+    if op == "search":
+        return pv.search(payload.get("query") or "", int(payload.get("top_k") or 20), payload.get("hybrid"))
+    if op == "index":
+        with _write_lock:
+            return pv.index_documents(payload.get("docs") or [], int(payload.get("batch_size") or 64))
+    if op == "remove":
+        with _write_lock:
+            return pv.remove_from_index(payload.get("policy_id") or "")
+    if op == "warmup":
+        return pv.warm_up()
+    if op == "stats":
+        return pv.search_cache_stats()
+    if op == "health":
+        return True
+    raise ValueError(f"未知操作 {op}")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length).decode("utf-8") or "{}") if length else {}
+            out = {"ok": True, "result": _dispatch(self.path.strip("/"), payload)}
+            status = 200
+        except Exception as e:
+            logger.error(f"sidecar 处理 {self.path} 失败: {e}")
+            out, status = {"ok": False, "error": str(e)}, 500
+        body = json.dumps(out, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        logger.debug("sidecar " + fmt % args)
+
+
+def serve(host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> None:
+    import services.policy_vector as pv
+    pv.run_in_process()  # 本进程即 sidecar，不再转发
+    pv.warm_up()
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    logger.info(f"向量 sidecar 已启动: http://{host}:{port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    serve(args.host, args.port)
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+制度向量存储后端 - 由 VECTOR_STORE_BACKEND 选择
+- chroma：chromadb.PersistentClient（原实现，data/policy_chroma）
+- numpy：data/policy_vectors 下的 float16 矩阵（.npy，内存映射只读打开）+ meta.json，精确点积检索；
+  切片规模为数千条时检索为毫秒级，不加载 chromadb，多个 worker 共享同一份页缓存
+两种后端提供 policy_vector 用到的同一组集合接口：get / upsert / update / delete / query / count，
+返回结构与 Chroma 一致（query 的 distances 为余弦距离 1 - cos）。
+"""
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+logger = logging.getLogger(__name__)
+
+_BASE_DIR = Path(__file__).resolve().parent.parent
+NUMPY_STORE_DIR = _BASE_DIR / "data" / "policy_vectors"
+
+# 精确检索时每次转换为 float32 的行数
+_QUERY_BLOCK_ROWS = 4096
+
+BACKEND_CHROMA = "chroma"
+BACKEND_NUMPY = "numpy"
+
+
+class NumpyCollection:
+    """
+    float16 向量矩阵 + 元数据的精确检索集合。
+    写操作整体重写 vectors.npy 与 meta.json（先写临时文件再替换），跨进程写入用排他文件锁串行；
+    读操作按 meta.json 的修改时间发现其他进程的写入，在共享锁内重新映射。
+    """
+
+    def __init__(self, directory: Path = NUMPY_STORE_DIR):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._vec_path = self.directory / "vectors.npy"
+        self._meta_path = self.directory / "meta.json"
+        self._lock_path = self.directory / ".lock"
+        self._lock = threading.RLock()
+        self._stamp = None
+        self._ids: List[str] = []
+        self._metas: List[dict] = []
+        self._docs: List[str] = []
+        self._pos: Dict[str, int] = {}
+        self._matrix = None
+        self._reload_if_changed()
+
+    # ---- 持久化 ----
+
+    def _stat(self):
+        try:
+            st = self._meta_path.stat()
+            return st.st_mtime_ns, st.st_size
+        except FileNotFoundError:
+            return None
+
+    @contextmanager
+    def _file_lock(self, mode):
+        """跨进程文件锁：读取加共享锁，写入加排他锁（无 fcntl 时仅进程内串行）"""
+        lock_file = open(self._lock_path, "a+")
+        try:
+            if HAS_FCNTL:
+                fcntl.flock(lock_file.fileno(), mode)
+            yield
+        finally:
+            if HAS_FCNTL:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            lock_file.close()
+
+    def _reload_if_changed(self, locked: bool = False) -> None:
+        """
+        meta.json 变化时重新加载。写入分两步替换 vectors.npy 与 meta.json，读取时加共享锁，
+        不会读到两次替换之间不匹配的一对文件；locked 表示调用方已持有排他锁。
+        加载后行数与 ids 不一致时保留上一次的内容且不更新 _stamp，下次访问重试。
+        """
+        import numpy as np
+        stamp = self._stat()
+        if stamp == self._stamp and (stamp is not None or self._matrix is not None):
+            return
+        if locked:
+            self._load()
+        else:
+            with self._file_lock(fcntl.LOCK_SH if HAS_FCNTL else None):
+                self._load()
+        if self._matrix is None:
+            self._matrix = np.zeros((0, 0), dtype=np.float16)
+
+    def _load(self) -> None:
+        import numpy as np
+        stamp = self._stat()
+        if stamp is None:
+            ids, metas, docs, matrix = [], [], [], np.zeros((0, 0), dtype=np.float16)
+        else:
+            with open(self._meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            ids = meta.get("ids") or []
+            metas = meta.get("metadatas") or []
+            docs = meta.get("documents") or []
+            if ids and self._vec_path.exists():
+                matrix = np.load(str(self._vec_path), mmap_mode="r")
+            else:
+                matrix = np.zeros((0, 0), dtype=np.float16)
+            if ids and (matrix.shape[0] != len(ids) or len(metas) != len(ids) or len(docs) != len(ids)):
+                logger.error(
+                    f"向量文件与 meta.json 不一致（{matrix.shape[0]} 行 / {len(ids)} 个 id），"
+                    f"保留当前已加载的 {len(self._ids)} 条，稍后重试"
+                )
+                return
+        self._ids, self._metas, self._docs, self._matrix = ids, metas, docs, matrix
+        self._pos = {cid: i for i, cid in enumerate(ids)}
+        self._stamp = stamp
+
+    @contextmanager
+    def _write(self):
+        """跨进程写锁：加锁后重新加载最新内容，退出时写回"""
+        with self._lock, self._file_lock(fcntl.LOCK_EX if HAS_FCNTL else None):
+            self._reload_if_changed(locked=True)
+            import numpy as np
+            state = {
+                "ids": list(self._ids),
+                "metadatas": list(self._metas),
+                "documents": list(self._docs),
+                "matrix": np.array(self._matrix, dtype=np.float16),
+            }
+            yield state
+            if not state.pop("unchanged", False):
+                self._save(state)
+
+    def _save(self, state: dict) -> None:
+        import numpy as np
+        tmp_vec = self.directory / "vectors.npy.tmp"
+        with open(tmp_vec, "wb") as f:
+            np.save(f, np.ascontiguousarray(state["matrix"], dtype=np.float16))
+        os.replace(tmp_vec, self._vec_path)
+        tmp_meta = self.directory / "meta.json.tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({"ids": state["ids"], "metadatas": state["metadatas"], "documents": state["documents"]},
+                      f, ensure_ascii=False)
+        os.replace(tmp_meta, self._meta_path)
+        self._stamp = None
+        self._reload_if_changed(locked=True)
+
+    # ---- 集合接口（与 Chroma 一致的子集） ----
+
+    def count(self) -> int:
+        with self._lock:
+            self._reload_if_changed()
+            return len(self._ids)
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[dict] = None, include=("metadatas", "documents")):
+        with self._lock:
+            self._reload_if_changed()
+            if ids is not None:
+                rows = [self._pos[i] for i in ids if i in self._pos]
+            else:
+                rows = range(len(self._ids))
+            if where:
+                rows = [r for r in rows if all((self._metas[r] or {}).get(k) == v for k, v in where.items())]
+            rows = list(rows)
+            out = {"ids": [self._ids[r] for r in rows]}
+            if "metadatas" in include:
+                out["metadatas"] = [self._metas[r] for r in rows]
+            if "documents" in include:
+                out["documents"] = [self._docs[r] for r in rows]
+            return out
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None) -> None:
+        import numpy as np
+        vecs = np.asarray(embeddings, dtype=np.float16)
+        with self._write() as state:
+            pos = {cid: i for i, cid in enumerate(state["ids"])}
+            matrix = state["matrix"]
+            if matrix.size == 0:
+                matrix = np.zeros((0, vecs.shape[1]), dtype=np.float16)
+            new_rows = []
+            for k, cid in enumerate(ids):
+                doc = documents[k] if documents is not None else ""
+                meta = metadatas[k] if metadatas is not None else {}
+                if cid in pos:
+                    i = pos[cid]
+                    matrix[i] = vecs[k]
+                    state["documents"][i], state["metadatas"][i] = doc, meta
+                else:
+                    pos[cid] = len(state["ids"])
+                    state["ids"].append(cid)
+                    state["documents"].append(doc)
+                    state["metadatas"].append(meta)
+                    new_rows.append(vecs[k])
+            if new_rows:
+                matrix = np.vstack([matrix, np.asarray(new_rows, dtype=np.float16)])
+            state["matrix"] = matrix
+
+    def update(self, ids, metadatas) -> None:
+        with self._write() as state:
+            pos = {cid: i for i, cid in enumerate(state["ids"])}
+            for cid, meta in zip(ids, metadatas):
+                if cid in pos:
+                    state["metadatas"][pos[cid]] = meta
+
+    def delete(self, ids=None, where: Optional[dict] = None) -> None:
+        drop = set(ids or [])
+        with self._write() as state:
+            keep = [
+                i for i, cid in enumerate(state["ids"])
+                if cid not in drop and not (where and all((state["metadatas"][i] or {}).get(k) == v for k, v in where.items()))
+            ]
+            if len(keep) == len(state["ids"]):
+                state["unchanged"] = True
+                return
+            state["ids"] = [state["ids"][i] for i in keep]
+            state["documents"] = [state["documents"][i] for i in keep]
+            state["metadatas"] = [state["metadatas"][i] for i in keep]
+            state["matrix"] = state["matrix"][keep] if keep else state["matrix"][:0]
+
+    def query(self, query_embeddings, n_results: int = 10, include=("metadatas", "distances", "documents")):
+        import numpy as np
+        with self._lock:
+            self._reload_if_changed()
+            ids, metas, docs, matrix = self._ids, self._metas, self._docs, self._matrix
+        out = {"ids": [], "distances": [], "metadatas": [], "documents": []}
+        for q in query_embeddings:
+            if not ids:
+                for key in out:
+                    out[key].append([])
+                continue
+            # numpy 的 float16 矩阵乘无 BLAS 加速，按块转 float32 计算
+            q32 = np.asarray(q, dtype=np.float32)
+            sims = np.empty(len(ids), dtype=np.float32)
+            for start in range(0, len(ids), _QUERY_BLOCK_ROWS):
+                block = matrix[start:start + _QUERY_BLOCK_ROWS]
+                sims[start:start + len(block)] = block.astype(np.float32) @ q32
+            n = min(int(n_results), len(ids))
+            top = np.argpartition(-sims, n - 1)[:n]
+            top = top[np.argsort(-sims[top])]
+            out["ids"].append([ids[i] for i in top])
+            out["distances"].append([float(1.0 - sims[i]) for i in top])
+            out["metadatas"].append([metas[i] for i in top])
+            out["documents"].append([docs[i] for i in top])
+        return {k: v for k, v in out.items() if k == "ids" or k in include}
+
+
+def open_chroma_collection(directory: Path, name: str):
+    """Chroma 集合（使用余弦距离，便于相关性分数直观 0-100%）"""
+    import chromadb
+    directory.mkdir(parents=True, exist_ok=True)
+    client = chromadb.PersistentClient(path=str(directory))
+    return client.get_or_create_collection(
+        name=name,
+        metadata={"hnsw:space": "cosine", "description": "部门制度向量库"}
+    )
+
+
+def open_collection(backend: str, chroma_dir: Path, chroma_name: str):
+    """按后端名打开集合"""
+    backend = (backend or BACKEND_CHROMA).strip().lower()
+    if backend == BACKEND_NUMPY:
+        return NumpyCollection(NUMPY_STORE_DIR)
+    if backend != BACKEND_CHROMA:
+        logger.warning(f"未知的向量存储后端 {backend}，使用 chroma")
+    return open_chroma_collection(chroma_dir, chroma_name)
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+文件下载响应 - 供制度文件、文件编号 PDF、请假说明材料等文件接口使用
+- 强 ETag（文件内容 SHA-256，按 路径+修改时间+大小 缓存，文件不变时不重复计算）与 Last-Modified
+- If-None-Match / If-Modified-Since 命中时返回 304，浏览器重复预览不再重新下载
+- Range: bytes=... 返回 206 部分内容（单个区间），PDF 阅读器可按需读取页面；If-Range 不匹配时返回完整文件
+- Cache-Control 由调用方按文件是否可能被替换选择
+"""
+import asyncio
+import hashlib
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+# 内容不会变化的文件（按唯一 ID 命名）：私有缓存一天，过期后用 ETag 校验
+CACHE_PRIVATE_DAY = "private, max-age=86400"
+# 同名可能被替换的文件：每次使用前校验（未变化时 304）
+CACHE_REVALIDATE = "private, no-cache"
+
+_CHUNK_SIZE = 256 * 1024
+_HASH_CACHE_MAX = 2048
+_hash_cache: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_hash_lock = threading.Lock()
+
+
+def file_etag(path: str) -> str:
+    """文件内容的强 ETag（带引号），按 路径+修改时间+大小 缓存"""
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    with _hash_lock:
+        cached = _hash_cache.get(key)
+        if cached is not None:
+            _hash_cache.move_to_end(key)
+            return cached
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    etag = f'"{h.hexdigest()}"'
+    with _hash_lock:
+        _hash_cache[key] = etag
+        while len(_hash_cache) > _HASH_CACHE_MAX:
+            _hash_cache.popitem(last=False)
+    return etag
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match 比较（弱比较，忽略 W/ 前缀）"""
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*" or (tag[2:] if tag.startswith("W/") else tag) == etag:
+            return True
+    return False
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    inm = request.headers.get("if-none-match")
+    if inm:
+        return _etag_matches(inm, etag)
+    ims = request.headers.get("if-modified-since")
+    if ims:
+        try:
+            return int(mtime) <= parsedate_to_datetime(ims).timestamp()
+        except (TypeError, ValueError, IndexError):
+            return False
+    return False
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单个字节区间，返回 (start, end) 闭区间。
+    多区间或格式错误返回 None（按规范忽略 Range，返回完整文件）；区间不可满足时抛 ValueError（416）。
+    """
+    unit, _, spec = header.partition("=")
+    start_s, sep, end_s = spec.strip().partition("-")
+    if (unit.strip().lower() != "bytes" or not sep
+            or not (start_s.isdigit() or end_s.isdigit())
+            or (start_s and not start_s.isdigit()) or (end_s and not end_s.isdigit())):
+        return None
+    if not start_s:
+        suffix = int(end_s)
+        if suffix == 0 or size == 0:
+            raise ValueError("range not satisfiable")
+        return max(0, size - suffix), size - 1
+    start = int(start_s)
+    if end_s and int(end_s) < start:
+        return None
+    if start >= size:
+        raise ValueError("range not satisfiable")
+    return start, min(int(end_s), size - 1) if end_s else size - 1
+
+
+def _content_disposition(disposition: str, filename: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"{disposition}; filename*=utf-8''{quoted}"
+    return f'{disposition}; filename="{filename}"'
+
+
+def _iter_file(path: str, start: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            block = f.read(min(_CHUNK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+async def file_response(
+    request: Request,
+    path: str,
+    filename: str,
+    media_type: Optional[str] = None,
+    disposition: str = "attachment",
+    cache_control: str = CACHE_REVALIDATE,
+    etag: Optional[str] = None,
+) -> Response:
+    """
+    返回带 ETag / Last-Modified / Cache-Control 的文件响应：条件请求命中返回 304，Range 请求返回 206。
+    etag 为已知的内容哈希（如 dept_policy.content_hash）时直接使用，否则计算文件哈希。
+    """
+    path = str(path)
+    st = os.stat(path)
+    media_type = media_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    if etag:
+        etag = etag if etag.startswith('"') else f'"{etag}"'
+    else:
+        etag = await asyncio.get_event_loop().run_in_executor(None, file_etag, path)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+    if _not_modified(request, etag, st.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() in (etag, headers["Last-Modified"])):
+        try:
+            byte_range = _parse_range(range_header, st.st_size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{st.st_size}"})
+        if byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            headers.update({
+                "Content-Range": f"bytes {start}-{end}/{st.st_size}",
+                "Content-Length": str(length),
+                "Content-Disposition": _content_disposition(disposition, filename),
+            })
+            return StreamingResponse(
+                _iter_file(path, start, length),
+                status_code=206,
+                media_type=media_type,
+                headers=headers,
+            )
+
+    return FileResponse(
+        path,
+        media_type=media_type,
+        filename=filename,
+        content_disposition_type=disposition,
+        headers=headers,
+        stat_result=st,
+    )
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+统计结果缓存 - 供 statistics / report 路由使用
+- 进程内 LRU 缓存统计接口的返回结果，键为 (接口名, lsys, year, month, quarter 等查询参数)
+- 失效依赖 MySQL 表 stats_cache_version 中的版本号：审批、请假/加班登记、公出、人员管理、假期设置等写操作
+  调用 bump_stats_version() 递增对应范围的版本号，所有 uvicorn worker 读取同一版本号，因此多进程下也能正确失效
+- 版本号读取失败时直接绕过缓存，保证结果正确
+"""
+import os
+import threading
+import logging
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from functools import wraps
+from typing import Dict, Iterable, Optional, Tuple
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# 失效范围：写操作按影响的数据递增对应版本号
+SCOPE_LEAVE = "leave"        # qj 请假
+SCOPE_OVERTIME = "overtime"  # jiaban 加班
+SCOPE_TRIP = "trip"          # gcsqb 公出
+SCOPE_STAFF = "staff"        # yggl 人员（科室、在职、级别）
+SCOPE_HOLIDAY = "holiday"    # holiday 假期
+SCOPE_CONFIG = "config"      # webconfig（值班费等）
+ALL_SCOPES = (SCOPE_LEAVE, SCOPE_OVERTIME, SCOPE_TRIP, SCOPE_STAFF, SCOPE_HOLIDAY, SCOPE_CONFIG)
+# 制度向量索引版本（不属于统计数据，不在 ALL_SCOPES 中）
+SCOPE_POLICY_INDEX = "policy_index"
+
+# 单进程最多缓存的结果条数
+MAX_ENTRIES = 512
+
+_lock = threading.Lock()
+_entries: "OrderedDict[tuple, object]" = OrderedDict()
+_hits: Dict[str, int] = defaultdict(int)
+_misses: Dict[str, int] = defaultdict(int)
+_bypass: Dict[str, int] = defaultdict(int)
+_version_table_ensured = False
+
+
+def _ensure_version_table_once() -> bool:
+    """确保 stats_cache_version 表存在，进程内只执行一次。"""
+    global _version_table_ensured
+    if _version_table_ensured:
+        return True
+    n = db.execute_update(
+        "CREATE TABLE IF NOT EXISTS stats_cache_version ("
+        " scope VARCHAR(32) NOT NULL PRIMARY KEY,"
+        " version BIGINT NOT NULL DEFAULT 0,"
+        " updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"
+        ") DEFAULT CHARSET=utf8mb4",
+        (),
+    )
+    if n < 0:
+        logger.warning("创建 stats_cache_version 失败，统计缓存将不生效，请手动执行 scripts/create_stats_cache_version.sql")
+        return False
+    _version_table_ensured = True
+    return True
+
+
+def _read_versions(scopes: Iterable[str]) -> Optional[Tuple[int, ...]]:
+    """读取各范围当前版本号；失败返回 None（调用方应绕过缓存）。"""
+    scopes = tuple(scopes)
+    if not _ensure_version_table_once():
+        return None
+    conn = None
+    try:
+        conn = db.get_connection()
+        if not conn:
+            return None
+        placeholders = ", ".join(["%s"] * len(scopes))
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"SELECT scope, version FROM stats_cache_version WHERE scope IN ({placeholders})",
+                scopes,
+            )
+            rows = cursor.fetchall()
+        found = {r["scope"]: int(r.get("version") or 0) for r in (rows or [])}
+        return tuple(found.get(s, 0) for s in scopes)
+    except Exception as e:
+        logger.warning(f"读取统计缓存版本号失败，本次不使用缓存: {e}")
+        return None
+    finally:
+        if conn:
+            conn.close()
+
+
+def get_stats_version(scope: str) -> Optional[int]:
+    """读取单个范围的当前版本号（供缓存统计结果以外的进程内数据判断是否失效），失败返回 None。"""
+    versions = _read_versions((scope,))
+    return versions[0] if versions else None
+
+
+def bump_stats_version(*scopes: str) -> None:
+    """
+    写操作后调用：递增对应范围的版本号，使所有 worker 中依赖这些范围的缓存失效。
+    失败只记日志，不影响业务写操作。
+    """
+    scopes = tuple(s for s in scopes if s) or ALL_SCOPES
+    if not _ensure_version_table_once():
+        return
+    for scope in scopes:
+        n = db.execute_update(
+            "INSERT INTO stats_cache_version (scope, version) VALUES (%s, 1) "
+            "ON DUPLICATE KEY UPDATE version = version + 1",
+            (scope,),
+        )
+        if n < 0:
+            logger.warning(f"递增统计缓存版本号失败: {scope}")
+
+
+def _make_key(endpoint: str, kwargs: dict) -> tuple:
+    params = dict(kwargs)
+    # year 不传时各接口按当年处理，写入键中避免跨年沿用旧结果
+    if "year" in params and params["year"] is None:
+        params["year"] = datetime.now().year
+    for k, v in list(params.items()):
+        if isinstance(v, str):
+            params[k] = v.strip()
+    return (endpoint,) + tuple(sorted(params.items()))
+
+
+def cached_stats(*deps: str):
+    """
+    统计接口缓存装饰器（仅用于 async 的 GET 接口）。
+    deps 为该接口依赖的数据范围；缓存键包含查询参数与这些范围的当前版本号。
+    使用 functools.wraps 保留原函数签名，FastAPI 仍能正确解析 Query 参数。
+    """
+    deps = tuple(deps) or ALL_SCOPES
+
+    def decorator(func):
+        endpoint = func.__name__
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            versions = _read_versions(deps)
+            if versions is None:
+                with _lock:
+                    _bypass[endpoint] += 1
+                return await func(*args, **kwargs)
+            key = _make_key(endpoint, kwargs) + (versions,)
+            with _lock:
+                if key in _entries:
+                    _entries.move_to_end(key)
+                    _hits[endpoint] += 1
+                    return _entries[key]
+                _misses[endpoint] += 1
+            result = await func(*args, **kwargs)
+            with _lock:
+                _entries[key] = result
+                _entries.move_to_end(key)
+                while len(_entries) > MAX_ENTRIES:
+                    _entries.popitem(last=False)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def cached_call(name: str, params: dict, deps: Iterable[str], compute):
+    """
+    非接口函数的缓存（如整年加班费计算结果，供多个接口共享）。
+    与 cached_stats 共用同一 LRU 与版本号失效机制。
+    """
+    deps = tuple(deps) or ALL_SCOPES
+    versions = _read_versions(deps)
+    if versions is None:
+        with _lock:
+            _bypass[name] += 1
+        return compute()
+    key = _make_key(name, params) + (versions,)
+    with _lock:
+        if key in _entries:
+            _entries.move_to_end(key)
+            _hits[name] += 1
+            return _entries[key]
+        _misses[name] += 1
+    result = compute()
+    with _lock:
+        _entries[key] = result
+        _entries.move_to_end(key)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+    return result
+
+
+def clear_stats_cache() -> None:
+    """清空本进程缓存（不影响其他 worker，其他 worker 依赖版本号失效）。"""
+    with _lock:
+        _entries.clear()
+
+
+def get_stats_cache_metrics() -> dict:
+    """本进程的命中/未命中计数（多 worker 时每个进程各自统计，以 pid 区分）。"""
+    with _lock:
+        endpoints = sorted(set(_hits) | set(_misses) | set(_bypass))
+        per_endpoint = []
+        total_hits = total_misses = 0
+        for ep in endpoints:
+            h, m = _hits.get(ep, 0), _misses.get(ep, 0)
+            total_hits += h
+            total_misses += m
+            per_endpoint.append({
+                "endpoint": ep,
+                "hits": h,
+                "misses": m,
+                "bypass": _bypass.get(ep, 0),
+                "hitRate": round(h / (h + m), 4) if (h + m) else 0.0,
+            })
+        return {
+            "pid": os.getpid(),
+            "size": len(_entries),
+            "maxEntries": MAX_ENTRIES,
+            "hits": total_hits,
+            "misses": total_misses,
+            "hitRate": round(total_hits / (total_hits + total_misses), 4) if (total_hits + total_misses) else 0.0,
+            "endpoints": per_endpoint,
+        }
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+已结账月份统计快照 - 月度工资核算完成后冻结当月统计结果
+- 结账：把当月各统计接口（加班费导出、请假/加班/公出科室统计、满勤率等）的结果写入
+  data/stats_snapshots/YYYY-MM.json.gz，此后这些接口对该月直接返回快照，不再访问 MySQL
+- 重新打开：删除快照文件，恢复实时计算
+- 多 worker：快照在磁盘上共享，各进程按文件 mtime 判断是否需要重新加载
+- 仅覆盖按月查询（year+month）：全年/季度视图（如 /dept/leave 只传 year、全年满勤率、科室对比、排行）
+  仍实时计算，已结账月份的源数据被修改时全年结果会随之变化。快照只保存各月聚合结果，
+  全年满勤、排行等需要按人跨月汇总，无法由月度结果拼出；按月满勤人数已逐月读取快照
+"""
+import gzip
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_BASE_DIR = Path(__file__).resolve().parent.parent
+SNAPSHOT_DIR = _BASE_DIR / "data" / "stats_snapshots"
+
+_lock = threading.Lock()
+# ym -> (mtime, snapshot dict)
+_loaded: Dict[str, tuple] = {}
+_served = 0
+
+
+def _ym(year: int, month: int) -> str:
+    return f"{int(year)}-{int(month):02d}"
+
+
+def _snapshot_path(year: int, month: int) -> Path:
+    return SNAPSHOT_DIR / f"{_ym(year, month)}.json.gz"
+
+
+def snapshot_key(params: Dict[str, Any]) -> str:
+    """快照内的参数键：去掉 year/month 与空值，按参数名排序，如 'lsys=科室A'。"""
+    parts = []
+    for k in sorted(params):
+        if k in ("year", "month"):
+            continue
+        v = params[k]
+        if isinstance(v, str):
+            v = v.strip()
+        if v is None or v == "":
+            continue
+        parts.append(f"{k}={v}")
+    return "&".join(parts)
+
+
+def load_month_snapshot(year: int, month: int) -> Optional[dict]:
+    """读取某月快照；未结账返回 None。文件未变化时使用进程内缓存。"""
+    ym = _ym(year, month)
+    path = _snapshot_path(year, month)
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        with _lock:
+            _loaded.pop(ym, None)
+        return None
+    with _lock:
+        cached = _loaded.get(ym)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        logger.warning(f"读取统计快照失败 {path}: {e}")
+        return None
+    with _lock:
+        _loaded[ym] = (mtime, data)
+    return data
+
+
+def get_snapshot_entry(year: int, month: int, endpoint: str, params: Dict[str, Any]) -> Optional[Any]:
+    """取某月快照中某接口、某组参数的结果；无则返回 None。"""
+    snap = load_month_snapshot(year, month)
+    if not snap:
+        return None
+    return (snap.get("entries") or {}).get(endpoint, {}).get(snapshot_key(params))
+
+
+def write_month_snapshot(year: int, month: int, entries: Dict[str, Dict[str, Any]], closed_by: str) -> dict:
+    """写入某月快照（先写临时文件再原子替换），返回快照元信息。"""
+    SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+    path = _snapshot_path(year, month)
+    meta = {
+        "ym": _ym(year, month),
+        "closedBy": closed_by,
+        "closedAt": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    data = dict(meta, entries=entries)
+    tmp = path.with_suffix(f".tmp{os.getpid()}")
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"), default=str)
+    os.replace(tmp, path)
+    with _lock:
+        _loaded.pop(meta["ym"], None)
+    return meta
+
+
+def remove_month_snapshot(year: int, month: int) -> bool:
+    """删除某月快照（重新打开该月），不存在返回 False。"""
+    path = _snapshot_path(year, month)
+    with _lock:
+        _loaded.pop(_ym(year, month), None)
+    try:
+        path.unlink()
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def list_closed_months(year: Optional[int] = None) -> List[dict]:
+    """列出已结账月份：[{ ym, closedBy, closedAt, size }]。"""
+    if not SNAPSHOT_DIR.is_dir():
+        return []
+    out = []
+    pattern = f"{int(year)}-*.json.gz" if year else "*.json.gz"
+    for p in sorted(SNAPSHOT_DIR.glob(pattern)):
+        ym = p.name[:7]
+        try:
+            y, m = int(ym[:4]), int(ym[5:7])
+        except ValueError:
+            continue
+        snap = load_month_snapshot(y, m) or {}
+        out.append({
+            "ym": ym,
+            "closedBy": snap.get("closedBy"),
+            "closedAt": snap.get("closedAt"),
+            "size": p.stat().st_size if p.exists() else 0,
+        })
+    return out
+
+
+def served_count() -> int:
+    """本进程由快照直接返回的请求数。"""
+    return _served
+
+
+def serve_closed_month(func):
+    """
+    统计接口装饰器：请求指定了 year+month 且该月已结账时，直接返回快照中的结果；
+    快照中没有对应参数组合（如按个人查询）或未指定 month（全年/季度）时仍实时计算。
+    """
+    endpoint = func.__name__
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        global _served
+        year, month = kwargs.get("year"), kwargs.get("month")
+        if year and month:
+            frozen = get_snapshot_entry(year, month, endpoint, kwargs)
+            if frozen is not None:
+                with _lock:
+                    _served += 1
+                return frozen
+        return await func(*args, **kwargs)
+
+    return wrapper